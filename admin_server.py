@@ -1,21 +1,59 @@
-from flask import Flask, jsonify, render_template_string, request
+from flask import Flask, Response, g, jsonify, render_template_string, request
 import sync_store
+import metrics
 import os
 import sync_config
-import requests
-import grpc
+import http_client
+import grpc_channels
 import order_pb2
 import order_pb2_grpc
-from concurrent.futures import ThreadPoolExecutor
-import uuid
+import task_store
+import argparse
+import log_setup
+import logging
 import time
 
-# Simple in-memory task store: {task_id: {status, result, error, started_at, finished_at}}
-TASKS = {}
-EXECUTOR = ThreadPoolExecutor(max_workers=4)
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+HTTP_LATENCY = metrics.REGISTRY.histogram(
+    'erp_admin_http_request_seconds', 'Admin HTTP request latency', ('endpoint', 'method'))
+HTTP_REQUESTS = metrics.REGISTRY.counter(
+    'erp_admin_http_requests_total', 'Admin HTTP requests by status', ('endpoint', 'method', 'status'))
+
+
+def _task_metrics():
+    counts = task_store.count_by_status()
+    return [metrics.MetricFamily('erp_admin_tasks', 'gauge', 'Admin trigger tasks by status',
+                                 [('', {'status': status}, n) for status, n in sorted(counts.items())])]
+
+
+def _channel_metrics():
+    return [metrics.MetricFamily('erp_grpc_client_channels', 'gauge', 'Pooled gRPC client channels by connectivity state',
+                                 [('', {'target': c['target'], 'state': c['state']}, 1)
+                                  for c in grpc_channels.REGISTRY.stats()])]
+
+
+metrics.REGISTRY.add_collector(_task_metrics)
+metrics.REGISTRY.add_collector(_channel_metrics)
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(resp):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # label by route pattern, not path, so /admin/task/<task_id> stays one series
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        HTTP_REQUESTS.labels(endpoint, request.method, resp.status_code).inc()
+    return resp
+
 
 HTML_TEMPLATE = """
 <!doctype html>
@@ -32,9 +70,33 @@ HTML_TEMPLATE = """
       .meta{color:#666;margin-bottom:12px}
     </style>
     <script>
+      // keyset paging: cursors[i] is the cursor used to fetch page i (null for the first page)
+      let cursors = [null];
+
+      function filterQuery(){
+        const params = new URLSearchParams();
+        ['bill_key','state','error_code'].forEach(k=>{
+          const v = document.getElementById('f_' + k).value.trim();
+          if(v) params.set(k, v);
+        });
+        const cursor = cursors[cursors.length - 1];
+        if(cursor) params.set('cursor', cursor);
+        return params.toString();
+      }
+
+      function search(){ cursors = [null]; load(); }
+      function nextPage(next){ if(next){ cursors.push(next); load(); } }
+      function prevPage(){ if(cursors.length > 1){ cursors.pop(); load(); } }
+
       async function load(){
-        const res = await fetch('/api/sync-results');
+        const res = await fetch('/api/sync-results?' + filterQuery());
         const data = await res.json();
+        const next = res.headers.get('X-Next-Cursor');
+        const btn = document.getElementById('next');
+        btn.disabled = !next;
+        btn.onclick = ()=>nextPage(next);
+        document.getElementById('prev').disabled = cursors.length <= 1;
+        document.getElementById('page').textContent = cursors.length;
         const tbody = document.getElementById('tbody');
         tbody.innerHTML = '';
         data.forEach(r=>{
@@ -80,7 +142,8 @@ HTML_TEMPLATE = """
         }
       }
 
-      window.onload = ()=>{ load(); setInterval(load, 5000); };
+      // only auto-refresh the first page so paging isn't reset under the user
+      window.onload = ()=>{ load(); setInterval(()=>{ if(cursors.length === 1) load(); }, 5000); };
     </script>
   </head>
   <body>
@@ -95,7 +158,16 @@ HTML_TEMPLATE = """
       <label style="margin-left:8px">gRPC目标: <input id="target" value="localhost:50051" style="width:160px"/></label>
       <button onclick="trigger()" style="margin-left:8px">触发联调</button>
     </div>
-    <div class="meta">Total: <span id="count">0</span> — 数据每 5s 刷新一次</div>
+    <div style="margin-bottom:12px">
+      bill_key: <input id="f_bill_key" style="width:160px"/>
+      state: <input id="f_state" style="width:40px"/>
+      error_code: <input id="f_error_code" style="width:60px"/>
+      <button onclick="search()">筛选</button>
+      <button id="prev" onclick="prevPage()" disabled>上一页</button>
+      <button id="next" disabled>下一页</button>
+      第 <span id="page">1</span> 页
+    </div>
+    <div class="meta">本页: <span id="count">0</span> 条 — 第一页每 5s 刷新一次</div>
     <table>
     <h2>联调结果</h2>
     <pre id="result" style="background:#f8f8f8;border:1px solid #eee;padding:8px;min-height:80px;white-space:pre-wrap"></pre>
@@ -113,16 +185,54 @@ HTML_TEMPLATE = """
 
 @app.route('/api/sync-results')
 def api_sync_results():
-    """Return latest sync results as JSON. Query param `limit` optional."""
+    """Return sync results as JSON, newest first.
+
+    Query params (all optional): `limit`, `bill_key`, `erp_key`, `state`, `error_code`,
+    `since`/`until` (ISO-8601 UTC, matched against created_at) and `cursor`.
+    The cursor for the next page is returned in the `X-Next-Cursor` header
+    (absent on the last page); pass it back as `cursor` to continue.
+    """
     try:
         limit = int(request.args.get('limit', '100'))
     except Exception:
         limit = 100
-    rows = sync_store.list_results(limit)
-    # list_results returns list of tuples; convert to dicts
-    keys = ['id', 'bill_key', 'erp_key', 'sync_state', 'sync_msg', 'error_code', 'created_at']
-    data = [dict(zip(keys, row)) for row in rows]
-    return jsonify(data)
+    limit = max(1, min(limit, sync_store.MAX_PAGE_SIZE))
+
+    def int_arg(name):
+        value = request.args.get(name)
+        if value in (None, ''):
+            return None
+        return int(value)
+
+    try:
+        state = int_arg('state')
+        error_code = int_arg('error_code')
+        cursor = int_arg('cursor')
+    except ValueError:
+        return jsonify({'error': 'state, error_code and cursor must be integers'}), 400
+
+    rows, next_cursor = sync_store.query_results(
+        bill_key=request.args.get('bill_key') or None,
+        erp_key=request.args.get('erp_key') or None,
+        sync_state=state,
+        error_code=error_code,
+        since=request.args.get('since') or None,
+        until=request.args.get('until') or None,
+        before_id=cursor,
+        limit=limit,
+    )
+    # query_results returns tuples; convert to dicts
+    data = [dict(zip(sync_store.RESULT_COLUMNS, row)) for row in rows]
+    resp = jsonify(data)
+    if next_cursor is not None:
+        resp.headers['X-Next-Cursor'] = str(next_cursor)
+    return resp
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of this process's metrics (erp_service has its own --metrics-port)."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.route('/')
@@ -130,85 +240,117 @@ def index():
     return render_template_string(HTML_TEMPLATE)
 
 
+def job_get_token(ctx):
+  cfg = sync_config.load_config()
+  payload = {'corpId': cfg.corp_id, 'appId': cfg.app_id, 'appSecret': cfg.app_secret}
+  if ctx.params.get('dry_run', True):
+    return {'mode': 'dry-run', 'payload': payload}
+  r = http_client.post(cfg.token_url, json=payload, timeout=10)
+  return {'mode': 'live', 'http_status': r.status_code, 'body': r.text}
+
+
+def job_call_order(ctx):
+  sample = order_pb2.G_SyncBillListRequest()
+  item = order_pb2.G_SyncBillRequest()
+  item.BillKey = 'BILL-UI-1'
+  item.BillCode = 'BILL-UI-1'
+  item.TotalPrice = 100.0
+  d = order_pb2.G_SyncBillDetailInfo()
+  d.ProductKey = 'PROD-UI-1'
+  d.ProductName = '示例商品UI'
+  d.Qty = 1
+  d.Price = 100
+  item.Details.extend([d])
+  sample.Data.extend([item])
+
+  if ctx.params.get('dry_run', True):
+    return {'mode': 'dry-run', 'proto': str(sample)}
+  ctx.check()
+  tgt = ctx.params.get('target') or os.environ.get('ERP_TARGET', 'localhost:50051')
+  stub = grpc_channels.get_stub(order_pb2_grpc.OrderStub, tgt)
+  resp = stub.SynchroSaleOrderList(sample, timeout=30)
+  return {'mode': 'live', 'response': str(resp)}
+
+
+# action -> handler(ctx) run by the task worker; the returned dict becomes the task result
+JOB_HANDLERS = {
+  'get-token': job_get_token,
+  'call-order': job_call_order,
+}
+
+# in-process task worker, when this process runs one (see __main__)
+WORKER = None
+
+
+def _task_json(t):
+  return {
+    'task_id': t['id'],
+    'action': t['action'],
+    'status': t['status'],
+    'result': t['result'],
+    'error': t['error'],
+    'attempts': t['attempts'],
+    'created_at': t['created_at'],
+    'started_at': t['started_at'],
+    'finished_at': t['finished_at'],
+  }
+
+
 @app.route('/admin/trigger', methods=['POST'])
 def admin_trigger():
-  """Submit a trigger job to background executor and return task id."""
+  """Queue a trigger job in the task store and return its id."""
   body = request.get_json(force=True, silent=True) or {}
   action = body.get('action', 'get-token')
-  dry_run = body.get('dry_run', True)
-  target = body.get('target') or request.args.get('target')
-
-  task_id = str(uuid.uuid4())
-  TASKS[task_id] = {'status': 'queued', 'result': None, 'error': None, 'started_at': None, 'finished_at': None}
+  if action not in JOB_HANDLERS:
+    return jsonify({'status': 'error', 'error': 'unknown action'}), 400
+  params = {
+    'dry_run': body.get('dry_run', True),
+    'target': body.get('target') or request.args.get('target'),
+  }
+  task_id = task_store.submit(action, params)
+  if WORKER is not None:
+    WORKER.wake()
+  return jsonify({'task_id': task_id, 'status': task_store.QUEUED})
 
-  def run_trigger_job(body):
-    TASKS[task_id]['status'] = 'running'
-    TASKS[task_id]['started_at'] = time.time()
-    try:
-      action = body.get('action', 'get-token')
-      dry_run = body.get('dry_run', True)
-      target = body.get('target')
-
-      if action == 'get-token':
-        cfg = sync_config.load_config()
-        payload = {'corpId': cfg.corp_id, 'appId': cfg.app_id, 'appSecret': cfg.app_secret}
-        if dry_run:
-          TASKS[task_id]['result'] = {'mode': 'dry-run', 'payload': payload}
-        else:
-          r = requests.post(cfg.token_url, json=payload, timeout=10)
-          TASKS[task_id]['result'] = {'mode': 'live', 'http_status': r.status_code, 'body': r.text}
-
-      elif action == 'call-order':
-        sample = order_pb2.G_SyncBillListRequest()
-        item = order_pb2.G_SyncBillRequest()
-        item.BillKey = 'BILL-UI-1'
-        item.BillCode = 'BILL-UI-1'
-        item.TotalPrice = 100.0
-        d = order_pb2.G_SyncBillDetailInfo()
-        d.ProductKey = 'PROD-UI-1'
-        d.ProductName = '示例商品UI'
-        d.Qty = 1
-        d.Price = 100
-        item.Details.extend([d])
-        sample.Data.extend([item])
-
-        if dry_run:
-          TASKS[task_id]['result'] = {'mode': 'dry-run', 'proto': str(sample)}
-        else:
-          tgt = target or os.environ.get('ERP_TARGET', 'localhost:50051')
-          with grpc.insecure_channel(tgt) as ch:
-            stub = order_pb2_grpc.OrderStub(ch)
-            resp = stub.SynchroSaleOrderList(sample, timeout=30)
-            TASKS[task_id]['result'] = {'mode': 'live', 'response': str(resp)}
-      else:
-        TASKS[task_id]['error'] = 'unknown action'
-        TASKS[task_id]['status'] = 'error'
-        return
 
-      TASKS[task_id]['status'] = 'finished'
-    except Exception as e:
-      TASKS[task_id]['error'] = str(e)
-      TASKS[task_id]['status'] = 'error'
-    finally:
-      TASKS[task_id]['finished_at'] = time.time()
-
-  EXECUTOR.submit(run_trigger_job, body)
-  return jsonify({'task_id': task_id, 'status': 'queued'})
+@app.route('/admin/tasks')
+def admin_tasks():
+  """Most recent tasks, newest first; optional `status` and `limit` (max 500)."""
+  try:
+    limit = max(1, min(int(request.args.get('limit', '50')), 500))
+  except ValueError:
+    limit = 50
+  return jsonify([_task_json(t) for t in task_store.list_tasks(request.args.get('status') or None, limit)])
 
 
 @app.route('/admin/task/<task_id>')
 def admin_task_status(task_id):
-  t = TASKS.get(task_id)
+  t = task_store.get(task_id)
   if not t:
     return jsonify({'status': 'error', 'error': 'not found'}), 404
-  # shallow copy to avoid exposing internal
-  return jsonify({
-    'status': t['status'],
-    'result': t['result'],
-    'error': t['error'],
-    'started_at': t['started_at'],
-    'finished_at': t['finished_at'],
-  })
+  return jsonify(_task_json(t))
+
+
+@app.route('/admin/task/<task_id>/cancel', methods=['POST'])
+def admin_task_cancel(task_id):
+  status = task_store.cancel(task_id)
+  if status is None:
+    return jsonify({'status': 'error', 'error': 'not found'}), 404
+  if WORKER is not None:
+    WORKER.cancel(task_id)
+  return jsonify({'task_id': task_id, 'status': status})
+
+
+@app.route('/admin/task/<task_id>/retry', methods=['POST'])
+def admin_task_retry(task_id):
+  status = task_store.retry(task_id)
+  if status is None:
+    return jsonify({'status': 'error', 'error': 'not found'}), 404
+  if status != task_store.QUEUED:
+    return jsonify({'task_id': task_id, 'status': status, 'error': 'only error or cancelled tasks can be retried'}), 409
+  if WORKER is not None:
+    WORKER.wake()
+  return jsonify({'task_id': task_id, 'status': status})
 
 
 def ensure_deps():
@@ -216,9 +358,37 @@ def ensure_deps():
     pass
 
 
-if __name__ == '__main__':
+def main(argv=None):
+    p = argparse.ArgumentParser(description='ERP admin HTTP interface and background task worker')
     # Default host/port; allow override with env FLASK_ADMIN_HOST/FLASK_ADMIN_PORT
-    host = os.environ.get('FLASK_ADMIN_HOST', '127.0.0.1')
-    port = int(os.environ.get('FLASK_ADMIN_PORT', '8080'))
-    print(f"Starting admin HTTP interface on http://{host}:{port}/")
-    app.run(host=host, port=port)
+    p.add_argument('--host', default=os.environ.get('FLASK_ADMIN_HOST', '127.0.0.1'))
+    p.add_argument('--port', type=int, default=int(os.environ.get('FLASK_ADMIN_PORT', '8080')))
+    p.add_argument('--worker', action='store_true',
+                   help='only run the task worker (no HTTP), e.g. in a separate process or container')
+    p.add_argument('--no-worker', action='store_true', default=os.environ.get('ADMIN_TASK_WORKER') == 'external',
+                   help='serve HTTP only; tasks are run by a separate --worker process (env ADMIN_TASK_WORKER=external)')
+    p.add_argument('--task-threads', type=int, default=int(os.environ.get('ADMIN_TASK_THREADS', '4')),
+                   help='tasks run concurrently by this worker (env ADMIN_TASK_THREADS)')
+    args = p.parse_args(argv)
+
+    global WORKER
+    log_setup.setup_logging()
+    sync_store.migrate()
+    task_store.migrate()
+    if args.worker:
+        logger.info("Starting admin task worker (%d threads)", args.task_threads)
+        worker = task_store.TaskWorker(JOB_HANDLERS, threads=args.task_threads)
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            logger.info("Admin task worker interrupted, waiting for running tasks")
+            worker.stop()
+        return
+    if not args.no_worker:
+        WORKER = task_store.TaskWorker(JOB_HANDLERS, threads=args.task_threads).start()
+    logger.info("Starting admin HTTP interface on http://%s:%d/", args.host, args.port)
+    app.run(host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
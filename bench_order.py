@@ -0,0 +1,315 @@
+"""Load generator / benchmark for the Order bill-sync RPCs of a running erp_service.
+
+Synthesizes bill lists (bill count, details per bill, share of invalid bills),
+drives one RPC over a single reused channel either closed-loop (--concurrency
+callers back to back) or open-loop at a fixed --rps, then reports latency
+percentiles, throughput and the rows the server wrote to sync_results.db.
+Results can be saved as JSON and compared with an earlier run.
+
+Every request uses fresh BillKeys (prefixed with the run id) so the idempotency
+index does not answer them from cache; pass --repeat to measure that replay path.
+
+Usage:
+  python bench_order.py --target localhost:50051 --duration 10 --concurrency 8
+  python bench_order.py --rps 50 --bills 200 --details 20 --error-ratio 0.1 --output run.json
+  python bench_order.py --requests 500 --baseline run.json    # compare with an earlier run
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import grpc
+
+import common_pb2
+import order_pb2
+import order_pb2_grpc
+import sync_store
+
+METHODS = ('SynchroSaleOrderList', 'SynchroReceiptOrderList', 'SynchroLsSaleOrderList')
+
+_BILL_TYPES = {
+    'SynchroSaleOrderList': ('SalesOrder', 'SalesOutstorage', 'SalesReturn'),
+    'SynchroReceiptOrderList': ('Gather', 'Payment'),
+    'SynchroLsSaleOrderList': ('RetailOrder', 'RetailReturn'),
+}
+
+
+class BillFactory:
+    """Builds G_SyncBillListRequests shaped like real Handday pushes."""
+
+    def __init__(self, method, bills, details, error_ratio, run_id, seed=1):
+        self.method = method
+        self.bills = bills
+        self.details = details
+        self.error_ratio = error_ratio
+        self.run_id = run_id
+        self.rnd = random.Random(seed)
+        self.bill_types = [common_pb2.G_BillType.Value(name)  # type: ignore[attr-defined]
+                           for name in _BILL_TYPES[method]]
+        self.products = [(f'PROD-{i:05d}', f'商品{i}', round(self.rnd.uniform(1, 500), 2)) for i in range(2000)]
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def next_seq(self):
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def build(self, seq):
+        rnd = self.rnd
+        request = order_pb2.G_SyncBillListRequest()  # type: ignore[attr-defined]
+        request.BranchKey = 'BENCH'
+        receipt = self.method == 'SynchroReceiptOrderList'
+        for b in range(self.bills):
+            bill = request.Data.add()
+            bill.BillKey = f'{self.run_id}-{seq}-{b}'
+            bill.BillCode = f'BC{seq:06d}{b:04d}'
+            bill.BillType = rnd.choice(self.bill_types)
+            bill.CustomerKey = f'CUST-{rnd.randrange(500)}'
+            bill.TabulateDate = datetime.utcnow().strftime('%Y-%m-%d')
+            total = 0.0
+            for _ in range(self.details):
+                d = bill.Details.add()
+                if receipt:
+                    d.SettleAccountName = rnd.choice(('现金', '银行', '微信', '支付宝'))
+                    d.Total = round(rnd.uniform(10, 1000), 2)
+                else:
+                    key, name, price = rnd.choice(self.products)
+                    d.ProductKey = key
+                    d.ProductName = name
+                    d.Qty = rnd.randint(1, 20)
+                    d.Price = price
+                    d.Total = round(d.Qty * price, 2)
+                total += d.Total
+            bill.TotalPrice = round(total, 2)
+            if self.details and rnd.random() < self.error_ratio:
+                # one broken line makes the whole bill fail validation
+                bad = bill.Details[rnd.randrange(self.details)]
+                if receipt:
+                    bad.Total = 0
+                else:
+                    bad.Qty = 0
+        return request
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.codes = {}
+        self.bills_ok = 0
+        self.bills_failed_validation = 0
+
+    def record(self, latency, code, response=None):
+        with self._lock:
+            self.latencies.append(latency)
+            self.codes[code] = self.codes.get(code, 0) + 1
+            if response is not None:
+                for info in response.Data:
+                    if info.SyncState == common_pb2.G_SyncStateType.SyncSuccess:  # type: ignore[attr-defined]
+                        self.bills_ok += 1
+                    else:
+                        self.bills_failed_validation += 1
+
+
+def _db_mark(db_path):
+    """Highest sync_results id (0 if the table or file does not exist yet)."""
+    if not os.path.exists(db_path):
+        return 0
+    conn = sqlite3.connect(db_path, timeout=5)
+    try:
+        return conn.execute('SELECT COALESCE(MAX(id), 0) FROM sync_results').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+def _db_rows_since(db_path, mark, run_id):
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path, timeout=5)
+    try:
+        total, ok = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(sync_state = ?), 0) FROM sync_results WHERE id > ? AND bill_key LIKE ?',
+            (int(common_pb2.G_SyncStateType.SyncSuccess), mark, f'{run_id}-%'),  # type: ignore[attr-defined]
+        ).fetchone()
+        return {'rows': total, 'success_rows': ok, 'failed_rows': total - ok}
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run(args):
+    run_id = args.run_id or f'BENCH-{uuid.uuid4().hex[:8]}'
+    factory = BillFactory(args.method, args.bills, args.details, args.error_ratio, run_id, seed=args.seed)
+    repeat_request = factory.build(0) if args.repeat else None
+
+    channel = grpc.insecure_channel(args.target, options=[
+        ('grpc.max_send_message_length', 64 * 1024 * 1024),
+        ('grpc.max_receive_message_length', 64 * 1024 * 1024),
+    ])
+    grpc.channel_ready_future(channel).result(timeout=args.timeout)
+    call = getattr(order_pb2_grpc.OrderStub(channel), args.method)
+
+    recorder = Recorder()
+    slots = threading.BoundedSemaphore(args.concurrency)
+    db_mark = _db_mark(args.db)
+
+    def send(request, started):
+        future = call.future(request, timeout=args.timeout)
+
+        def done(f):
+            latency = time.perf_counter() - started
+            try:
+                response = f.result()
+                recorder.record(latency, 'OK', response)
+            except grpc.RpcError as e:
+                recorder.record(latency, e.code().name)
+            finally:
+                slots.release()
+
+        future.add_done_callback(done)
+
+    sent = 0
+    start = time.perf_counter()
+    deadline = start + args.duration if args.requests is None else None
+    interval = 1.0 / args.rps if args.rps else 0.0
+    next_at = start
+    while (args.requests is None or sent < args.requests) and (deadline is None or time.perf_counter() < deadline):
+        # build before timing starts so client-side message construction is not counted as latency
+        request = repeat_request if repeat_request is not None else factory.build(factory.next_seq())
+        if interval:
+            # open loop: latency counts from the scheduled send time, so queueing behind a slow server shows up
+            now = time.perf_counter()
+            if next_at > now:
+                time.sleep(next_at - now)
+            scheduled = next_at
+            next_at += interval
+        slots.acquire()
+        send(request, scheduled if interval else time.perf_counter())
+        sent += 1
+    # wait for in-flight calls
+    for _ in range(args.concurrency):
+        slots.acquire()
+    elapsed = time.perf_counter() - start
+    channel.close()
+
+    if args.settle:
+        # write-behind servers persist asynchronously
+        time.sleep(args.settle)
+    server_rows = _db_rows_since(args.db, db_mark, run_id)
+
+    lat = sorted(recorder.latencies)
+    ok = recorder.codes.get('OK', 0)
+    ms = lambda v: None if v is None else round(v * 1000, 3)  # noqa: E731
+    return {
+        'run_id': run_id,
+        'label': args.label,
+        'git_commit': _git_commit(),
+        'started_at': datetime.utcnow().isoformat(),
+        'config': {
+            'target': args.target, 'method': args.method, 'bills': args.bills, 'details': args.details,
+            'error_ratio': args.error_ratio, 'concurrency': args.concurrency, 'rps': args.rps,
+            'duration': args.duration, 'requests': args.requests, 'repeat': args.repeat,
+        },
+        'elapsed_seconds': round(elapsed, 3),
+        'requests': {'sent': sent, 'ok': ok, 'by_code': recorder.codes},
+        'throughput': {
+            'rps': round(ok / elapsed, 2) if elapsed else 0.0,
+            'bills_per_sec': round(ok * args.bills / elapsed, 2) if elapsed else 0.0,
+        },
+        'latency_ms': {
+            'p50': ms(percentile(lat, 50)), 'p95': ms(percentile(lat, 95)), 'p99': ms(percentile(lat, 99)),
+            'max': ms(lat[-1] if lat else None), 'mean': ms(sum(lat) / len(lat) if lat else None),
+        },
+        'bills': {'synced': recorder.bills_ok, 'failed_validation': recorder.bills_failed_validation},
+        'server_rows': server_rows,
+    }
+
+
+def print_report(result, baseline=None):
+    cfg = result['config']
+    print(f"{cfg['method']} on {cfg['target']}: {cfg['bills']} bills x {cfg['details']} details, "
+          f"error ratio {cfg['error_ratio']}, concurrency {cfg['concurrency']}"
+          + (f", target {cfg['rps']} rps" if cfg['rps'] else ''))
+    req = result['requests']
+    print(f"requests: {req['sent']} sent, {req['ok']} ok, by code {req['by_code']} in {result['elapsed_seconds']}s")
+    tp = result['throughput']
+    print(f"throughput: {tp['rps']} rps, {tp['bills_per_sec']} bills/s")
+    lat = result['latency_ms']
+    print(f"latency ms: p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}  mean {lat['mean']}")
+    print(f"bills: {result['bills']['synced']} synced, {result['bills']['failed_validation']} failed validation")
+    rows = result['server_rows']
+    print('sync_results rows written:', rows if rows is not None else 'n/a (database not found)')
+    if baseline:
+        print(f"vs baseline {baseline.get('label') or baseline.get('run_id')} ({baseline.get('git_commit')}):")
+        for section, key in (('throughput', 'rps'), ('latency_ms', 'p50'), ('latency_ms', 'p95'), ('latency_ms', 'p99')):
+            old, new = baseline.get(section, {}).get(key), result[section][key]
+            if old and new is not None:
+                print(f'  {section}.{key}: {old} -> {new} ({(new - old) / old * 100:+.1f}%)')
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Benchmark the Order bill-sync RPCs of a running erp_service')
+    p.add_argument('--target', default=os.environ.get('ERP_TARGET', 'localhost:50051'))
+    p.add_argument('--method', choices=METHODS, default='SynchroSaleOrderList')
+    p.add_argument('--bills', type=int, default=50, help='Bills per request')
+    p.add_argument('--details', type=int, default=10, help='Details per bill')
+    p.add_argument('--error-ratio', type=float, default=0.05, help='Fraction of bills with an invalid line')
+    p.add_argument('--concurrency', type=int, default=8, help='Maximum requests in flight')
+    p.add_argument('--rps', type=float, default=None, help='Open-loop target request rate (default: closed loop)')
+    p.add_argument('--duration', type=float, default=10.0, help='Seconds to run (ignored with --requests)')
+    p.add_argument('--requests', type=int, default=None, help='Stop after this many requests')
+    p.add_argument('--timeout', type=float, default=30.0, help='Per-RPC deadline in seconds')
+    p.add_argument('--repeat', action='store_true', help='Send the same request every time (idempotent replay path)')
+    p.add_argument('--db', default=sync_store.DB_PATH, help='sync_results.db the server writes to')
+    p.add_argument('--settle', type=float, default=1.0, help='Seconds to wait before counting rows (write-behind)')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--run-id', default=None, help='BillKey prefix (default: random)')
+    p.add_argument('--label', default=None, help='Free-form name stored in the JSON result')
+    p.add_argument('--output', default=None, help='Write the result as JSON to this file')
+    p.add_argument('--baseline', default=None, help='Earlier JSON result to compare against')
+    args = p.parse_args(argv)
+
+    result = run(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print('saved', args.output)
+    return result
+
+
+if __name__ == '__main__':
+    main()
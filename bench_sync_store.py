@@ -0,0 +1,58 @@
+"""Benchmark for sync_store persistence: per-row save_result vs batched save_results.
+
+Runs against a throw-away database in a temp directory so `sync_results.db` is untouched.
+
+Usage:
+  python bench_sync_store.py             # 500 bills, 3 rounds
+  python bench_sync_store.py --bills 2000 --rounds 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import order_pb2
+import sync_store
+
+
+def build_results(n):
+    resp = order_pb2.G_SyncBillListInfoResponse()  # type: ignore[attr-defined]
+    for i in range(n):
+        info = resp.Data.add()
+        info.BillKey = f'BENCH-{i}'
+        info.ErpKey = f'BENCH-{i}'
+        info.SyncState = 1
+        info.SyncMsg = 'Synced 1/1 details'
+        info.ErrorCode = 0
+    return resp.Data
+
+
+def bench_per_row(results):
+    start = time.perf_counter()
+    for r in results:
+        sync_store.save_result(r.BillKey, r.ErpKey, r.SyncState, r.SyncMsg, r.ErrorCode)
+    return time.perf_counter() - start
+
+
+def bench_batched(results):
+    start = time.perf_counter()
+    sync_store.save_results(results)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Benchmark sync_store write throughput')
+    p.add_argument('--bills', type=int, default=500, help='Bills per simulated request')
+    p.add_argument('--rounds', type=int, default=3, help='Number of rounds per mode')
+    args = p.parse_args(argv)
+
+    results = build_results(args.bills)
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_store.DB_PATH = os.path.join(tmp, 'bench_sync_results.db')
+        for name, fn in (('save_result (per row)', bench_per_row), ('save_results (batched)', bench_batched)):
+            best = min(fn(results) for _ in range(args.rounds))
+            print(f'{name:<24} {args.bills} rows in {best:.4f}s -> {args.bills / best:,.0f} rows/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Benchmark for bill detail validation: the original per-detail loop vs bill_validation.
+
+Also checks that both produce the same ok-count and error list on a bill that
+mixes valid and invalid lines, and times RuleSet.check with and without the
+detail memo cache (a hit still pays for serializing and hashing the details).
+
+The two other ways to run configurable rules are timed too: column by column
+over per-field arrays, and interpreting the rule list per detail. Both come
+out about 3x slower than the generated single pass, which itself is only
+as fast as the hand-written loop.
+
+Usage:
+  python bench_validation.py                 # 5000 details, 5% bad lines
+  python bench_validation.py --details 20000 --bad-ratio 0.2 --rounds 5
+"""
+import argparse
+import operator
+import random
+import time
+
+import order_pb2
+import bill_validation
+
+
+def legacy_validate(details):
+    """The per-detail loop SynchroSaleOrderList used before bill_validation (3 rules)."""
+    ok_count = 0
+    errors = []
+    for d in details:
+        prod = getattr(d, 'ProductKey', '')
+        qty = getattr(d, 'Qty', 0)
+        price = getattr(d, 'Price', 0)
+        if not prod:
+            errors.append('missing ProductKey')
+            continue
+        if qty is None or qty <= 0:
+            errors.append(f'bad Qty for {prod}')
+            continue
+        if price is None or price < 0:
+            errors.append(f'bad Price for {prod}')
+            continue
+        ok_count += 1
+    return ok_count, errors
+
+
+def loop_validate_all(details):
+    """Per-detail loop implementing the same five rules as bill_validation.DEFAULT_RULES."""
+    ok_count = 0
+    errors = []
+    for d in details:
+        prod = d.ProductKey
+        qty = d.Qty
+        price = d.Price
+        if not prod:
+            errors.append('missing ProductKey')
+            continue
+        if qty <= 0:
+            errors.append(f'bad Qty for {prod}')
+            continue
+        if price < 0:
+            errors.append(f'bad Price for {prod}')
+            continue
+        discount = d.Discount
+        if discount and not 0 < discount <= 1:
+            errors.append(f'bad Discount for {prod}')
+            continue
+        tax = d.Tax
+        if tax and not 1 <= tax <= 2:
+            errors.append(f'bad Tax for {prod}')
+            continue
+        ok_count += 1
+    return ok_count, errors
+
+
+def _fields(rules):
+    fields = []
+    for rule in rules:
+        fields += [f for f in rule.fields if f not in fields]
+    return fields
+
+
+def columnar_validator(rules):
+    """Rules evaluated in bulk: one array per field, one comprehension per rule."""
+    fields = _fields(rules)
+    cols = ', '.join(f'c_{f}' for f in fields)
+    lines = ['def validate(details, max_errors):']
+    lines += [f'    c_{f} = list(map(_get_{f}, details))' for f in fields]
+    lines.append('    failed = {}')
+    for k, rule in enumerate(rules):
+        names = ', '.join(rule.fields)
+        zipped = ', '.join(f'c_{f}' for f in rule.fields)
+        source = f'c_{rule.fields[0]}' if len(rule.fields) == 1 else f'zip({zipped})'
+        target = names if len(rule.fields) == 1 else f'({names})'
+        lines.append(f'    for i in [i for i, {target} in enumerate({source}) if {rule.fails}]:')
+        lines.append(f'        failed.setdefault(i, {k})')  # a detail reports its first failing rule
+    lines.append(f'    errors = [_render[failed[i]](i, {cols}) for i in sorted(failed)[:max_errors]]')
+    lines.append('    return len(details) - len(failed), errors')
+    namespace = {f'_get_{f}': operator.attrgetter(f) for f in fields}
+    namespace['_render'] = [
+        eval(f"lambda i, {cols}: (lambda {', '.join(r.fields)}: f{r.message!r})"
+             f"({', '.join(f'c_{f}[i]' for f in r.fields)})")
+        for r in rules]
+    exec('\n'.join(lines), namespace)
+    return namespace['validate']
+
+
+def interpreted_validator(rules):
+    """Rules interpreted per detail: one predicate call per rule, no generated loop."""
+    checks = [(operator.attrgetter(*r.fields), len(r.fields) > 1,
+               eval(f"lambda {', '.join(r.fields)}: {r.fails}"),
+               eval(f"lambda {', '.join(r.fields)}: f{r.message!r}")) for r in rules]
+
+    def validate(details, max_errors):
+        ok_count = 0
+        errors = []
+        for d in details:
+            for get, many, fails, render in checks:
+                values = get(d)
+                if fails(*values) if many else fails(values):
+                    if len(errors) < max_errors:
+                        errors.append(render(*values) if many else render(values))
+                    break
+            else:
+                ok_count += 1
+        return ok_count, errors
+    return validate
+
+
+def build_bill(n, bad_ratio, seed=1):
+    rnd = random.Random(seed)
+    bill = order_pb2.G_SyncBillRequest()  # type: ignore[attr-defined]
+    bill.BillKey = 'BENCH'
+    for i in range(n):
+        d = bill.Details.add()
+        d.ProductKey = f'PROD-{i}'
+        d.Qty = rnd.randint(1, 20)
+        d.Price = round(rnd.uniform(1, 100), 2)
+        if rnd.random() < bad_ratio:
+            kind = rnd.randrange(3)
+            if kind == 0:
+                d.ProductKey = ''
+            elif kind == 1:
+                d.Qty = 0
+            else:
+                d.Price = -1
+    return bill
+
+
+def best_of(fn, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Benchmark bill detail validation')
+    p.add_argument('--details', type=int, default=5000, help='Details per bill')
+    p.add_argument('--bad-ratio', type=float, default=0.05, help='Fraction of invalid details')
+    p.add_argument('--rounds', type=int, default=5)
+    args = p.parse_args(argv)
+
+    bill = build_bill(args.details, args.bad_ratio)
+    # the legacy loop only knows the first three rules, so compare against the same subset
+    engine3 = bill_validation.ValidationEngine(bill_validation.DEFAULT_RULES[:3])
+    assert legacy_validate(bill.Details) == engine3.validate(bill.Details), 'engine disagrees with legacy loop'
+    assert loop_validate_all(bill.Details) == bill_validation.DEFAULT_ENGINE.validate(bill.Details), \
+        'engine disagrees with five-rule loop'
+    columnar = columnar_validator(bill_validation.DEFAULT_RULES)
+    interpreted = interpreted_validator(bill_validation.DEFAULT_RULES)
+    expected = bill_validation.DEFAULT_ENGINE.validate(bill.Details)
+    assert columnar(bill.Details, len(bill.Details)) == expected, 'columnar disagrees with engine'
+    assert interpreted(bill.Details, len(bill.Details)) == expected, 'interpreted disagrees with engine'
+
+    plain = bill_validation.RuleSet('sale', cache=None)
+    memo = bill_validation.RuleSet('sale', cache=bill_validation.ValidationCache())
+    assert plain.check(bill) == memo.check(bill) == memo.check(bill), 'memoized result differs'
+
+    cases = (
+        ('legacy loop (3 rules)', lambda: legacy_validate(bill.Details)),
+        ('engine (3 rules)', lambda: engine3.validate(bill.Details, max_errors=5)),
+        ('loop (all rules)', lambda: loop_validate_all(bill.Details)),
+        ('engine (all rules)', lambda: bill_validation.DEFAULT_ENGINE.validate(bill.Details, max_errors=5)),
+        ('columnar (all rules)', lambda: columnar(bill.Details, 5)),
+        ('interpreted (all rules)', lambda: interpreted(bill.Details, 5)),
+        ('rule set, no memo', lambda: plain.check(bill)),
+        ('rule set, memo hit', lambda: memo.check(bill)),
+    )
+    for name, fn in cases:
+        elapsed = best_of(fn, args.rounds)
+        print(f'{name:<24} {args.details} details in {elapsed * 1000:.2f} ms -> {args.details / elapsed:,.0f} details/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Change tracking for the incremental Push* RPCs (PushPostBill, PushDeleteBill,
+PushChangeMember, PushProductStock).
+
+An incremental push should send only what changed since the last push that
+Handday acknowledged, not re-read the whole catalogue. Two tables in
+sync_results.db make that cheap:
+
+  change_log  one row per (entity, key) with a global, increasing seq.
+              record() upserts the key at a new seq, so repeated edits of a
+              key cost one row and the table grows with distinct keys only.
+  push_marks  per entity, the highest seq acknowledged by a push.
+
+A push reads `seq > mark` over the (entity, seq) index, i.e. the delta only,
+and moves the mark forward as pages are acknowledged. Resetting the mark
+(ResetPush) re-sends every key still in the log, which is the full set when
+the entity was seeded with record() once.
+
+ERP-side code records changes where it writes the data:
+
+    change_log.record('product_stock', [(sku, stock_dict)])
+    change_log.record_deleted('deleted_bill', [(bill_key, bill_dict)])
+
+and an incremental source is registered with the page message it pushes:
+
+    change_log.register_incremental('PushProductStock', 'product_stock',
+                                    product_pb2.G_PageProductStocksResponse)
+
+Rows are built from the recorded payload by default (a dict in the field
+names of the page's Data message); pass `build` to load current data for a
+batch of changed keys instead.
+
+Nothing in this tree deletes bills or keeps member or stock data, so no
+source is registered here: PushDeleteBill, PushChangeMember and
+PushProductStock answer UNIMPLEMENTED until the ERP integration records
+those changes and registers them as above.
+"""
+import logging
+
+from google.protobuf import json_format
+
+import push_engine
+import sync_store
+
+logger = logging.getLogger(__name__)
+
+UPSERT, DELETE = 'upsert', 'delete'
+# changed keys read per query while pushing
+BATCH_SIZE = 500
+
+
+def record(entity, changes, op=UPSERT):
+    """Record (key, payload) changes of `entity`; payload may be None when `build` loads the row."""
+    return sync_store.record_changes(entity, ((key, op, payload) for key, payload in changes))
+
+
+def record_deleted(entity, changes):
+    """Record deleted keys of `entity`; the payload is all that is left to push for them."""
+    return record(entity, changes, op=DELETE)
+
+
+def mark(entity):
+    return sync_store.get_push_mark(entity)
+
+
+def reset(entities=None):
+    """Forget the marks of `entities` (all when None): their next push starts from the oldest change."""
+    return sync_store.reset_push_marks(entities)
+
+
+def payload_rows(row_type):
+    """Default `build`: a `row_type` message from each recorded payload; changes without one are skipped."""
+    def build(changes):
+        for seq, key, op, payload in changes:
+            if payload is None:
+                logger.warning('Change %s of %s has no payload to push, skipped', seq, key)
+                continue
+            yield seq, json_format.ParseDict(payload, row_type(), ignore_unknown_fields=True)
+    return build
+
+
+def incremental_source(entity, build, batch_size=BATCH_SIZE):
+    """A push_engine rows(after) over the changes of `entity` past its mark.
+
+    `after` is the cursor of a resumed push; a fresh push starts at the mark.
+    `build(changes)` turns a batch of (seq, key, op, payload) into (seq, row)
+    pairs, so a loader can fetch the current rows of a batch in one query.
+    """
+    def rows(after):
+        start = mark(entity) if after is None else after
+        batch = []
+        for change in sync_store.iter_changes(entity, start, batch_size):
+            batch.append(change)
+            if len(batch) >= batch_size:
+                yield from build(batch)
+                batch = []
+        if batch:
+            yield from build(batch)
+    return rows
+
+
+def register_incremental(rpc, entity, page_type, build=None, batch_size=BATCH_SIZE):
+    """Serve `rpc` from the change log of `entity`, advancing its mark as pages are acknowledged."""
+    if build is None:
+        build = payload_rows(type(page_type().Data.add()))
+    push_engine.register_source(rpc, page_type, incremental_source(entity, build, batch_size),
+                                acknowledged=lambda cursor: sync_store.advance_push_mark(entity, cursor),
+                                reset=lambda: reset([entity]))
+
@@ -0,0 +1,25 @@
+"""pytest setup: the unit tests live in tests/, each on its own temporary databases."""
+import pytest
+
+import sync_store
+import task_store
+
+# manual client scripts that call a running server at import, not pytest modules
+collect_ignore = ['test_client.py', 'test_order_call.py', 'test_order_client.py']
+
+
+@pytest.fixture
+def sync_db(tmp_path, monkeypatch):
+    """sync_store on a fresh sync_results.db under tmp_path; yields its path."""
+    path = str(tmp_path / 'sync_results.db')
+    monkeypatch.setattr(sync_store, 'DB_PATH', path)
+    yield path
+    sync_store.close_all()
+
+
+@pytest.fixture
+def task_db(tmp_path, monkeypatch):
+    """task_store on a fresh tasks.db under tmp_path; yields its path."""
+    path = str(tmp_path / 'tasks.db')
+    monkeypatch.setattr(task_store, 'DB_PATH', path)
+    yield path
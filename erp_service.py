@@ -1,23 +1,37 @@
+import asyncio
 import grpc
 import logging
 from concurrent import futures
 import initialization_pb2_grpc  # 替换为实际生成的文件名
 import initialization_pb2
 import order_pb2_grpc
-import order_pb2
 import common_pb2
+import basicInfo_pb2
+import basicInfo_pb2_grpc
+import customer_pb2
+import customer_pb2_grpc
+import member_pb2
+import member_pb2_grpc
+import product_pb2
+import product_pb2_grpc
+import paging
+import master_data
+import push_engine
 import sync_store
-from google.protobuf import empty_pb2
+import bill_validation
+import bill_pipeline
+import metrics
+import rpc_metrics
+import log_setup
 
-logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s: %(message)s')
 logger = logging.getLogger('erp_service')
+# health checks arrive every few seconds; sample with ERP_LOG_SAMPLE=erp_service.health=N
+health_logger = logging.getLogger('erp_service.health')
 
 
 class ERPInitializationServicer(initialization_pb2_grpc.InitializationServicer):
     # 必须实现的在线检查接口
     def CheckErpConnection(self, request, context):
-        # 记录接收到的请求（Empty 没有字段，但保留日志位于将来扩展）
-        logger.info('Received CheckErpConnection request from %s', context.peer())
         # The generated protobuf defines G_CheckErpConnectionResponse with fields Success and Msg
         # G_CheckErpConnectionResponse is generated dynamically by the protobuf
         # runtime via descriptors and may not be visible to static type checkers
@@ -26,78 +40,238 @@ class ERPInitializationServicer(initialization_pb2_grpc.InitializationServicer):
             Success=True,  # 模拟ERP在线
             Msg="OK"     # 消息说明
         )
-        logger.info('Responding CheckErpConnection: Success=%s, Msg=%s', resp.Success, resp.Msg)
+        # 每次调用只记一行（Empty 没有字段，记录来源即可）
+        health_logger.info('CheckErpConnection from %s: Success=%s, Msg=%s', context.peer(), resp.Success, resp.Msg)
         return resp
 
 
+def _push_rpc(name):
+    """Servicer method for a G_PushRequest RPC: answers at once, pushes in the background."""
+    def handler(self, request, context):
+        logger.info('%s called: SynchroId=%s Count=%s PushAddress=%s',
+                    name, request.SynchroId, request.Count, request.PushAddress)
+        if not self.push.has_source(name):
+            context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+            context.set_details(f'{name}: no data source configured')
+            return common_pb2.G_PushResponse()  # type: ignore[attr-defined]
+        return self.push.start(name, request)
+    handler.__name__ = name
+    return handler
+
+
+def _page_rpc(name, page_type):
+    """Servicer method for a G_BaseInfoRequest RPC: one page from the paging source registered for it."""
+    def handler(self, request, context):
+        if not self.pager.has_source(name):
+            context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+            context.set_details(f'{name}: no data source configured')
+            return page_type()
+        try:
+            return self.pager.page(name, request, page_type)
+        except paging.PageOutOfRange as e:
+            context.set_code(grpc.StatusCode.OUT_OF_RANGE)
+            context.set_details(f'{name}: {e}')
+            return page_type()
+    handler.__name__ = name
+    return handler
+
+
 class OrderServicer(order_pb2_grpc.OrderServicer):
-    """实现部分 Order 服务，示例：实现 SynchroSaleOrderList 来同步订单列表"""
-    def SynchroSaleOrderList(self, request, context):
+    """Order 服务：三个单据同步接口共用 bill_pipeline 的分阶段流水线"""
+    # RPC name -> rule set for bills whose BillType has no mapping
+    PIPELINES = {
+        'SynchroSaleOrderList': None,
+        'SynchroReceiptOrderList': 'receipt',
+        'SynchroLsSaleOrderList': 'retail',
+        'SynchroBillStream': None,
+        'SynchroBillBidiStream': None,
+    }
+
+    def __init__(self, push=None):
+        self.push = push
+        # one idempotency index for all three RPCs: keys already include BillType
+        self.idempotency = bill_pipeline.IdempotencyIndex()
+        self.pipelines = {
+            name: bill_pipeline.BillSyncPipeline(name, default_rule_set=rule_set, idempotency=self.idempotency)
+            for name, rule_set in self.PIPELINES.items()
+        }
+
+    def _sync(self, name, request):
         # request: G_SyncBillListRequest
-        logger.info('SynchroSaleOrderList called with %d bills', len(request.Data))
-        resp = order_pb2.G_SyncBillListInfoResponse()  # type: ignore[attr-defined]
-        for bill in request.Data:
-            info = order_pb2.G_SyncBillInfoResponse()  # type: ignore[attr-defined]
-            info.ErpKey = getattr(bill, 'BillKey', '') or ''
-            info.BillKey = getattr(bill, 'BillKey', '') or ''
-
-            total_details = len(getattr(bill, 'Details', []))
-            ok_count = 0
-            errors = []
-
-            # 验证每个明细（ProductKey、Qty、Price）
-            for d in getattr(bill, 'Details', []):
-                prod = getattr(d, 'ProductKey', '')
-                qty = getattr(d, 'Qty', 0)
-                price = getattr(d, 'Price', 0)
-                if not prod:
-                    errors.append('missing ProductKey')
-                    continue
-                if qty is None or qty <= 0:
-                    errors.append(f'bad Qty for {prod}')
-                    continue
-                if price is None or price < 0:
-                    errors.append(f'bad Price for {prod}')
-                    continue
-                ok_count += 1
-
-            # 根据验证结果设置 SyncState/Msg
-            if ok_count == total_details and total_details > 0:
-                try:
-                    info.SyncState = common_pb2.G_SyncStateType.SyncSuccess  # type: ignore[attr-defined]
-                except Exception:
-                    info.SyncState = 1
-                info.SyncMsg = f'Synced {ok_count}/{total_details} details'
-                info.ErrorCode = 0
-            else:
-                try:
-                    info.SyncState = common_pb2.G_SyncStateType.SyncFail  # type: ignore[attr-defined]
-                except Exception:
-                    info.SyncState = 2
-                if total_details == 0:
-                    info.SyncMsg = 'No details to sync'
-                else:
-                    info.SyncMsg = 'Errors: ' + ';'.join(errors[:5])
-                info.ErrorCode = 1001
-
-            # 复制单据类型（如果有）
-            info.BillType = getattr(bill, 'BillType', 0)
-            resp.Data.append(info)
-            logger.info('Processed bill %s: %s', info.BillKey, info.SyncMsg)
-            # persist result
-            try:
-                sync_store.save_result(info.BillKey, info.ErpKey, info.SyncState, info.SyncMsg, info.ErrorCode)
-            except Exception as e:
-                logger.warning('Failed to save sync result for %s: %s', info.BillKey, e)
+        logger.info('%s called with %d bills', name, len(request.Data))
+        return self.pipelines[name].run(request)
 
-        return resp
+    def SynchroSaleOrderList(self, request, context):
+        return self._sync('SynchroSaleOrderList', request)
 
+    def SynchroReceiptOrderList(self, request, context):
+        return self._sync('SynchroReceiptOrderList', request)
 
-def serve(host='[::]:50051', max_workers=10):
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
-    initialization_pb2_grpc.add_InitializationServicer_to_server(ERPInitializationServicer(), server)
-    # 注册 Order 服务
-    order_pb2_grpc.add_OrderServicer_to_server(OrderServicer(), server)
+    def SynchroLsSaleOrderList(self, request, context):
+        return self._sync('SynchroLsSaleOrderList', request)
+
+    def SynchroBillStream(self, request, context):
+        # each yield waits for the previous message to be sent, so a slow reader throttles validation
+        logger.info('SynchroBillStream called with %d bills', len(request.Data))
+        yield from self.pipelines['SynchroBillStream'].stream(request.Data)
+
+    def SynchroBillBidiStream(self, request_iterator, context):
+        # one bill at a time: the client may wait for a result before sending the next bill
+        yield from self.pipelines['SynchroBillBidiStream'].stream(request_iterator, chunk_size=1)
+
+    PushPostBill = _push_rpc('PushPostBill')
+    PushDeleteBill = _push_rpc('PushDeleteBill')
+    PushDeliveryBill = _push_rpc('PushDeliveryBill')
+    PushBillCenterList = _push_rpc('PushBillCenterList')
+
+
+class ProductServicer(product_pb2_grpc.ProductServicer):
+    """Product 服务：目前只实现 Push* 推送接口和分类分页查询"""
+    def __init__(self, push, pager):
+        self.push = push
+        self.pager = pager
+
+    GetPageProductClassifyList = _page_rpc('GetPageProductClassifyList',
+                                           product_pb2.G_PageProductClassifyResponse)  # type: ignore[attr-defined]
+
+    PushProduct = _push_rpc('PushProduct')
+    PushProductStock = _push_rpc('PushProductStock')
+    PushProductVirtualStock = _push_rpc('PushProductVirtualStock')
+    PushProductPrice = _push_rpc('PushProductPrice')
+    PushProductUnits = _push_rpc('PushProductUnits')
+    PushProductState = _push_rpc('PushProductState')
+    PushProductAttribute = _push_rpc('PushProductAttribute')
+
+
+class CustomerServicer(customer_pb2_grpc.CustomerServicer):
+    """Customer 服务：目前只实现 Push* 推送接口和分类分页查询"""
+    def __init__(self, push, pager):
+        self.push = push
+        self.pager = pager
+
+    PageCustomerClassifyList = _page_rpc('PageCustomerClassifyList',
+                                         customer_pb2.G_PageCustomerClassifyResponse)  # type: ignore[attr-defined]
+
+    PushCustomer = _push_rpc('PushCustomer')
+    PushCustomerSaleReport = _push_rpc('PushCustomerSaleReport')
+    PushCustromerBuyProductInfo = _push_rpc('PushCustromerBuyProductInfo')
+    PushCustomerState = _push_rpc('PushCustomerState')
+
+
+class MemberServicer(member_pb2_grpc.MemberServicer):
+    """Member 服务：目前只实现 Push* 推送接口和 G_BaseInfoRequest 分页查询"""
+    def __init__(self, push, pager):
+        self.push = push
+        self.pager = pager
+
+    PageMemberClassifyList = _page_rpc('PageMemberClassifyList',
+                                       member_pb2.G_MemberClassifyListResponse)  # type: ignore[attr-defined]
+    PageMemberTradeStatisticsList = _page_rpc('PageMemberTradeStatisticsList',
+                                              member_pb2.G_PageMemberTradeStatisticsResponse)  # type: ignore[attr-defined]
+    PageMemberIntegralBalanceList = _page_rpc('PageMemberIntegralBalanceList',
+                                              member_pb2.G_PageMemberIntegralBalanceListResponse)  # type: ignore[attr-defined]
+
+    PushChangeMember = _push_rpc('PushChangeMember')
+    PushCouponUseState = _push_rpc('PushCouponUseState')
+    PushMemberTradeReport = _push_rpc('PushMemberTradeReport')
+
+
+class BasicInfoServicer(basicInfo_pb2_grpc.BasicInfoServicer):
+    """BasicInfo 服务：目前只实现 Push* 推送接口、ResetPush 和 Page* 分页查询"""
+    def __init__(self, push, pager):
+        self.push = push
+        self.pager = pager
+
+    PageBranchDataList = _page_rpc('PageBranchDataList', basicInfo_pb2.G_PageBranchInfoResponse)  # type: ignore[attr-defined]
+    PageEmployeeDataList = _page_rpc('PageEmployeeDataList', basicInfo_pb2.G_PageEmployeeInfoResponse)  # type: ignore[attr-defined]
+    PageStockDataList = _page_rpc('PageStockDataList', basicInfo_pb2.G_PageStockInfoResponse)  # type: ignore[attr-defined]
+    PageSubjectDataList = _page_rpc('PageSubjectDataList', basicInfo_pb2.G_PageSubjectInfoResponse)  # type: ignore[attr-defined]
+    PagePriceDataList = _page_rpc('PagePriceDataList', basicInfo_pb2.G_PagePriceInfoResponse)  # type: ignore[attr-defined]
+    PageDepartmentList = _page_rpc('PageDepartmentList', basicInfo_pb2.G_PageDepartmentResponse)  # type: ignore[attr-defined]
+    PageMenInfoDataList = _page_rpc('PageMenInfoDataList', basicInfo_pb2.G_PageMenInfoResponse)  # type: ignore[attr-defined]
+    GetAccountItemList = _page_rpc('GetAccountItemList', basicInfo_pb2.G_AccountItemReponse)  # type: ignore[attr-defined]
+    PageTabulateInfoList = _page_rpc('PageTabulateInfoList', basicInfo_pb2.G_PageTabulateInfoResponse)  # type: ignore[attr-defined]
+
+    def ResetPush(self, request, context):
+        # Keys are the SynchroIds to restart from scratch; none means every push
+        try:
+            ids = {int(key) for key in request.Keys} or None
+        except ValueError:
+            return common_pb2.G_PushResponse(State=2, Msg='Keys must be SynchroIds')  # type: ignore[attr-defined]
+        cleared = self.push.reset(ids)
+        logger.info('ResetPush(Keys=%s, PushType=%s): cleared %d checkpoints', list(request.Keys), request.PushType, cleared)
+        return common_pb2.G_PushResponse(State=1, Msg=f'cleared {cleared} push checkpoints')  # type: ignore[attr-defined]
+
+    PushEmployee = _push_rpc('PushEmployee')
+    PushWarehouse = _push_rpc('PushWarehouse')
+    PushErpDiffTypeIDKey = _push_rpc('PushErpDiffTypeIDKey')
+    PushMultiAttribute = _push_rpc('PushMultiAttribute')
+
+
+def _add_info_services(server, push, pager):
+    product_pb2_grpc.add_ProductServicer_to_server(ProductServicer(push, pager), server)
+    customer_pb2_grpc.add_CustomerServicer_to_server(CustomerServicer(push, pager), server)
+    member_pb2_grpc.add_MemberServicer_to_server(MemberServicer(push, pager), server)
+    basicInfo_pb2_grpc.add_BasicInfoServicer_to_server(BasicInfoServicer(push, pager), server)
+
+
+class AsyncERPInitializationServicer(ERPInitializationServicer):
+    """grpc.aio variant of ERPInitializationServicer."""
+    async def CheckErpConnection(self, request, context):
+        return ERPInitializationServicer.CheckErpConnection(self, request, context)
+
+
+class AsyncOrderServicer(OrderServicer):
+    """grpc.aio variant of OrderServicer.
+
+    Every stage but respond is offloaded to `executor`: dedupe may query
+    sync_results and persist writes it, so slow SQLite I/O never holds up the
+    event loop.
+    """
+    def __init__(self, executor, push=None):
+        super().__init__(push)
+        self._executor = executor
+
+    async def _sync(self, name, request):
+        logger.info('%s called with %d bills', name, len(request.Data))
+        pipeline = self.pipelines[name]
+        loop = asyncio.get_running_loop()
+        batch = await loop.run_in_executor(self._executor, pipeline.prepare, request)
+        await loop.run_in_executor(self._executor, pipeline.persist, batch)
+        return pipeline.respond(batch)
+
+    async def SynchroSaleOrderList(self, request, context):
+        return await self._sync('SynchroSaleOrderList', request)
+
+    async def SynchroReceiptOrderList(self, request, context):
+        return await self._sync('SynchroReceiptOrderList', request)
+
+    async def SynchroLsSaleOrderList(self, request, context):
+        return await self._sync('SynchroLsSaleOrderList', request)
+
+    async def _process(self, pipeline, bills):
+        loop = asyncio.get_running_loop()
+        batch = await loop.run_in_executor(self._executor, pipeline.prepare_bills, bills)
+        await loop.run_in_executor(self._executor, pipeline.persist, batch)
+        return batch.results
+
+    async def SynchroBillStream(self, request, context):
+        logger.info('SynchroBillStream called with %d bills', len(request.Data))
+        pipeline = self.pipelines['SynchroBillStream']
+        size = bill_pipeline.STREAM_CHUNK_SIZE
+        for start in range(0, len(request.Data), size):
+            for info in await self._process(pipeline, request.Data[start:start + size]):
+                yield info
+
+    async def SynchroBillBidiStream(self, request_iterator, context):
+        pipeline = self.pipelines['SynchroBillBidiStream']
+        async for bill in request_iterator:
+            for info in await self._process(pipeline, [bill]):
+                yield info
+
+
+def _bind(server, host):
+    """Bind `host` on `server` and return the address actually bound."""
     # Try multiple addresses to be robust across IPv6/IPv4 system configurations
     # derive port from the requested host so fallbacks use the same port
     try:
@@ -122,29 +296,290 @@ def serve(host='[::]:50051', max_workers=10):
     if not bound_address:
         logger.error('Failed to bind to any address from %s', bind_candidates)
         raise RuntimeError(f'Failed to bind to addresses: {bind_candidates}')
+    return bound_address
+
+
+def _startup(write_behind):
+    # load and compile validation rules now so a bad config fails at startup, not per request
+    registry = bill_validation.load_registry()
+    bill_validation.install_registry(registry)
+    logger.info('Loaded validation rule sets: %s', ', '.join(registry.rule_sets))
+    # BasicInfo Page* lists served from memory; a bad master data file fails here too
+    entities = master_data.load_file()
+    if entities:
+        logger.info('Master data cache: %s', ', '.join(entities))
+    # apply schema migrations up front so RPC handlers never run DDL
+    sync_store.migrate()
+    if write_behind:
+        sync_store.enable_write_behind()
+        logger.info('Write-behind persistence enabled')
+
+
+def _shutdown():
+    stats = sync_store.disable_write_behind()
+    if stats is not None:
+        logger.info('Write-behind flushed on shutdown: %s', stats)
+    sync_store.close_all()
+
+
+def _start_metrics(metrics_port, order_servicer, interceptor):
+    """Serve /metrics on `metrics_port` and return the server interceptors to install."""
+    if not metrics_port:
+        return []
+    metrics.REGISTRY.add_collector(rpc_metrics.service_collector(order_servicer))
+    metrics.start_http_server(metrics_port)
+    return [interceptor]
+
+
+def _server_options(reuseport):
+    # SO_REUSEPORT lets several worker processes bind the same port; the kernel balances connections.
+    # Pooled clients (grpc_channels) keep idle connections alive with pings, so accept them
+    # every 30s instead of answering with GOAWAY after the default 5 minutes.
+    return [('grpc.so_reuseport', 1 if reuseport else 0),
+            ('grpc.keepalive_permit_without_calls', 1),
+            ('grpc.http2.min_ping_interval_without_data_ms', 30000)]
+
+
+def serve(host='[::]:50051', max_workers=10, write_behind=False, stop_grace=5.0, max_concurrent_rpcs=None,
+          reuseport=False, metrics_port=None):
+    _startup(write_behind)
+    push = push_engine.PushEngine()
+    order_servicer = OrderServicer(push)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),
+                         interceptors=_start_metrics(metrics_port, order_servicer, rpc_metrics.MetricsInterceptor()),
+                         options=_server_options(reuseport),
+                         maximum_concurrent_rpcs=max_concurrent_rpcs)
+    initialization_pb2_grpc.add_InitializationServicer_to_server(ERPInitializationServicer(), server)
+    # 注册 Order 服务
+    order_pb2_grpc.add_OrderServicer_to_server(order_servicer, server)
+    _add_info_services(server, push, paging.Pager())
+    bound_address = _bind(server, host)
 
     logger.info('Starting gRPC server on %s (workers=%d)', bound_address, max_workers)
     server.start()
+    _install_sigterm_handler(server, stop_grace)
     try:
         # block until termination
         server.wait_for_termination()
     except KeyboardInterrupt:
-        logger.info('Server interrupted by user, stopping...')
-        server.stop(0)
+        # Ctrl+C reaches multi-process workers too: drain like SIGTERM instead of dropping RPCs
+        logger.info('Server interrupted by user, stopping (grace=%.1fs)...', stop_grace)
+        server.stop(stop_grace).wait()
+    finally:
+        push.shutdown()
+        _shutdown()
 
 
-def parse_host(default='[::]:50051'):
+def _install_sigterm_handler(server, grace):
+    """Stop the server gracefully on SIGTERM (docker stop) so shutdown hooks still run."""
+    import signal
+    import threading
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    def handle(signum, frame):
+        logger.info('Received signal %d, stopping (grace=%.1fs)...', signum, grace)
+        server.stop(grace)
+
+    signal.signal(signal.SIGTERM, handle)
+
+
+async def _serve_async(host, max_concurrent_rpcs, persist_workers, write_behind, stop_grace, reuseport,
+                       metrics_port):
+    import signal
+    _startup(write_behind)
+    # the only threads this mode uses: a small fixed pool for blocking persistence
+    executor = futures.ThreadPoolExecutor(max_workers=persist_workers, thread_name_prefix='erp-persist')
+    push = push_engine.PushEngine()
+    order_servicer = AsyncOrderServicer(executor, push)
+    server = grpc.aio.server(
+        interceptors=_start_metrics(metrics_port, order_servicer, rpc_metrics.AsyncMetricsInterceptor()),
+        options=_server_options(reuseport), maximum_concurrent_rpcs=max_concurrent_rpcs)
+    initialization_pb2_grpc.add_InitializationServicer_to_server(AsyncERPInitializationServicer(), server)
+    order_pb2_grpc.add_OrderServicer_to_server(order_servicer, server)
+    # Push* handlers only validate and start a background thread, so they stay synchronous;
+    # synchronous Page* handlers run on the default executor, off the event loop
+    _add_info_services(server, push, paging.Pager())
+    bound_address = _bind(server, host)
+
+    logger.info('Starting grpc.aio server on %s (max_concurrent_rpcs=%s, persist_workers=%d)',
+                bound_address, max_concurrent_rpcs, persist_workers)
+    await server.start()
+
+    loop = asyncio.get_running_loop()
+
+    def handle(signum):
+        logger.info('Received signal %d, stopping (grace=%.1fs)...', signum, stop_grace)
+        loop.create_task(server.stop(stop_grace))
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, handle, signum)
+        except (NotImplementedError, RuntimeError):
+            # Windows event loops do not support signal handlers; Ctrl+C still raises KeyboardInterrupt
+            pass
+    try:
+        await server.wait_for_termination()
+    finally:
+        executor.shutdown(wait=True)
+        push.shutdown()
+        _shutdown()
+
+
+def serve_async(host='[::]:50051', max_concurrent_rpcs=None, persist_workers=4, write_behind=False, stop_grace=5.0,
+                reuseport=False, metrics_port=None):
+    """Run every service (Initialization, Order, Product, Customer, Member, BasicInfo) on grpc.aio."""
+    try:
+        asyncio.run(_serve_async(host, max_concurrent_rpcs, persist_workers, write_behind, stop_grace, reuseport,
+                                 metrics_port))
+    except KeyboardInterrupt:
+        logger.info('Server interrupted by user, stopped')
+
+
+def _worker_main(async_mode, kwargs, log_options=None):
+    # entry point of each pre-forked worker process (spawned, so it re-imports this module)
+    log_setup.setup_logging(**(log_options or {}))
+    if async_mode:
+        serve_async(reuseport=True, **kwargs)
+    else:
+        serve(reuseport=True, **kwargs)
+
+
+def serve_multiprocess(processes, async_mode=False, stop_grace=5.0, restart_backoff=1.0, log_options=None,
+                       **kwargs):
+    """Supervise `processes` server workers that share one port through SO_REUSEPORT.
+
+    Each worker is a full server (threaded or grpc.aio) with its own GIL, so protobuf
+    parsing and validation scale across cores. Dead workers are restarted (with
+    exponential backoff while they keep crashing right after start); SIGTERM/SIGINT
+    are forwarded to the workers, which drain for `stop_grace` seconds before exiting.
+    With `metrics_port` set, worker N serves its own /metrics on metrics_port + N.
+    """
+    import multiprocessing
+    import signal
+    import sys
+    import time
+
+    if not sys.platform.startswith('linux'):
+        logger.warning('SO_REUSEPORT multi-process mode needs Linux; running a single process instead')
+        if async_mode:
+            return serve_async(stop_grace=stop_grace, **kwargs)
+        return serve(stop_grace=stop_grace, **kwargs)
+
+    # migrate once here so workers starting together do not race on DDL
+    sync_store.migrate()
+    sync_store.close_all()
+    # spawn rather than fork: gRPC core is not fork-safe
+    ctx = multiprocessing.get_context('spawn')
+    worker_kwargs = dict(kwargs, stop_grace=stop_grace)
+    stopping = False
+    # exists before the signal handlers, which may run while workers are starting
+    workers = []
+
+    def start(slot):
+        slot_kwargs = dict(worker_kwargs)
+        if slot_kwargs.get('metrics_port'):
+            slot_kwargs['metrics_port'] += slot
+        proc = ctx.Process(target=_worker_main, args=(async_mode, slot_kwargs, log_options),
+                           name=f'erp-worker-{slot}')
+        proc.start()
+        logger.info('Started worker %d (pid=%d)', slot, proc.pid)
+        return proc
+
+    def handle(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            logger.info('Supervisor received signal %d, stopping %d workers...', signum, len(workers))
+        stopping = True
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+
+    for i in range(processes):
+        if stopping:
+            break
+        workers.append(start(i))
+    started_at = [time.monotonic()] * processes
+    backoff = [0.0] * processes
+    restart_at = [None] * processes
+    while not stopping:
+        time.sleep(0.5)
+        now = time.monotonic()
+        for i, proc in enumerate(workers):
+            if stopping or proc.is_alive():
+                continue
+            if restart_at[i] is None:
+                # a worker that ran for a while gets restarted immediately; crash loops back off
+                crashed_fast = now - started_at[i] < 10.0
+                backoff[i] = min(max(backoff[i] * 2, restart_backoff), 60.0) if crashed_fast else 0.0
+                restart_at[i] = now + backoff[i]
+                logger.warning('Worker %d (pid=%d) exited with code %s; restarting in %.1fs',
+                               i, proc.pid, proc.exitcode, backoff[i])
+            if now >= restart_at[i]:
+                workers[i] = start(i)
+                started_at[i] = now
+                restart_at[i] = None
+
+    for proc in workers:
+        if proc.is_alive():
+            proc.terminate()  # SIGTERM -> graceful server.stop(stop_grace) in the worker
+    deadline = time.monotonic() + stop_grace + 5.0
+    for proc in workers:
+        proc.join(max(0.0, deadline - time.monotonic()))
+        if proc.is_alive():
+            logger.warning('Worker pid=%d did not stop in time, killing', proc.pid)
+            proc.kill()
+            proc.join()
+    logger.info('All workers stopped')
+
+
+def parse_args(argv=None, default='[::]:50051'):
     import os
     import argparse
     parser = argparse.ArgumentParser(description='Start ERP gRPC server')
     parser.add_argument('--host', default=os.getenv('ERP_HOST', default), help='Host:port to bind (e.g. [::]:50051 or 0.0.0.0:50051)')
     parser.add_argument('--workers', type=int, default=int(os.getenv('ERP_WORKERS', '10')),
                         help='Number of worker threads for the gRPC server')
-    args = parser.parse_args()
+    parser.add_argument('--write-behind', action='store_true', default=os.getenv('ERP_WRITE_BEHIND', '') == '1',
+                        help='Persist sync results asynchronously from a background writer thread')
+    parser.add_argument('--async', dest='async_mode', action='store_true', default=os.getenv('ERP_ASYNC', '') == '1',
+                        help='Serve on grpc.aio instead of a thread pool (--workers then sizes the persistence pool)')
+    parser.add_argument('--processes', type=int, default=int(os.getenv('ERP_PROCESSES', '1')),
+                        help='Run N worker processes sharing the port via SO_REUSEPORT (Linux only)')
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('ERP_METRICS_PORT', '0')) or None,
+                        help='Serve Prometheus-style /metrics on this port (with --processes, one port per worker)')
+    parser.add_argument('--log-format', choices=('plain', 'json'), default=os.getenv('ERP_LOG_FORMAT', 'plain'),
+                        help='Log line format; json emits one object per line')
+    parser.add_argument('--log-sample', default=os.getenv('ERP_LOG_SAMPLE', ''),
+                        help='Keep 1 in N INFO lines per logger, e.g. bill_pipeline.bills=100 (errors always kept)')
+    parser.add_argument('--max-concurrent-rpcs', type=int,
+                        default=int(os.getenv('ERP_MAX_CONCURRENT_RPCS', '0')) or None,
+                        help='Reject RPCs beyond this many in flight with RESOURCE_EXHAUSTED (default: unlimited)')
+    return parser.parse_args(argv)
+
+
+def parse_host(default='[::]:50051'):
+    args = parse_args(default=default)
     return args.host, args.workers
 
 
 if __name__ == '__main__':
-    host, workers = parse_host()
-    logger.info('Configured host=%s workers=%d', host, workers)
-    serve(host=host, max_workers=workers)
\ No newline at end of file
+    args = parse_args()
+    log_options = dict(fmt=args.log_format, sample=args.log_sample)
+    log_setup.setup_logging(**log_options)
+    logger.info('Configured host=%s workers=%d processes=%d write_behind=%s async=%s max_concurrent_rpcs=%s',
+                args.host, args.workers, args.processes, args.write_behind, args.async_mode, args.max_concurrent_rpcs)
+    if args.processes > 1:
+        common = dict(host=args.host, write_behind=args.write_behind, max_concurrent_rpcs=args.max_concurrent_rpcs,
+                      metrics_port=args.metrics_port)
+        if args.async_mode:
+            common['persist_workers'] = args.workers
+        else:
+            common['max_workers'] = args.workers
+        serve_multiprocess(args.processes, async_mode=args.async_mode, log_options=log_options, **common)
+    elif args.async_mode:
+        serve_async(host=args.host, max_concurrent_rpcs=args.max_concurrent_rpcs,
+                    persist_workers=args.workers, write_behind=args.write_behind, metrics_port=args.metrics_port)
+    else:
+        serve(host=args.host, max_workers=args.workers, write_behind=args.write_behind,
+              max_concurrent_rpcs=args.max_concurrent_rpcs, metrics_port=args.metrics_port)
@@ -1,5 +1,5 @@
 from flask import Flask, jsonify
-from .grpc_client import call_synchro_sample
+from .grpc_client import call_synchro_sample, check_ready
 from .config import cfg
 
 app = Flask(__name__)
@@ -10,6 +10,13 @@ def health():
     return jsonify({'status': 'ok'})
 
 
+@app.route('/ready')
+def ready():
+    # ready once the pooled channel to ERP_TARGET is connected
+    ok, target = check_ready(timeout=2)
+    return jsonify({'ready': ok, 'target': target}), (200 if ok else 503)
+
+
 @app.route('/report')
 def report():
     success, data = call_synchro_sample()
@@ -1,39 +1,261 @@
 import requests
+import http_client
 import logging
+import os
+import random
+import sqlite3
+import threading
 import time
-from typing import Tuple, Optional
+from typing import Callable, Optional, Tuple
 from .config import cfg
 
 logger = logging.getLogger(__name__)
 
-# Simple in-memory token cache
-# _CACHE = { 'token': str, 'expires_at': float }
-_CACHE: dict = {}
+# default TTL when the token endpoint does not say, to avoid permanent caching
+_DEFAULT_TTL = 300
+# treat a token as expired slightly before the server does
+_EXPIRY_MARGIN = 5.0
 
 
-def _get_cached_token() -> Optional[str]:
-    now = time.time()
-    tok = _CACHE.get('token')
-    exp = _CACHE.get('expires_at')
-    if tok and exp and now < exp:
-        return tok
-    return None
+class TokenError(Exception):
+    pass
 
 
-def _set_cached_token(token: str, ttl_seconds: Optional[int] = None) -> None:
-    if ttl_seconds is None:
-        # default short TTL to avoid permanent caching when no expiry provided
-        ttl_seconds = 300
-    _CACHE['token'] = token
-    _CACHE['expires_at'] = time.time() + float(ttl_seconds) - 5.0  # small margin
+class _SharedCache:
+    """Token shared by every process on the host through a one-row SQLite table.
 
+    Besides the token it holds a refresh lease, so when N worker processes
+    find the token stale only the lease holder calls the token endpoint and
+    the others pick the new token up from the table.
+    """
 
-def set_handday_token(token: str, ttl_seconds: Optional[int] = None) -> None:
-    """Explicitly set a token into the in-memory cache.
+    def __init__(self, path: str):
+        self.path = path
+        self._ready = False
 
-    Use this when a token is obtained out-of-band (e.g., pasted into env or UI).
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        if not self._ready:
+            conn.execute('CREATE TABLE IF NOT EXISTS handday_token ('
+                         'id INTEGER PRIMARY KEY CHECK (id = 1), token TEXT, expires_at REAL NOT NULL DEFAULT 0, '
+                         'lease_owner TEXT, lease_until REAL NOT NULL DEFAULT 0)')
+            conn.execute('INSERT OR IGNORE INTO handday_token (id) VALUES (1)')
+            try:
+                # the file holds a live credential
+                os.chmod(self.path, 0o600)
+            except OSError:
+                pass
+            self._ready = True
+        return conn
+
+    def load(self) -> Tuple[Optional[str], float]:
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT token, expires_at FROM handday_token WHERE id = 1').fetchone()
+        finally:
+            conn.close()
+        return (row[0], row[1]) if row else (None, 0.0)
+
+    def store(self, token: str, expires_at: float) -> None:
+        conn = self._connect()
+        try:
+            conn.execute('UPDATE handday_token SET token = ?, expires_at = ? WHERE id = 1', (token, expires_at))
+        finally:
+            conn.close()
+
+    def acquire_lease(self, owner: str, seconds: float) -> bool:
+        now = time.time()
+        conn = self._connect()
+        try:
+            cur = conn.execute('UPDATE handday_token SET lease_owner = ?, lease_until = ? '
+                               'WHERE id = 1 AND (lease_until < ? OR lease_owner = ?)',
+                               (owner, now + seconds, now, owner))
+            return cur.rowcount == 1
+        finally:
+            conn.close()
+
+    def release_lease(self, owner: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute('UPDATE handday_token SET lease_until = 0 WHERE id = 1 AND lease_owner = ?', (owner,))
+        finally:
+            conn.close()
+
+
+class _Flight:
+    """One in-progress refresh; concurrent callers wait on it instead of fetching too."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.outcome: Tuple[bool, str] = (False, 'token refresh did not finish')
+
+
+class TokenManager:
+    """Token cache with single-flight refresh, background pre-expiry refresh and backoff.
+
+    - At most one refresh runs per process; concurrent get() calls wait for
+      its result. With a shared cache, at most one runs per host.
+    - refresh_margin seconds before the token expires a daemon timer fetches
+      a new one, so requests normally never wait for the token endpoint.
+    - After a failed refresh, further attempts back off exponentially (with
+      jitter) up to backoff_max; until then callers fail fast with the last error.
     """
-    _set_cached_token(token, ttl_seconds)
+
+    def __init__(self, fetch: Callable[[], Tuple[str, Optional[float]]], shared: Optional[_SharedCache] = None,
+                 refresh_margin: float = 60.0, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 lease_seconds: float = 15.0):
+        self._fetch = fetch
+        self._shared = shared
+        self.refresh_margin = refresh_margin
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._flight: Optional[_Flight] = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._last_error = ''
+        self._timer: Optional[threading.Timer] = None
+        self._owner = f'{os.getpid()}-{id(self)}'
+
+    def get(self, force_refresh: bool = False) -> Tuple[bool, str]:
+        """(True, token) or (False, error). force_refresh skips the caches (e.g. after UNAUTHENTICATED)."""
+        if not force_refresh:
+            token = self._cached(time.time())
+            if token:
+                return True, token
+        return self._refresh(force_refresh)
+
+    def set(self, token: str, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = self._expires(ttl_seconds)
+        self._shared_call('store', token, expires_at)
+        self._adopt(token, expires_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._token, self._expires_at = None, 0.0
+            self._failures, self._retry_at = 0, 0.0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    @staticmethod
+    def _expires(ttl_seconds: Optional[float]) -> float:
+        if ttl_seconds is None:
+            ttl_seconds = _DEFAULT_TTL
+        return time.time() + float(ttl_seconds) - _EXPIRY_MARGIN
+
+    def _shared_call(self, method: str, *args):
+        if self._shared is None:
+            return None
+        try:
+            return getattr(self._shared, method)(*args)
+        except sqlite3.Error as e:
+            # the shared file is an optimisation; fall back to per-process caching
+            logger.warning('Shared token cache %s failed: %s', method, e)
+            return None
+
+    def _cached(self, now: float) -> Optional[str]:
+        if self._token and now < self._expires_at:
+            return self._token
+        shared = self._shared_call('load')
+        if shared and shared[0] and now < shared[1]:
+            self._adopt(*shared)
+            return shared[0]
+        return None
+
+    def _adopt(self, token: str, expires_at: float) -> None:
+        with self._lock:
+            self._token, self._expires_at = token, expires_at
+            self._failures, self._retry_at = 0, 0.0
+            lifetime = expires_at - time.time()
+            # short-lived tokens are renewed half way through instead
+            self._schedule(lifetime - min(self.refresh_margin, lifetime / 2))
+
+    def _schedule(self, delay: float) -> None:
+        # caller holds self._lock
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(delay, 0.0), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self) -> None:
+        ok, msg = self._refresh(False)
+        if not ok:
+            logger.warning('Background Handday token refresh failed: %s', msg)
+
+    def _refresh(self, force: bool) -> Tuple[bool, str]:
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                if time.time() < self._retry_at:
+                    return False, f'token refresh backing off after error: {self._last_error}'
+                flight = self._flight = _Flight()
+        if not leader:
+            flight.done.wait(self.lease_seconds * 2)
+            return flight.outcome
+        try:
+            flight.outcome = self._refresh_once(force)
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+        return flight.outcome
+
+    def _fresh_shared(self, replacing: Optional[str]) -> Optional[Tuple[str, float]]:
+        # a valid token another process fetched since we got the one we are replacing
+        shared = self._shared_call('load')
+        if shared and shared[0] and shared[0] != replacing and time.time() < shared[1]:
+            return shared
+        return None
+
+    def _refresh_once(self, force: bool) -> Tuple[bool, str]:
+        replacing = self._token
+        if force and replacing is None:
+            # the rejected token came from the shared cache; don't adopt it back
+            shared = self._shared_call('load')
+            replacing = shared[0] if shared else None
+        leased = self._shared_call('acquire_lease', self._owner, self.lease_seconds)
+        if self._shared is not None and leased is False:
+            # another process holds the lease: wait for its token to land
+            deadline = time.time() + self.lease_seconds
+            while time.time() < deadline:
+                shared = self._fresh_shared(replacing)
+                if shared:
+                    self._adopt(*shared)
+                    return True, shared[0]
+                time.sleep(0.1)
+            logger.warning('Token refresh lease holder did not finish; fetching directly')
+        try:
+            shared = self._fresh_shared(replacing)
+            if shared:
+                self._adopt(*shared)
+                return True, shared[0]
+            token, ttl = self._fetch()
+            self.set(token, ttl)
+            return True, token
+        except Exception as e:
+            return self._failed(str(e))
+        finally:
+            if leased:
+                self._shared_call('release_lease', self._owner)
+
+    def _failed(self, error: str) -> Tuple[bool, str]:
+        with self._lock:
+            self._failures += 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (self._failures - 1))
+            # jitter so processes that failed together do not retry together
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            self._retry_at = time.time() + delay
+            self._last_error = error
+            if self._token and time.time() < self._expires_at:
+                # the current token is still usable; try again in the background
+                self._schedule(delay)
+        return False, error
 
 
 def _extract_token_and_ttl(j: dict) -> Tuple[Optional[str], Optional[int]]:
@@ -73,27 +295,7 @@ def _extract_token_and_ttl(j: dict) -> Tuple[Optional[str], Optional[int]]:
     return token, ttl
 
 
-def get_handday_token(force_refresh: bool = False) -> Tuple[bool, str]:
-    """Fetch token from Handday token endpoint with simple in-memory caching.
-
-    Returns (True, token) or (False, error_message).
-    If force_refresh is False, a cached valid token will be returned.
-    """
-    # 1) If an explicit token is provided via environment var, use it (highest priority)
-    env_tok = getattr(cfg, 'HANDDAY_TOKEN', None)
-    if env_tok:
-        logger.debug('Using token supplied via HANDDAY_TOKEN env var')
-        _set_cached_token(env_tok, ttl_seconds=3600)
-        return True, env_tok
-
-    # 2) Return cached if available
-    if not force_refresh:
-        cached = _get_cached_token()
-        if cached:
-            logger.debug('Using cached Handday token')
-            return True, cached
-
-    url = cfg.HANDDAY_TOKEN_URL
+def _token_payload() -> dict:
     # build payload using available config values
     payload = {}
     if cfg.HANDDAY_CORP_ID:
@@ -110,35 +312,78 @@ def get_handday_token(force_refresh: bool = False) -> Tuple[bool, str]:
         payload['appId'] = cfg.HANDDAY_APP_ID
     if cfg.HANDDAY_APP_SECRET:
         payload['appSecret'] = cfg.HANDDAY_APP_SECRET
+    return payload
+
 
+def _request_token() -> Tuple[str, Optional[int]]:
+    """Call the Handday token endpoint; returns (token, ttl) or raises TokenError."""
+    url = cfg.HANDDAY_TOKEN_URL
+    payload = _token_payload()
     timeout = getattr(cfg, 'HANDDAY_AUTH_TIMEOUT', 5)
 
-    # try POST
     try:
         logger.debug('Requesting Handday token POST %s', url)
-        r = requests.post(url, json=payload or None, timeout=timeout)
+        r = http_client.post(url, json=payload or None, timeout=timeout)
         r.raise_for_status()
         j = r.json()
+    except (requests.ConnectionError, requests.Timeout) as e:
+        # the GET would go to the same unreachable host; don't wait for it twice
+        raise TokenError(f'POST error: {e}')
+    except Exception as e:
+        e_post = str(e)
+    else:
         token, ttl = _extract_token_and_ttl(j)
         if token:
-            _set_cached_token(token, ttl)
-            return True, token
-        return False, f'No token found in response JSON: {j}'
-    except Exception as e_post:
-        logger.warning('Handday token POST failed: %s', e_post)
-        # fallback to GET
-        try:
-            params = {k: v for k, v in payload.items() if v is not None}
-            logger.debug('Requesting Handday token GET %s params=%s', url, params)
-            r = requests.get(url, params=params, timeout=timeout)
-            r.raise_for_status()
-            j = r.json()
-            token, ttl = _extract_token_and_ttl(j)
-            if token:
-                _set_cached_token(token, ttl)
-                return True, token
-            return False, f'No token found in GET response JSON: {j}'
-        except Exception as e_get:
-            logger.exception('Handday token GET also failed')
-            return False, f'POST error: {e_post}; GET error: {e_get}'
+            return token, ttl
+        raise TokenError(f'No token found in response JSON: {j}')
+    logger.warning('Handday token POST failed: %s', e_post)
+
+    # the endpoint answered but rejected the POST: fall back to GET
+    try:
+        params = {k: v for k, v in payload.items() if v is not None}
+        logger.debug('Requesting Handday token GET %s params=%s', url, params)
+        r = http_client.get(url, params=params, timeout=timeout)
+        r.raise_for_status()
+        j = r.json()
+        token, ttl = _extract_token_and_ttl(j)
+        if token:
+            return token, ttl
+        raise TokenError(f'No token found in GET response JSON: {j}')
+    except TokenError:
+        raise
+    except Exception as e_get:
+        raise TokenError(f'POST error: {e_post}; GET error: {e_get}')
+
+
+_shared_path = getattr(cfg, 'HANDDAY_TOKEN_CACHE', '')
+TOKENS = TokenManager(
+    _request_token,
+    shared=_SharedCache(_shared_path) if _shared_path else None,
+    refresh_margin=getattr(cfg, 'HANDDAY_TOKEN_REFRESH_MARGIN', 60.0),
+    # POST and GET, each with http_client's retries
+    lease_seconds=2 * getattr(cfg, 'HANDDAY_AUTH_TIMEOUT', 5) * (1 + http_client.CLIENT.retries) + 5,
+)
+
+
+def set_handday_token(token: str, ttl_seconds: Optional[int] = None) -> None:
+    """Explicitly set a token into the cache (shared with other worker processes).
+
+    Use this when a token is obtained out-of-band (e.g., pasted into env or UI).
+    """
+    TOKENS.set(token, ttl_seconds)
+
+
+def get_handday_token(force_refresh: bool = False) -> Tuple[bool, str]:
+    """Return a Handday token, fetching it at most once at a time.
+
+    Returns (True, token) or (False, error_message).
+    If force_refresh is False, a cached valid token will be returned.
+    """
+    # 1) If an explicit token is provided via environment var, use it (highest priority)
+    env_tok = getattr(cfg, 'HANDDAY_TOKEN', None)
+    if env_tok:
+        logger.debug('Using token supplied via HANDDAY_TOKEN env var')
+        return True, env_tok
 
+    # 2) cached token (this process, then the shared cache), else a single-flight refresh
+    return TOKENS.get(force_refresh)
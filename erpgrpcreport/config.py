@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     ERP_TARGET = os.environ.get('ERP_TARGET', 'localhost:50051')
@@ -16,5 +17,10 @@ class Config:
     HANDDAY_AUTH_TIMEOUT = float(os.environ.get('HANDDAY_AUTH_TIMEOUT', '5'))
     # Optional: pre-provided token (useful for testing or when token is obtained out-of-band)
     HANDDAY_TOKEN = os.environ.get('HANDDAY_TOKEN')
+    # Token cache shared by all worker processes on the host (SQLite file); empty disables sharing
+    HANDDAY_TOKEN_CACHE = os.environ.get(
+        'HANDDAY_TOKEN_CACHE', os.path.join(tempfile.gettempdir(), 'erpgrpcreport_token.db'))
+    # Refresh the token in the background this many seconds before it expires
+    HANDDAY_TOKEN_REFRESH_MARGIN = float(os.environ.get('HANDDAY_TOKEN_REFRESH_MARGIN', '60'))
 
 cfg = Config()
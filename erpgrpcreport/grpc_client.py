@@ -1,4 +1,5 @@
 import grpc
+import grpc_channels
 import order_pb2
 import order_pb2_grpc
 from google.protobuf import empty_pb2
@@ -40,28 +41,34 @@ def call_synchro_sample(target: str = None, timeout: float = None):
         else:
             logger.warning('Failed to get Handday token: %s. Proceeding without token.', token_or_err)
 
-        with grpc.insecure_channel(tgt) as ch:
-            stub = order_pb2_grpc.OrderStub(ch)
-            try:
-                resp = stub.SynchroSaleOrderList(sample, timeout=to, metadata=metadata)
-                return True, resp
-            except grpc.RpcError as e:
-                # If unauthenticated, try once to refresh token and retry
-                if e.code() in (grpc.StatusCode.UNAUTHENTICATED, grpc.StatusCode.PERMISSION_DENIED):
-                    logger.info('RPC unauthenticated; attempting to refresh token and retry')
-                    ok2, token_or_err2 = get_handday_token()
-                    if ok2:
-                        metadata2 = [("authorization", f"Bearer {token_or_err2}")]
-                        try:
-                            resp2 = stub.SynchroSaleOrderList(sample, timeout=to, metadata=metadata2)
-                            return True, resp2
-                        except Exception as e2:
-                            return False, f'RPC retry failed: {e2}'
-                    else:
-                        return False, f'RPC failed (unauthenticated) and token refresh failed: {token_or_err2}'
-                # other RPC errors
-                return False, f'RPC failed: {e.code()} {e.details()}'
+        # shared, kept-alive channel: no TCP/HTTP2 handshake per report
+        stub = grpc_channels.get_stub(order_pb2_grpc.OrderStub, tgt)
+        try:
+            resp = stub.SynchroSaleOrderList(sample, timeout=to, metadata=metadata)
+            return True, resp
+        except grpc.RpcError as e:
+            # If unauthenticated, try once to refresh token and retry
+            if e.code() in (grpc.StatusCode.UNAUTHENTICATED, grpc.StatusCode.PERMISSION_DENIED):
+                logger.info('RPC unauthenticated; attempting to refresh token and retry')
+                ok2, token_or_err2 = get_handday_token()
+                if ok2:
+                    metadata2 = [("authorization", f"Bearer {token_or_err2}")]
+                    try:
+                        resp2 = stub.SynchroSaleOrderList(sample, timeout=to, metadata=metadata2)
+                        return True, resp2
+                    except Exception as e2:
+                        return False, f'RPC retry failed: {e2}'
+                else:
+                    return False, f'RPC failed (unauthenticated) and token refresh failed: {token_or_err2}'
+            # other RPC errors
+            return False, f'RPC failed: {e.code()} {e.details()}'
     except grpc.RpcError as e:
         return False, f'RPC failed: {e.code()} {e.details()}'
     except Exception as e:
         return False, str(e)
+
+
+def check_ready(target: str = None, timeout: float = None):
+    """Connect the shared channel to target; returns (ready: bool, target)."""
+    tgt = target or cfg.ERP_TARGET
+    return grpc_channels.wait_ready(tgt, timeout=timeout or cfg.GRPC_TIMEOUT), tgt
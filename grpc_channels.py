@@ -0,0 +1,139 @@
+"""Process-wide pool of gRPC client channels.
+
+A grpc.Channel multiplexes any number of concurrent calls over one HTTP/2
+connection and reconnects by itself, so clients should share one per target
+instead of opening (and paying TCP + HTTP/2 setup for) a channel per call:
+
+    stub = grpc_channels.get_stub(order_pb2_grpc.OrderStub, 'localhost:50051')
+    resp = stub.SynchroSaleOrderList(request, timeout=10)
+
+Channels are created lazily, keyed by target and options, and kept warm with
+HTTP/2 keepalive pings so an idle connection is not silently dropped by a
+NAT or load balancer between calls. close_all() runs at interpreter exit.
+
+Keepalive can be tuned from the environment:
+  ERP_GRPC_KEEPALIVE_MS          ping interval (default 60000)
+  ERP_GRPC_KEEPALIVE_TIMEOUT_MS  how long to wait for the ping ack (default 20000)
+The server must accept pings that often (erp_service allows one every 30s).
+"""
+import atexit
+import logging
+import os
+import threading
+
+import grpc
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_MS = int(os.environ.get('ERP_GRPC_KEEPALIVE_MS', '60000'))
+KEEPALIVE_TIMEOUT_MS = int(os.environ.get('ERP_GRPC_KEEPALIVE_TIMEOUT_MS', '20000'))
+
+DEFAULT_OPTIONS = (
+    ('grpc.keepalive_time_ms', KEEPALIVE_MS),
+    ('grpc.keepalive_timeout_ms', KEEPALIVE_TIMEOUT_MS),
+    # keep pinging between calls too, that is when idle connections get dropped
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+)
+
+
+def _key(target, options):
+    merged = dict(DEFAULT_OPTIONS)
+    merged.update(options or ())
+    return target, tuple(sorted(merged.items()))
+
+
+class _Entry:
+    def __init__(self, channel):
+        self.channel = channel
+        self.state = None
+        self.stubs = {}
+        channel.subscribe(self._on_state)
+
+    def _on_state(self, state):
+        self.state = state
+
+
+class ChannelRegistry:
+    """Shared channels keyed by (target, options), created on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _entry(self, target, options=None):
+        key = _key(target, options)
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    logger.debug('Opening gRPC channel to %s', target)
+                    entry = _Entry(grpc.insecure_channel(target, options=list(key[1])))
+                    self._entries[key] = entry
+        return entry
+
+    def channel(self, target, options=None):
+        """The shared channel for `target`; `options` are merged over DEFAULT_OPTIONS."""
+        return self._entry(target, options).channel
+
+    def stub(self, stub_class, target, options=None):
+        """A cached `stub_class` (e.g. order_pb2_grpc.OrderStub) bound to the shared channel."""
+        entry = self._entry(target, options)
+        stub = entry.stubs.get(stub_class)
+        if stub is None:
+            stub = entry.stubs.setdefault(stub_class, stub_class(entry.channel))
+        return stub
+
+    def wait_ready(self, target, timeout=None, options=None):
+        """Connect now (rather than on the first call); False if not ready within `timeout`."""
+        try:
+            grpc.channel_ready_future(self.channel(target, options)).result(timeout=timeout)
+            return True
+        except grpc.FutureTimeoutError:
+            return False
+
+    def close(self, target, options=None):
+        """Close and forget the channel for `target`; the next use opens a fresh one."""
+        with self._lock:
+            entry = self._entries.pop(_key(target, options), None)
+        if entry is not None:
+            entry.channel.close()
+
+    def close_all(self):
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            try:
+                entry.channel.close()
+            except Exception as e:
+                logger.warning('Closing gRPC channel failed: %s', e)
+
+    def stats(self):
+        """[{'target', 'state'}] for every open channel; state is the last connectivity seen."""
+        with self._lock:
+            items = list(self._entries.items())
+        return [{'target': target, 'state': entry.state.name if entry.state else 'IDLE'}
+                for (target, _), entry in items]
+
+
+REGISTRY = ChannelRegistry()
+
+
+def get_channel(target, options=None):
+    return REGISTRY.channel(target, options)
+
+
+def get_stub(stub_class, target, options=None):
+    return REGISTRY.stub(stub_class, target, options)
+
+
+def wait_ready(target, timeout=None, options=None):
+    return REGISTRY.wait_ready(target, timeout, options)
+
+
+def close_all():
+    REGISTRY.close_all()
+
+
+atexit.register(close_all)
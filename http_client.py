@@ -0,0 +1,113 @@
+"""Shared HTTP client: one keep-alive requests.Session per host.
+
+Module-level requests.post()/get() build a new Session, and with it a new
+TCP + TLS connection, on every call. HttpClient keeps one Session per
+scheme://host with a bounded urllib3 pool, default timeouts and a retry
+policy, so repeated token or callback calls reuse warm connections:
+
+    r = http_client.post('https://open.handday.cn/grantauth/gettoken', json=payload)
+
+Defaults can be tuned from the environment:
+  ERP_HTTP_POOL_SIZE   connections kept per host (default 10)
+  ERP_HTTP_TIMEOUT     seconds, used when a call passes no timeout (default 10)
+  ERP_HTTP_RETRIES     retries on connection errors and 429/502/503/504 (default 2)
+  ERP_HTTP_BACKOFF     urllib3 backoff factor between retries (default 0.3)
+"""
+import atexit
+import logging
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.environ.get('ERP_HTTP_POOL_SIZE', '10'))
+TIMEOUT = float(os.environ.get('ERP_HTTP_TIMEOUT', '10'))
+RETRIES = int(os.environ.get('ERP_HTTP_RETRIES', '2'))
+BACKOFF = float(os.environ.get('ERP_HTTP_BACKOFF', '0.3'))
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def _host(url):
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        raise ValueError(f'absolute http(s) URL required, got {url!r}')
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+class HttpClient:
+    """Thread-safe pool of per-host Sessions with default timeout and retries."""
+
+    def __init__(self, pool_size=POOL_SIZE, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF,
+                 retry_methods=Retry.DEFAULT_ALLOWED_METHODS):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # POST is not retried on errors after the request was sent unless listed here;
+        # connection failures are always retried since nothing reached the server
+        self.retry_methods = frozenset(retry_methods)
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def _new_session(self):
+        retry = Retry(total=self.retries, connect=self.retries, read=self.retries, status=self.retries,
+                      backoff_factor=self.backoff, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=self.retry_methods, raise_on_status=False)
+        # pool_block: at most pool_size connections per host, extra callers wait for one
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def session(self, url):
+        """The shared Session for the host of `url`."""
+        host = _host(url)
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    logger.debug('Opening HTTP session for %s', host)
+                    session = self._sessions[host] = self._new_session()
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session(url).request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+
+CLIENT = HttpClient()
+
+
+def request(method, url, **kwargs):
+    return CLIENT.request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return CLIENT.get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return CLIENT.post(url, **kwargs)
+
+
+atexit.register(CLIENT.close)
@@ -0,0 +1,206 @@
+"""Logging setup for the gRPC server: non-blocking, optionally JSON, with per-logger sampling.
+
+setup_logging() attaches a single QueueHandler to the root logger. Records are
+put on a bounded queue without waiting and a QueueListener thread formats and
+writes them, so a slow stderr or disk never stalls an RPC worker. If the queue
+is full, DEBUG and INFO records are dropped and counted rather than blocking
+(dropped_records()); WARNING and above wait up to FULL_QUEUE_WAIT seconds for
+room and are then written directly, so errors are never lost.
+
+Sampling is configured per logger name (children included), e.g.
+{'bill_pipeline.bills': 100} keeps 1 in 100 of the per-bill lines. WARNING
+and above are never sampled out.
+
+The same options can come from the environment:
+  ERP_LOG_LEVEL    INFO (default), DEBUG, WARNING, ...
+  ERP_LOG_FORMAT   plain (default) or json
+  ERP_LOG_SAMPLE   logger=N[,logger=N...], e.g. bill_pipeline.bills=100,erp_service.health=10
+  ERP_LOG_QUEUE    size of the log queue (default 10000)
+"""
+import atexit
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+PLAIN_FORMAT = '[%(asctime)s] %(levelname)s: %(message)s'
+# seconds a WARNING+ record waits for room in a full queue before it is written directly
+FULL_QUEUE_WAIT = 0.1
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra={...}` fields are included as top-level keys."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N records below WARNING for configured loggers (and their children)."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {name: int(n) for name, n in rates.items() if int(n) > 1}
+        self._counters = {name: itertools.count() for name in self.rates}
+        self._resolved = {}
+
+    def _rule(self, logger_name):
+        rule = self._resolved.get(logger_name, False)
+        if rule is False:
+            rule = None
+            name = logger_name
+            while name:
+                if name in self.rates:
+                    rule = name
+                    break
+                name = name.rpartition('.')[0]
+            self._resolved[logger_name] = rule
+        return rule
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rule = self._rule(record.name)
+        if rule is None:
+            return True
+        # itertools.count is atomic under the GIL, so no lock is needed on this hot path
+        if next(self._counters[rule]) % self.rates[rule]:
+            return False
+        record.sample_rate = self.rates[rule]
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) DEBUG/INFO records instead of waiting on a full queue.
+
+    WARNING and above are never dropped: they wait briefly for room, then go
+    straight to `fallback` (the listener's output handler) if there is none.
+    """
+
+    def __init__(self, log_queue, fallback=None):
+        super().__init__(log_queue)
+        # without a target handler, logging's last-resort stderr handler
+        self.fallback = fallback or logging.lastResort
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        # merge args and render any traceback here (the objects may not be picklable or
+        # may change later), but leave layout to the listener's formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                with self._lock:
+                    self.dropped += 1
+                return
+        try:
+            self.queue.put(record, timeout=FULL_QUEUE_WAIT)
+        except queue.Full:
+            self.fallback.handle(record)
+
+
+def parse_sample(spec):
+    """'a.b=100,c=10' -> {'a.b': 100, 'c': 10}."""
+    rates = {}
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, n = part.partition('=')
+        if not sep:
+            raise ValueError(f'invalid log sample {part!r}, expected logger=N')
+        rates[name.strip()] = int(n)
+    return rates
+
+
+_listener = None
+_handler = None
+
+
+def setup_logging(level=None, fmt=None, sample=None, queue_size=None, stream=None):
+    """Configure root logging; safe to call again (the previous listener is stopped).
+
+    `sample` is a {logger: N} dict or an ERP_LOG_SAMPLE style string. Unset
+    arguments fall back to the environment variables in the module docstring.
+    """
+    global _listener, _handler
+    level = (level or os.environ.get('ERP_LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.environ.get('ERP_LOG_FORMAT', 'plain')).lower()
+    if sample is None:
+        sample = os.environ.get('ERP_LOG_SAMPLE', '')
+    if isinstance(sample, str):
+        sample = parse_sample(sample)
+    queue_size = int(queue_size or os.environ.get('ERP_LOG_QUEUE', '10000'))
+    if fmt not in ('plain', 'json'):
+        raise ValueError(f'invalid log format {fmt!r}, expected plain or json')
+
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(PLAIN_FORMAT))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size), fallback=output)
+    # sample before enqueueing so dropped lines cost no formatting or queue traffic
+    handler.addFilter(SamplingFilter(sample))
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    _handler = handler
+    return handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread (registered with atexit)."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,312 @@
+"""In-memory master data for the BasicInfo lookups (branches, employees,
+warehouses, subjects, departments, prices, stores, tabulators, accounts).
+
+These tables are small, change rarely and are polled by Handday all the
+time, so each entity set is loaded once into an immutable snapshot:
+
+  rows        row messages sorted by (name, key)
+  by_key      key -> row
+  children    ParentKey -> keys, for tree walks (descendants())
+  by_branch   BranchKey -> row positions, for entities that carry one
+
+and the entity's Page*DataList RPC is registered with paging, answering from
+the snapshot without a backend query: a Data keyword matches the name, key
+or code, BranchKey selects an entity's rows of that branch (for branches
+themselves: the branch and everything below it).
+
+Data comes from loaders registered per entity:
+
+    master_data.register('stock', load, version)
+
+load() returns the rows (messages or dicts in the row message's field
+names); version() is an optional cheap stamp (a max(updated_at), a file
+mtime). A snapshot is re-checked at most every ERP_MASTER_DATA_CHECK seconds
+(default 5): it is reloaded when the stamp changed, or ERP_MASTER_DATA_TTL
+seconds (default 300) after it was loaded. Entities refresh independently and
+the new snapshot is swapped in whole, so readers never wait for a reload,
+except for the first load of an entity.
+
+load_file() registers every entity of a JSON file ($ERP_MASTER_DATA or
+./master_data.json) shaped like {"branch": [{"BranchKey": ...}, ...], ...},
+reloaded when the file changes.
+"""
+import bisect
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from google.protobuf import json_format
+
+import basicInfo_pb2
+import metrics
+import paging
+
+logger = logging.getLogger(__name__)
+
+TTL = float(os.environ.get('ERP_MASTER_DATA_TTL', '300'))
+CHECK_INTERVAL = float(os.environ.get('ERP_MASTER_DATA_CHECK', '5'))
+# filtered selections (keyword, BranchKey) kept per snapshot
+MAX_SELECTIONS = 64
+
+MASTER_ROWS = metrics.REGISTRY.gauge(
+    'erp_master_data_rows', 'Rows in the master data snapshot, by entity', ('entity',))
+MASTER_RELOADS = metrics.REGISTRY.counter(
+    'erp_master_data_reloads_total', 'Master data snapshot loads, by entity and outcome', ('entity', 'outcome'))
+
+
+class EntitySpec(NamedTuple):
+    """How an entity maps onto its Page* RPC and row message."""
+    rpc: str
+    row_type: type
+    key: str
+    name: str
+    parent: Optional[str] = None
+    branch: Optional[str] = None
+    search: tuple = ()  # further fields a Data keyword matches (codes)
+    branch_tree: bool = False  # BranchKey selects the row with that key and its subtree
+
+
+ENTITIES = {
+    'branch': EntitySpec('PageBranchDataList', basicInfo_pb2.G_BranchInfoResponse,  # type: ignore[attr-defined]
+                         'BranchKey', 'BranchName', parent='ParentKey', branch_tree=True),
+    'employee': EntitySpec('PageEmployeeDataList', basicInfo_pb2.G_EmployeeInfoResponse,  # type: ignore[attr-defined]
+                           'EmployeeKey', 'EmployeeName', parent='ParentKey', search=('EmployeeCode', 'Tel')),
+    'stock': EntitySpec('PageStockDataList', basicInfo_pb2.G_StockInfoResponse,  # type: ignore[attr-defined]
+                        'WarehouseKey', 'WarehouseName', parent='ParentKey', branch='BranchKey',
+                        search=('WarehouseCode', 'WarehouseId')),
+    'subject': EntitySpec('PageSubjectDataList', basicInfo_pb2.G_SubjectInfoResponse,  # type: ignore[attr-defined]
+                          'AccountKey', 'AccountName', parent='ParentKey'),
+    'price': EntitySpec('PagePriceDataList', basicInfo_pb2.G_PriceInfoResponse,  # type: ignore[attr-defined]
+                        'PriceKey', 'PriceName'),
+    'department': EntitySpec('PageDepartmentList', basicInfo_pb2.G_DepartmentResponse,  # type: ignore[attr-defined]
+                             'DeptKey', 'DeptName'),
+    'store': EntitySpec('PageMenInfoDataList', basicInfo_pb2.G_PageMenInfo,  # type: ignore[attr-defined]
+                        'MenKey', 'MenName'),
+    'tabulator': EntitySpec('PageTabulateInfoList', basicInfo_pb2.G_TabulateInfoResponse,  # type: ignore[attr-defined]
+                            'TabulateKey', 'TabulateName'),
+    'account_item': EntitySpec('GetAccountItemList', basicInfo_pb2.G_AccountItem,  # type: ignore[attr-defined]
+                               'AccountKey', 'AccountName'),
+}
+
+
+class Snapshot:
+    """One loaded, indexed, read-only copy of an entity set."""
+
+    def __init__(self, spec, rows, stamp, generation):
+        self.spec = spec
+        self.stamp = stamp
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+        by_key = {}
+        for row in rows:
+            if not isinstance(row, spec.row_type):
+                row = json_format.ParseDict(row, spec.row_type(), ignore_unknown_fields=True)
+            by_key[getattr(row, spec.key)] = row  # a repeated key keeps its last row
+        self.sort_keys = sorted((getattr(row, spec.name), key) for key, row in by_key.items())
+        self.rows = [by_key[key] for _, key in self.sort_keys]
+        self.by_key = by_key
+        self.children = {}
+        if spec.parent:
+            for _, key in self.sort_keys:
+                parent = getattr(by_key[key], spec.parent)
+                if parent and parent != key:
+                    self.children.setdefault(parent, []).append(key)
+        self.by_branch = {}
+        if spec.branch:
+            for pos, row in enumerate(self.rows):
+                self.by_branch.setdefault(getattr(row, spec.branch), []).append(pos)
+        self._search = [' '.join([key, name] + [str(getattr(by_key[key], f)) for f in spec.search]).lower()
+                        for name, key in self.sort_keys]
+        self._selections = {}
+
+    def descendants(self, key):
+        """Keys of everything below `key` in the ParentKey tree, breadth first."""
+        found, queue, seen = [], [key], {key}
+        while queue:
+            for child in self.children.get(queue.pop(0), ()):
+                if child not in seen:
+                    seen.add(child)
+                    found.append(child)
+                    queue.append(child)
+        return found
+
+    def select(self, flt):
+        """Sorted row positions matching a paging.PageFilter (None = every row)."""
+        if not flt.keyword and not flt.branch_key:
+            return None
+        selection = self._selections.get(flt)
+        if selection is None:
+            if not flt.branch_key:
+                positions = range(len(self.rows))
+            elif self.spec.branch:
+                positions = self.by_branch.get(flt.branch_key, [])
+            elif self.spec.branch_tree:
+                keys = [flt.branch_key] + self.descendants(flt.branch_key)
+                positions = sorted(bisect.bisect_left(self.sort_keys, (getattr(self.by_key[k], self.spec.name), k))
+                                   for k in keys if k in self.by_key)
+            else:
+                positions = range(len(self.rows))  # the entity has no branch to filter on
+            keyword = flt.keyword.lower()
+            selection = [pos for pos in positions if keyword in self._search[pos]] if keyword else list(positions)
+            if len(self._selections) >= MAX_SELECTIONS:
+                self._selections.clear()
+            self._selections[flt] = selection
+        return selection
+
+    def fetch(self, flt, after, limit):
+        # keyset read for paging: rows sorted by (name, key) after `after`
+        start = 0 if after is None else bisect.bisect_right(self.sort_keys, tuple(after))
+        selection = self.select(flt)
+        if selection is None:
+            positions = range(start, min(start + limit, len(self.rows)))
+        else:
+            i = bisect.bisect_left(selection, start)
+            positions = selection[i:i + limit]
+        return [(self.sort_keys[pos], self.rows[pos]) for pos in positions]
+
+    def count(self, flt):
+        selection = self.select(flt)
+        return len(self.rows) if selection is None else len(selection)
+
+
+class _Loader:
+    def __init__(self, entity, load, version):
+        self.entity = entity
+        self.load = load
+        self.version = version
+        self.lock = threading.Lock()
+        self.snapshot = None
+
+
+class MasterDataCache:
+    """Snapshots of the registered entities, refreshed on their version stamp or TTL."""
+
+    def __init__(self, ttl=TTL, check_interval=CHECK_INTERVAL, entities=None):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.entities = ENTITIES if entities is None else entities
+        self._loaders = {}
+        self._generations = itertools.count(1)
+
+    def register(self, entity, load, version=None, page=True):
+        """Serve `entity` from `load()`; with `page` its Page* RPC is answered from the cache."""
+        spec = self.entities[entity]
+        self._loaders[entity] = _Loader(entity, load, version)
+        if page:
+            paging.register_source(spec.rpc, lambda flt, after, limit: self.snapshot(entity).fetch(flt, after, limit),
+                                   count=lambda flt: self.snapshot(entity).count(flt),
+                                   version=lambda: self.snapshot(entity).generation)
+
+    def registered(self):
+        return sorted(self._loaders)
+
+    def snapshot(self, entity):
+        """The current snapshot of `entity`, loading or refreshing it when due."""
+        loader = self._loaders[entity]
+        snap = loader.snapshot
+        if snap is not None and time.time() - snap.checked_at < self.check_interval:
+            return snap
+        # a snapshot exists: only one thread refreshes, the others keep reading it
+        if not loader.lock.acquire(blocking=snap is None):
+            return snap
+        try:
+            if loader.snapshot is not snap and loader.snapshot is not None:
+                return loader.snapshot
+            return self._refresh(loader)
+        finally:
+            loader.lock.release()
+
+    def refresh(self, entity=None, force=True):
+        """Reload `entity` (all registered when None) now, or only when due with force=False."""
+        for name in ([entity] if entity else self.registered()):
+            loader = self._loaders[name]
+            with loader.lock:
+                self._refresh(loader, force)
+
+    def _refresh(self, loader, force=False):
+        # caller holds loader.lock
+        snap = loader.snapshot
+        now = time.time()
+        try:
+            stamp = loader.version() if loader.version is not None else None
+            if (not force and snap is not None and now - snap.loaded_at < self.ttl
+                    and (loader.version is None or stamp == snap.stamp)):
+                snap.checked_at = now
+                return snap
+            new = Snapshot(self.entities[loader.entity], loader.load(), stamp, next(self._generations))
+        except Exception as e:
+            MASTER_RELOADS.labels(loader.entity, 'error').inc()
+            if snap is None:
+                raise
+            # keep serving the data we have; try again after the next interval
+            logger.warning('Reloading master data %s failed, keeping the loaded copy: %s', loader.entity, e)
+            snap.checked_at = now
+            return snap
+        MASTER_RELOADS.labels(loader.entity, 'ok').inc()
+        MASTER_ROWS.labels(loader.entity).set(len(new.rows))
+        logger.info('Loaded master data %s: %d rows (version %s)', loader.entity, len(new.rows), stamp)
+        loader.snapshot = new
+        return new
+
+    def get(self, entity, key):
+        """The row of `entity` with `key`, or None."""
+        return self.snapshot(entity).by_key.get(key)
+
+    def children(self, entity, parent_key):
+        return [self.get(entity, key) for key in self.snapshot(entity).children.get(parent_key, ())]
+
+    def descendants(self, entity, key):
+        snap = self.snapshot(entity)
+        return [snap.by_key[k] for k in snap.descendants(key)]
+
+    def stats(self):
+        """{entity: {'rows', 'version', 'loaded_at'}} for the entities loaded so far."""
+        return {name: {'rows': len(loader.snapshot.rows), 'version': loader.snapshot.stamp,
+                       'loaded_at': loader.snapshot.loaded_at}
+                for name, loader in self._loaders.items() if loader.snapshot is not None}
+
+
+CACHE = MasterDataCache()
+
+
+def register(entity, load, version=None, page=True):
+    CACHE.register(entity, load, version, page)
+
+
+def get(entity, key):
+    return CACHE.get(entity, key)
+
+
+def load_file(path=None, cache=None):
+    """Register the entities of `path`, $ERP_MASTER_DATA or ./master_data.json; returns their names.
+
+    Nothing is registered when the file does not exist. A file that exists
+    but is invalid raises, so a typo fails at startup rather than per request.
+    """
+    cache = cache or CACHE
+    path = path or os.environ.get('ERP_MASTER_DATA') or os.path.join(os.getcwd(), 'master_data.json')
+    if not os.path.exists(path):
+        return []
+
+    def version():
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def read():
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    data = read()
+    unknown = set(data) - set(cache.entities)
+    if unknown:
+        raise ValueError(f'{path}: unknown master data entities {sorted(unknown)}')
+    for entity in data:
+        # each entity re-reads the file when its stamp changes; the file is small
+        cache.register(entity, lambda entity=entity: read().get(entity, []), version)
+        cache.snapshot(entity)
+    return sorted(data)
@@ -26,7 +26,7 @@ import common_pb2 as common__pb2
 import customer_pb2 as customer__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0border.proto\x1a\x0c\x63ommon.proto\x1a\x0e\x63ustomer.proto\"C\n\x1aG_SyncBillListInfoResponse\x12%\n\x04\x44\x61ta\x18\x01 \x03(\x0b\x32\x17.G_SyncBillInfoResponse\"\xa1\x01\n\x16G_SyncBillInfoResponse\x12\x0e\n\x06\x45rpKey\x18\x01 \x01(\t\x12\x0f\n\x07\x42illKey\x18\x02 \x01(\t\x12#\n\tSyncState\x18\x03 \x01(\x0e\x32\x10.G_SyncStateType\x12\x0f\n\x07SyncMsg\x18\x04 \x01(\t\x12\x1d\n\x08\x42illType\x18\x05 \x01(\x0e\x32\x0b.G_BillType\x12\x11\n\tErrorCode\x18\x06 \x01(\x03\"\xbb\x01\n\x15G_SyncBillListRequest\x12 \n\x04\x44\x61ta\x18\x01 \x03(\x0b\x32\x12.G_SyncBillRequest\x12\x11\n\tBranchKey\x18\x02 \x01(\t\x12\x14\n\x0c\x45mployeeName\x18\x03 \x01(\t\x12\x13\n\x0b\x45mployeeKey\x18\x04 \x01(\t\x12\x16\n\x0e\x44\x65partmentName\x18\x05 \x01(\t\x12\x15\n\rDepartmentKey\x18\x06 \x01(\t\x12\x13\n\x0b\x43\x61llBackUrl\x18\x07 \x01(\t\"\xc9\x05\n\x11G_SyncBillRequest\x12\x0f\n\x07\x42illKey\x18\x01 \x01(\t\x12\x10\n\x08\x42illCode\x18\x02 \x01(\t\x12\x1d\n\x08\x42illType\x18\x03 \x01(\x0e\x32\x0b.G_BillType\x12\x13\n\x0b\x43ustomerKey\x18\x04 \x01(\t\x12\x14\n\x0c\x43ustomerName\x18\x05 \x01(\t\x12\x13\n\x0b\x45mployeeKey\x18\x06 \x01(\t\x12\x15\n\rDepartmentKey\x18\x07 \x01(\t\x12\x14\n\x0cWarehouseKey\x18\x08 \x01(\t\x12\x15\n\rWarehouseName\x18\t \x01(\t\x12\x14\n\x0cTabulateDate\x18\n \x01(\t\x12\x0e\n\x06Remark\x18\x0b \x01(\t\x12\x12\n\nTotalPrice\x18\x0c \x01(\x01\x12\x14\n\x0c\x44\x65liveryDate\x18\r \x01(\t\x12\x0f\n\x07\x41\x64\x64ress\x18\x0e \x01(\t\x12\x19\n\x11PreferentialMoney\x18\x0f \x01(\x01\x12\x15\n\rFareGoodsCode\x18\x10 \x01(\t\x12\x0c\n\x04\x46\x61re\x18\x11 \x01(\x01\x12\x11\n\tEntryTime\x18\x12 \x01(\t\x12\x0f\n\x07\x43reator\x18\x13 \x01(\t\x12\x15\n\rUnitTransform\x18\x14 \x01(\x05\x12&\n\x07\x44\x65tails\x18\x15 \x03(\x0b\x32\x15.G_SyncBillDetailInfo\x12\x0f\n\x07\x43omment\x18\x16 \x01(\t\x12\x13\n\x0bReceiptDate\x18\x17 \x01(\t\x12\x11\n\tBranchKey\x18\x18 \x01(\t\x12\x11\n\tMemberKey\x18\x19 \x01(\t\x12\x18\n\x10MembershipCardNo\x18\x1a \x01(\t\x12\x16\n\x0e\x44iscountAmount\x18\x1b \x01(\x01\x12\x12\n\nAccountKey\x18\x1c \x01(\t\x12\x12\n\nDHBillCode\x18\x1d \x01(\t\x12\x15\n\rtargetReverse\x18\x1e \x01(\x05\x12-\n\x0cMultiAccount\x18\x1f \x03(\x0b\x32\x17.G_SyncBillMultiAccount\"\xd3\x06\n\x14G_SyncBillDetailInfo\x12\x15\n\rBillDetailKey\x18\x01 \x01(\x03\x12\x0f\n\x07\x42illKey\x18\x02 \x01(\x03\x12\x12\n\nProductKey\x18\x03 \x01(\t\x12\x13\n\x0bProductName\x18\x04 \x01(\t\x12\x14\n\x0cWarehouseKey\x18\x05 \x01(\t\x12\x14\n\x0c\x42\x61sicUnitQty\x18\x06 \x01(\x01\x12\x16\n\x0e\x42\x61sicUnitPrice\x18\x07 \x01(\x01\x12\x1e\n\x16\x42\x61sicUnitDiscountPrice\x18\x08 \x01(\x01\x12\x19\n\x11\x42\x61sicUnitTaxPrice\x18\t \x01(\x01\x12\x0b\n\x03Qty\x18\n \x01(\x01\x12\r\n\x05Price\x18\x0b \x01(\x01\x12\r\n\x05Total\x18\x0c \x01(\x01\x12\x10\n\x08\x44iscount\x18\r \x01(\x01\x12\x15\n\rDiscountPrice\x18\x0e \x01(\x01\x12\x15\n\rDiscountTotal\x18\x0f \x01(\x01\x12\x0b\n\x03Tax\x18\x10 \x01(\x01\x12\x10\n\x08TaxPrice\x18\x11 \x01(\x01\x12\x10\n\x08TaxTotal\x18\x12 \x01(\x01\x12\x10\n\x08TaxLimit\x18\x13 \x01(\x01\x12\x0e\n\x06IsGift\x18\x14 \x01(\x05\x12\x0e\n\x06Remark\x18\x15 \x01(\t\x12\x10\n\x08UnitName\x18\x16 \x01(\t\x12\x0e\n\x06UnitID\x18\x17 \x01(\t\x12\x10\n\x08UnitRate\x18\x18 \x01(\x01\x12\x16\n\x0eUnitConversion\x18\x19 \x01(\x01\x12\x10\n\x08IsSpcial\x18\x1a \x01(\x05\x12\x19\n\x11SettleAccountName\x18\x1b \x01(\t\x12\x11\n\tOrderType\x18\x1c \x01(\x05\x12\x10\n\x08Ubarcode\x18\x1d \x01(\t\x12\x11\n\tCostPrice\x18\x1e \x01(\x01\x12\x11\n\tCostTotal\x18\x1f \x01(\x01\x12\x10\n\x08\x43ostMode\x18  \x01(\t\x12\x14\n\x0cGoodsBatchID\x18! \x01(\t\x12\x0f\n\x07Goodsno\x18\" \x01(\t\x12\x0f\n\x07\x42\x61tchNo\x18# \x01(\t\x12\x16\n\x0eProductionDate\x18$ \x01(\t\x12\x15\n\rUsefulEndDate\x18% \x01(\t\x12\x13\n\x0bRetailPrice\x18& \x01(\x01\x12\x0f\n\x07\x43olorId\x18\' \x01(\x01\x12\x0e\n\x06SizeId\x18( \x01(\x01\x12*\n\nAttributes\x18) \x03(\x0b\x32\x16.G_ProductSkuAttribute\"_\n\x16G_PagePushBillResponse\x12\x0e\n\x06\x43orpId\x18\x01 \x01(\x03\x12\x12\n\nTotalCount\x18\x02 \x01(\x05\x12!\n\x04\x44\x61ta\x18\x03 \x03(\x0b\x32\x13.G_PushBillResponse\"m\n\x12G_PushBillResponse\x12\x12\n\nBillErpKey\x18\x01 \x01(\t\x12\x13\n\x0b\x42illErpCode\x18\x02 \x01(\t\x12\x1d\n\x08\x42illType\x18\x03 \x01(\x0e\x32\x0b.G_BillType\x12\x0f\n\x07\x42illKey\x18\x04 \x01(\t\"8\n\x16G_SyncBillMultiAccount\x12\x0f\n\x07\x41\x63\x63ount\x18\x01 \x01(\t\x12\r\n\x05Total\x18\x02 \x01(\x01\"W\n\x1cG_PagePushBillCenterResponse\x12\x0e\n\x06\x43orpId\x18\x01 \x01(\x03\x12\'\n\x04\x44\x61ta\x18\x02 \x03(\x0b\x32\x19.G_PushBillCenterResponse\"\xbe\x01\n\x18G_PushBillCenterResponse\x12\x0e\n\x06\x43orpId\x18\x01 \x01(\x03\x12\x10\n\x08\x42illType\x18\x02 \x01(\x05\x12\x11\n\tInputTime\x18\x03 \x01(\t\x12\x13\n\x0b\x41\x63\x63ountTime\x18\x04 \x01(\t\x12\x0e\n\x06\x42illNO\x18\x05 \x01(\t\x12\x0e\n\x06\x42illId\x18\x06 \x01(\t\x12\x10\n\x08\x43ustomId\x18\x07 \x01(\t\x12\x12\n\nCustomName\x18\x08 \x01(\t\x12\x12\n\nBillAmount\x18\t \x01(\x01\"\\\n\x14G_ErpOutBillResponse\x12\x0e\n\x06\x43orpId\x18\x01 \x01(\t\x12\x13\n\x0b\x43\x61llBackUrl\x18\x02 \x01(\t\x12\x1f\n\x04\x44\x61ta\x18\x03 \x03(\x0b\x32\x11.G_ErpOutBillInfo\"\xbc\x02\n\x10G_ErpOutBillInfo\x12\x10\n\x08\x42illDate\x18\x01 \x01(\t\x12\x14\n\x0c\x43ustomerName\x18\x02 \x01(\t\x12\x11\n\tdepotName\x18\x03 \x01(\t\x12\x13\n\x0bHandlerName\x18\x04 \x01(\t\x12\x12\n\nBillRemark\x18\x05 \x01(\t\x12\x12\n\nEraseMoney\x18\x06 \x01(\x02\x12\x13\n\x0bInvoiceType\x18\x07 \x01(\x05\x12\x0f\n\x07\x42illTax\x18\x08 \x01(\x02\x12\x16\n\x0eReceiveAddress\x18\t \x01(\x02\x12\x13\n\x0b\x42uyerRemark\x18\n \x01(\x02\x12\x10\n\x08PayMoney\x18\x0b \x01(\x02\x12$\n\x07\x44\x65tails\x18\x0c \x03(\x0b\x32\x13.G_ErpOutBillDetail\x12%\n\x0c\x43ustomerInfo\x18\r \x03(\x0b\x32\x0f.G_CustomerInfo\"\xca\x02\n\x12G_ErpOutBillDetail\x12\x13\n\x0bProductCode\x18\x01 \x01(\t\x12\x13\n\x0bProductName\x18\x02 \x01(\t\x12\x12\n\nSkuBarCode\x18\x03 \x01(\t\x12\x0f\n\x07SkuName\x18\x04 \x01(\t\x12\x11\n\tDepotName\x18\x05 \x01(\t\x12\x10\n\x08UnitName\x18\t \x01(\t\x12\x0b\n\x03Qty\x18\n \x01(\x02\x12\r\n\x05Price\x18\x0b \x01(\x02\x12\r\n\x05Total\x18\x0c \x01(\x02\x12\x10\n\x08\x44iscount\x18\r \x01(\x02\x12\x15\n\rDiscountPrice\x18\x0e \x01(\x02\x12\x15\n\rDiscountTotal\x18\x0f \x01(\x02\x12\x0b\n\x03Tax\x18\x10 \x01(\x02\x12\x10\n\x08TaxPrice\x18\x11 \x01(\x02\x12\x10\n\x08TaxTotal\x18\x12 \x01(\x02\x12\x0e\n\x06IsGift\x18\x13 \x01(\x05\x12\x14\n\x0c\x44\x65tailRemark\x18\x14 \x01(\t\"\x9c\x02\n\x0eG_CustomerInfo\x12\x14\n\x0c\x43ustomerName\x18\x01 \x01(\t\x12\x13\n\x0b\x43ustomerKey\x18\x02 \x01(\t\x12\x14\n\x0c\x43ustomerCode\x18\x03 \x01(\t\x12\x0f\n\x07\x41\x64\x64ress\x18\x04 \x01(\t\x12\x0b\n\x03Tel\x18\x05 \x01(\t\x12\x13\n\x0b\x43\x61tegoryKey\x18\x06 \x01(\t\x12\x14\n\x0c\x43\x61tegoryName\x18\x07 \x01(\t\x12\x13\n\x0b\x43reditLimit\x18\x08 \x01(\x02\x12\x1c\n\x14\x42usinessManagersName\x18\t \x01(\t\x12&\n\tLinkInfos\x18\n \x03(\x0b\x32\x13.G_LinkInfoResponse\x12\x12\n\nCustomerId\x18\x0b \x01(\t\x12\x11\n\tBranchKey\x18\x0c \x01(\t2\xfd\x03\n\x05Order\x12K\n\x14SynchroSaleOrderList\x12\x16.G_SyncBillListRequest\x1a\x1b.G_SyncBillListInfoResponse\x12N\n\x17SynchroReceiptOrderList\x12\x16.G_SyncBillListRequest\x1a\x1b.G_SyncBillListInfoResponse\x12M\n\x16SynchroLsSaleOrderList\x12\x16.G_SyncBillListRequest\x1a\x1b.G_SyncBillListInfoResponse\x12/\n\x0cPushPostBill\x12\x0e.G_PushRequest\x1a\x0f.G_PushResponse\x12\x31\n\x0ePushDeleteBill\x12\x0e.G_PushRequest\x1a\x0f.G_PushResponse\x12\x33\n\x10PushDeliveryBill\x12\x0e.G_PushRequest\x1a\x0f.G_PushResponse\x12\x35\n\x12PushBillCenterList\x12\x0e.G_PushRequest\x1a\x0f.G_PushResponse\x12\x38\n\x0fPushOutBillSync\x12\x0e.G_PushRequest\x1a\x15.G_ErpOutBillResponseB\x15\xaa\x02\x12HandDay.Grpc.Orderb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0border.proto\x1a\x0c\x63ommon.proto\x1a\x0e\x63ustomer.proto\"C\n\x1aG_SyncBillListInfoResponse\x12%\n\x04\x44\x61ta\x18\x01 \x03(\x0b\x32\x17.G_SyncBillInfoResponse\"\xa1\x01\n\x16G_SyncBillInfoResponse\x12\x0e\n\x06\x45rpKey\x18\x01 \x01(\t\x12\x0f\n\x07\x42illKey\x18\x02 \x01(\t\x12#\n\tSyncState\x18\x03 \x01(\x0e\x32\x10.G_SyncStateType\x12\x0f\n\x07SyncMsg\x18\x04 \x01(\t\x12\x1d\n\x08\x42illType\x18\x05 \x01(\x0e\x32\x0b.G_BillType\x12\x11\n\tErrorCode\x18\x06 \x01(\x03\"\xbb\x01\n\x15G_SyncBillListRequest\x12 \n\x04\x44\x61ta\x18\x01 \x03(\x0b\x32\x12.G_SyncBillRequest\x12\x11\n\tBranchKey\x18\x02 \x01(\t\x12\x14\n\x0c\x45mployeeName\x18\x03 \x01(\t\x12\x13\n\x0b\x45mployeeKey\x18\x04 \x01(\t\x12\x16\n\x0e\x44\x65partmentName\x18\x05 \x01(\t\x12\x15\n\rDepartmentKey\x18\x06 \x01(\t\x12\x13\n\x0b\x43\x61llBackUrl\x18\x07 \x01(\t\"\xc9\x05\n\x11G_SyncBillRequest\x12\x0f\n\x07\x42illKey\x18\x01 \x01(\t\x12\x10\n\x08\x42illCode\x18\x02 \x01(\t\x12\x1d\n\x08\x42illType\x18\x03 \x01(\x0e\x32\x0b.G_BillType\x12\x13\n\x0b\x43ustomerKey\x18\x04 \x01(\t\x12\x14\n\x0c\x43ustomerName\x18\x05 \x01(\t\x12\x13\n\x0b\x45mployeeKey\x18\x06 \x01(\t\x12\x15\n\rDepartmentKey\x18\x07 \x01(\t\x12\x14\n\x0cWarehouseKey\x18\x08 \x01(\t\x12\x15\n\rWarehouseName\x18\t \x01(\t\x12\x14\n\x0cTabulateDate\x18\n \x01(\t\x12\x0e\n\x06Remark\x18\x0b \x01(\t\x12\x12\n\nTotalPrice\x18\x0c \x01(\x01\x12\x14\n\x0c\x44\x65liveryDate\x18\r \x01(\t\x12\x0f\n\x07\x41\x64\x64ress\x18\x0e \x01(\t\x12\x19\n\x11PreferentialMoney\x18\x0f \x01(\x01\x12\x15\n\rFareGoodsCode\x18\x10 \x01(\t\x12\x0c\n\x04\x46\x61re\x18\x11 \x01(\x01\x12\x11\n\tEntryTime\x18\x12 \x01(\t\x12\x0f\n\x07\x43reator\x18\x13 \x01(\t\x12\x15\n\rUnitTransform\x18\x14 \x01(\x05\x12&\n\x07\x44\x65tails\x18\x15 \x03(\x0b\x32\x15.G_SyncBillDetailInfo\x12\x0f\n\x07\x43omment\x18\x16 \x01(\t\x12\x13\n\x0bReceiptDate\x18\x17 \x01(\t\x12\x11\n\tBranchKey\x18\x18 \x01(\t\x12\x11\n\tMemberKey\x18\x19 \x01(\t\x12\x18\n\x10MembershipCardNo\x18\x1a \x01(\t\x12\x16\n\x0e\x44iscountAmount\x18\x1b \x01(\x01\x12\x12\n\nAccountKey\x18\x1c \x01(\t\x12\x12\n\nDHBillCode\x18\x1d \x01(\t\x12\x15\n\rtargetReverse\x18\x1e \x01(\x05\x12-\n\x0cMultiAccount\x18\x1f \x03(\x0b\x32\x17.G_SyncBillMultiAccount\"\xd3\x06\n\x14G_SyncBillDetailInfo\x12\x15\n\rBillDetailKey\x18\x01 \x01(\x03\x12\x0f\n\x07\x42illKey\x18\x02 \x01(\x03\x12\x12\n\nProductKey\x18\x03 \x01(\t\x12\x13\n\x0bProductName\x18\x04 \x01(\t\x12\x14\n\x0cWarehouseKey\x18\x05 \x01(\t\x12\x14\n\x0c\x42\x61sicUnitQty\x18\x06 \x01(\x01\x12\x16\n\x0e\x42\x61sicUnitPrice\x18\x07 \x01(\x01\x12\x1e\n\x16\x42\x61sicUnitDiscountPrice\x18\x08 \x01(\x01\x12\x19\n\x11\x42\x61sicUnitTaxPrice\x18\t \x01(\x01\x12\x0b\n\x03Qty\x18\n \x01(\x01\x12\r\n\x05Price\x18\x0b \x01(\x01\x12\r\n\x05Total\x18\x0c \x01(\x01\x12\x10\n\x08\x44iscount\x18\r \x01(\x01\x12\x15\n\rDiscountPrice\x18\x0e \x01(\x01\x12\x15\n\rDiscountTotal\x18\x0f \x01(\x01\x12\x0b\n\x03Tax\x18\x10 \x01(\x01\x12\x10\n\x08TaxPrice\x18\x11 \x01(\x01\x12\x10\n\x08TaxTotal\x18\x12 \x01(\x01\x12\x10\n\x08TaxLimit\x18\x13 \x01(\x01\x12\x0e\n\x06IsGift\x18\x14 \x01(\x05\x12\x0e\n\x06Remark\x18\x15 \x01(\t\x12\x10\n\x08UnitName\x18\x16 \x01(\t\x12\x0e\n\x06UnitID\x18\x17 \x01(\t\x12\x10\n\x08UnitRate\x18\x18 \x01(\x01\x12\x16\n\x0eUnitConversion\x18\x19 \x01(\x01\x12\x10\n\x08IsSpcial\x18\x1a \x01(\x05\x12\x19\n\x11SettleAccountName\x18\x1b \x01(\t\x12\x11\n\tOrderType\x18\x1c \x01(\x05\x12\x10\n\x08Ubarcode\x18\x1d \x01(\t\x12\x11\n\tCostPrice\x18\x1e \x01(\x01\x12\x11\n\tCostTotal\x18\x1f \x01(\x01\x12\x10\n\x08\x43ostMode\x18  \x01(\t\x12\x14\n\x0cGoodsBatchID\x18! \x01(\t\x12\x0f\n\x07Goodsno\x18\" \x01(\t\x12\x0f\n\x07\x42\x61tchNo\x18# \x01(\t\x12\x16\n\x0eProductionDate\x18$ \x01(\t\x12\x15\n\rUsefulEndDate\x18% \x01(\t\x12\x13\n\x0bRetailPrice\x18& \x01(\x01\x12\x0f\n\x07\x43olorId\x18\' \x01(\x01\x12\x0e\n\x06SizeId\x18( \x01(\x01\x12*\n\nAttributes\x18) \x03(\x0b\x32\x16.G_ProductSkuAttribute\"_\n\x16G_PagePushBillResponse\x12\x0e\n\x06\x43orpId\x18\x01 \x01(\x03\x12\x12\n\nTotalCount\x18\x02 \x01(\x05\x12!\n\x04\x44\x61ta\x18\x03 \x03(\x0b\x32\x13.G_PushBillResponse\"m\n\x12G_PushBillResponse\x12\x12\n\nBillErpKey\x18\x01 \x01(\t\x12\x13\n\x0b\x42illErpCode\x18\x02 \x01(\t\x12\x1d\n\x08\x42illType\x18\x03 \x01(\x0e\x32\x0b.G_BillType\x12\x0f\n\x07\x42illKey\x18\x04 \x01(\t\"8\n\x16G_SyncBillMultiAccount\x12\x0f\n\x07\x41\x63\x63ount\x18\x01 \x01(\t\x12\r\n\x05Total\x18\x02 \x01(\x01\"W\n\x1cG_PagePushBillCenterResponse\x12\x0e\n\x06\x43orpId\x18\x01 \x01(\x03\x12\'\n\x04\x44\x61ta\x18\x02 \x03(\x0b\x32\x19.G_PushBillCenterResponse\"\xbe\x01\n\x18G_PushBillCenterResponse\x12\x0e\n\x06\x43orpId\x18\x01 \x01(\x03\x12\x10\n\x08\x42illType\x18\x02 \x01(\x05\x12\x11\n\tInputTime\x18\x03 \x01(\t\x12\x13\n\x0b\x41\x63\x63ountTime\x18\x04 \x01(\t\x12\x0e\n\x06\x42illNO\x18\x05 \x01(\t\x12\x0e\n\x06\x42illId\x18\x06 \x01(\t\x12\x10\n\x08\x43ustomId\x18\x07 \x01(\t\x12\x12\n\nCustomName\x18\x08 \x01(\t\x12\x12\n\nBillAmount\x18\t \x01(\x01\"\\\n\x14G_ErpOutBillResponse\x12\x0e\n\x06\x43orpId\x18\x01 \x01(\t\x12\x13\n\x0b\x43\x61llBackUrl\x18\x02 \x01(\t\x12\x1f\n\x04\x44\x61ta\x18\x03 \x03(\x0b\x32\x11.G_ErpOutBillInfo\"\xbc\x02\n\x10G_ErpOutBillInfo\x12\x10\n\x08\x42illDate\x18\x01 \x01(\t\x12\x14\n\x0c\x43ustomerName\x18\x02 \x01(\t\x12\x11\n\tdepotName\x18\x03 \x01(\t\x12\x13\n\x0bHandlerName\x18\x04 \x01(\t\x12\x12\n\nBillRemark\x18\x05 \x01(\t\x12\x12\n\nEraseMoney\x18\x06 \x01(\x02\x12\x13\n\x0bInvoiceType\x18\x07 \x01(\x05\x12\x0f\n\x07\x42illTax\x18\x08 \x01(\x02\x12\x16\n\x0eReceiveAddress\x18\t \x01(\x02\x12\x13\n\x0b\x42uyerRemark\x18\n \x01(\x02\x12\x10\n\x08PayMoney\x18\x0b \x01(\x02\x12$\n\x07\x44\x65tails\x18\x0c \x03(\x0b\x32\x13.G_ErpOutBillDetail\x12%\n\x0c\x43ustomerInfo\x18\r \x03(\x0b\x32\x0f.G_CustomerInfo\"\xca\x02\n\x12G_ErpOutBillDetail\x12\x13\n\x0bProductCode\x18\x01 \x01(\t\x12\x13\n\x0bProductName\x18\x02 \x01(\t\x12\x12\n\nSkuBarCode\x18\x03 \x01(\t\x12\x0f\n\x07SkuName\x18\x04 \x01(\t\x12\x11\n\tDepotName\x18\x05 \x01(\t\x12\x10\n\x08UnitName\x18\t \x01(\t\x12\x0b\n\x03Qty\x18\n \x01(\x02\x12\r\n\x05Price\x18\x0b \x01(\x02\x12\r\n\x05Total\x18\x0c \x01(\x02\x12\x10\n\x08\x44iscount\x18\r \x01(\x02\x12\x15\n\rDiscountPrice\x18\x0e \x01(\x02\x12\x15\n\rDiscountTotal\x18\x0f \x01(\x02\x12\x0b\n\x03Tax\x18\x10 \x01(\x02\x12\x10\n\x08TaxPrice\x18\x11 \x01(\x02\x12\x10\n\x08TaxTotal\x18\x12 \x01(\x02\x12\x0e\n\x06IsGift\x18\x13 \x01(\x05\x12\x14\n\x0c\x44\x65tailRemark\x18\x14 \x01(\t\"\x9c\x02\n\x0eG_CustomerInfo\x12\x14\n\x0c\x43ustomerName\x18\x01 \x01(\t\x12\x13\n\x0b\x43ustomerKey\x18\x02 \x01(\t\x12\x14\n\x0c\x43ustomerCode\x18\x03 \x01(\t\x12\x0f\n\x07\x41\x64\x64ress\x18\x04 \x01(\t\x12\x0b\n\x03Tel\x18\x05 \x01(\t\x12\x13\n\x0b\x43\x61tegoryKey\x18\x06 \x01(\t\x12\x14\n\x0c\x43\x61tegoryName\x18\x07 \x01(\t\x12\x13\n\x0b\x43reditLimit\x18\x08 \x01(\x02\x12\x1c\n\x14\x42usinessManagersName\x18\t \x01(\t\x12&\n\tLinkInfos\x18\n \x03(\x0b\x32\x13.G_LinkInfoResponse\x12\x12\n\nCustomerId\x18\x0b \x01(\t\x12\x11\n\tBranchKey\x18\x0c \x01(\t2\x8f\x05\n\x05Order\x12K\n\x14SynchroSaleOrderList\x12\x16.G_SyncBillListRequest\x1a\x1b.G_SyncBillListInfoResponse\x12N\n\x17SynchroReceiptOrderList\x12\x16.G_SyncBillListRequest\x1a\x1b.G_SyncBillListInfoResponse\x12M\n\x16SynchroLsSaleOrderList\x12\x16.G_SyncBillListRequest\x1a\x1b.G_SyncBillListInfoResponse\x12\x46\n\x11SynchroBillStream\x12\x16.G_SyncBillListRequest\x1a\x17.G_SyncBillInfoResponse0\x01\x12H\n\x15SynchroBillBidiStream\x12\x12.G_SyncBillRequest\x1a\x17.G_SyncBillInfoResponse(\x01\x30\x01\x12/\n\x0cPushPostBill\x12\x0e.G_PushRequest\x1a\x0f.G_PushResponse\x12\x31\n\x0ePushDeleteBill\x12\x0e.G_PushRequest\x1a\x0f.G_PushResponse\x12\x33\n\x10PushDeliveryBill\x12\x0e.G_PushRequest\x1a\x0f.G_PushResponse\x12\x35\n\x12PushBillCenterList\x12\x0e.G_PushRequest\x1a\x0f.G_PushResponse\x12\x38\n\x0fPushOutBillSync\x12\x0e.G_PushRequest\x1a\x15.G_ErpOutBillResponseB\x15\xaa\x02\x12HandDay.Grpc.Orderb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -63,5 +63,5 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_G_CUSTOMERINFO']._serialized_start=3333
   _globals['_G_CUSTOMERINFO']._serialized_end=3617
   _globals['_ORDER']._serialized_start=3620
-  _globals['_ORDER']._serialized_end=4129
+  _globals['_ORDER']._serialized_end=4275
 # @@protoc_insertion_point(module_scope)
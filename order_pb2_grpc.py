@@ -51,6 +51,16 @@ class OrderStub(object):
                 request_serializer=order__pb2.G_SyncBillListRequest.SerializeToString,
                 response_deserializer=order__pb2.G_SyncBillListInfoResponse.FromString,
                 _registered_method=True)
+        self.SynchroBillStream = channel.unary_stream(
+                '/Order/SynchroBillStream',
+                request_serializer=order__pb2.G_SyncBillListRequest.SerializeToString,
+                response_deserializer=order__pb2.G_SyncBillInfoResponse.FromString,
+                _registered_method=True)
+        self.SynchroBillBidiStream = channel.stream_stream(
+                '/Order/SynchroBillBidiStream',
+                request_serializer=order__pb2.G_SyncBillRequest.SerializeToString,
+                response_deserializer=order__pb2.G_SyncBillInfoResponse.FromString,
+                _registered_method=True)
         self.PushPostBill = channel.unary_unary(
                 '/Order/PushPostBill',
                 request_serializer=common__pb2.G_PushRequest.SerializeToString,
@@ -103,6 +113,20 @@ class OrderServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def SynchroBillStream(self, request, context):
+        """流式同步单据（大批量回填用）：请求同上，每处理完一张单据即返回其结果，规则按 BillType 选择
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SynchroBillBidiStream(self, request_iterator, context):
+        """双向流式同步单据：逐张发送单据，逐张返回结果
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def PushPostBill(self, request, context):
         """增量推送已过账的单据（1 销售出库  2 销售退货 3 收款 4 付款） G_PagePushBillResponse
         """
@@ -156,6 +180,16 @@ def add_OrderServicer_to_server(servicer, server):
                     request_deserializer=order__pb2.G_SyncBillListRequest.FromString,
                     response_serializer=order__pb2.G_SyncBillListInfoResponse.SerializeToString,
             ),
+            'SynchroBillStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.SynchroBillStream,
+                    request_deserializer=order__pb2.G_SyncBillListRequest.FromString,
+                    response_serializer=order__pb2.G_SyncBillInfoResponse.SerializeToString,
+            ),
+            'SynchroBillBidiStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.SynchroBillBidiStream,
+                    request_deserializer=order__pb2.G_SyncBillRequest.FromString,
+                    response_serializer=order__pb2.G_SyncBillInfoResponse.SerializeToString,
+            ),
             'PushPostBill': grpc.unary_unary_rpc_method_handler(
                     servicer.PushPostBill,
                     request_deserializer=common__pb2.G_PushRequest.FromString,
@@ -274,6 +308,60 @@ class Order(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def SynchroBillStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/Order/SynchroBillStream',
+            order__pb2.G_SyncBillListRequest.SerializeToString,
+            order__pb2.G_SyncBillInfoResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SynchroBillBidiStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/Order/SynchroBillBidiStream',
+            order__pb2.G_SyncBillRequest.SerializeToString,
+            order__pb2.G_SyncBillInfoResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def PushPostBill(request,
             target,
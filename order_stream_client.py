@@ -0,0 +1,53 @@
+"""Client helpers for the streaming bill-sync RPCs.
+
+  stream_sync_bills -> Order.SynchroBillStream: one request, results streamed
+                       back as each bill is processed
+  bidi_sync_bills   -> Order.SynchroBillBidiStream: bills sent incrementally
+                       from any iterable, with at most `window` unanswered
+
+Both return an iterator of G_SyncBillInfoResponse in bill order, e.g.
+
+    stub = order_pb2_grpc.OrderStub(grpc.insecure_channel('localhost:50051'))
+    for info in bidi_sync_bills(stub, read_bills_from_db()):
+        print(info.BillKey, info.SyncMsg)
+"""
+import threading
+
+import order_pb2
+
+# unanswered bills allowed in flight on the bidirectional stream
+DEFAULT_WINDOW = 64
+
+
+def stream_sync_bills(stub, bills, timeout=None, metadata=None):
+    """Send `bills` in a single G_SyncBillListRequest and iterate over the streamed results."""
+    request = order_pb2.G_SyncBillListRequest()  # type: ignore[attr-defined]
+    request.Data.extend(bills)
+    return stub.SynchroBillStream(request, timeout=timeout, metadata=metadata)
+
+
+def bidi_sync_bills(stub, bills, window=DEFAULT_WINDOW, timeout=None, metadata=None):
+    """Stream bills from any iterable and yield their results as they come back.
+
+    `bills` is read lazily and a new bill is only sent once fewer than
+    `window` are unanswered, so neither side buffers more than `window`
+    bills however long the input is. Stopping iteration early cancels the call.
+    """
+    slots = threading.Semaphore(window)
+    call = None
+
+    def requests():
+        for bill in bills:
+            # wait for a free slot, but give up once the call has ended
+            while not slots.acquire(timeout=0.5):
+                if call is not None and not call.is_active():
+                    return
+            yield bill
+
+    call = stub.SynchroBillBidiStream(requests(), timeout=timeout, metadata=metadata)
+    try:
+        for info in call:
+            slots.release()
+            yield info
+    finally:
+        call.cancel()
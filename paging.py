@@ -0,0 +1,205 @@
+"""Paged lists for the G_BaseInfoRequest RPCs (PageBranchDataList,
+PageEmployeeDataList, GetPageProductClassifyList, PageCustomerClassifyList, ...).
+
+Handday walks these lists page by page with G_BaseInfoRequest(PageIndex,
+PageSize, Data keyword, BranchKey). OFFSET paging makes page N cost
+N * PageSize rows, so a full walk is quadratic. Here a source only answers
+keyset queries:
+
+    fetch(filter, after, limit) -> [(sort_key, row message), ...]
+
+the first `limit` rows matching `filter` whose sort_key is greater than
+`after` (None = from the start), in sort_key order. sort_key must be unique
+(e.g. (name, key)). The Pager remembers the sort_key that ends each page it
+served, per (rpc, filter, PageSize), so the next page is one keyset query of
+PageSize rows. A page past the last remembered cursor is reached by walking
+from the nearest cursor before it, at most ERP_PAGE_MAX_WALK pages (default
+50) per query, and the cursors in between are remembered too.
+
+The total is computed once per filter with the source's count(filter), or
+by walking fetch() when it has none, and cached with the cursors. It fills
+TotalCount, and it bounds jumps: a PageIndex past the last page raises
+PageOutOfRange before anything is walked, also for page types without
+TotalCount. Entries
+expire after ERP_PAGE_CACHE_TTL seconds (default 60) so counts follow data
+changes; invalidate() drops them at once, and so does a change of the
+source's version() stamp when it has one. Cursors stay correct when rows
+change, since they are keys rather than positions.
+
+Sources are registered per RPC with register_source().
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = float(os.environ.get('ERP_PAGE_CACHE_TTL', '60'))
+# (rpc, filter, PageSize) combinations kept, least recently used dropped first
+MAX_ENTRIES = int(os.environ.get('ERP_PAGE_CACHE_SIZE', '1000'))
+MAX_PAGE_SIZE = int(os.environ.get('ERP_PAGE_MAX_SIZE', '1000'))
+DEFAULT_PAGE_SIZE = 20
+# CorpId set on pages that have one (the same setting as push_engine)
+CORP_ID = int(os.environ.get('ERP_CORP_ID', '0'))
+# pages fetched per query when walking to a page past the last known cursor
+MAX_WALK_PAGES = int(os.environ.get('ERP_PAGE_MAX_WALK', '50'))
+# rows per fetch() when counting without a count()
+COUNT_BATCH = 1000
+
+PAGE_LOOKUPS = metrics.REGISTRY.counter(
+    'erp_page_cursor_lookups_total',
+    'Paged-list requests by how the page start was found (cached cursor, or a walk from an earlier one)',
+    ('rpc', 'outcome'))
+
+
+class PageOutOfRange(ValueError):
+    pass
+
+
+class PageFilter(NamedTuple):
+    """What a G_BaseInfoRequest filters on: Data keyword and BranchKey ('' = no filter)."""
+    keyword: str
+    branch_key: str
+
+
+class PageSource(NamedTuple):
+    fetch: Callable[[PageFilter, Optional[object], int], list]
+    count: Optional[Callable[[PageFilter], int]] = None
+    version: Optional[Callable[[], object]] = None
+
+
+SOURCES = {}
+
+
+def register_source(rpc, fetch, count=None, version=None):
+    """Serve `rpc` (e.g. 'PageBranchDataList') from a keyset `fetch` and an optional `count`.
+
+    `version()`, if given, is a cheap stamp of the source's data; cached pages
+    are dropped when it changes.
+    """
+    SOURCES[rpc] = PageSource(fetch, count, version)
+
+
+class _Entry:
+    def __init__(self, stamp):
+        self.stamp = stamp
+        self.created = time.time()
+        self.lock = threading.Lock()
+        self.cursors = {1: None}  # PageIndex -> sort_key ending the page before it
+        self.total = None
+
+
+class Pager:
+    """Serves G_BaseInfoRequest pages from registered sources with cached cursors and counts."""
+
+    def __init__(self, sources=None, ttl=CACHE_TTL, max_entries=MAX_ENTRIES, max_page_size=MAX_PAGE_SIZE,
+                 max_walk_pages=MAX_WALK_PAGES):
+        self.sources = SOURCES if sources is None else sources
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_page_size = max_page_size
+        self.max_walk_pages = max(max_walk_pages, 1)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def has_source(self, rpc):
+        return rpc in self.sources
+
+    def _entry(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (time.time() - entry.created > self.ttl or entry.stamp != stamp):
+                entry = None
+            if entry is None:
+                entry = self._entries[key] = _Entry(stamp)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(key)
+            return entry
+
+    def invalidate(self, rpc=None):
+        """Drop cached cursors and counts of `rpc` (all when None), e.g. after its data changed."""
+        with self._lock:
+            if rpc is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == rpc]:
+                    del self._entries[key]
+
+    def page(self, rpc, request, page_type):
+        """The `page_type` message (TotalCount, Data) answering `request` for `rpc`.
+
+        Raises PageOutOfRange when PageIndex is past the last page (page 1 is
+        always valid, empty or not).
+        """
+        source = self.sources[rpc]
+        size = min(request.PageSize if request.PageSize > 0 else DEFAULT_PAGE_SIZE, self.max_page_size)
+        index = max(request.PageIndex, 1)
+        flt = PageFilter(request.Data.strip(), request.BranchKey)
+        entry = self._entry((rpc, flt, size), source.version() if source.version is not None else None)
+        fields = page_type.DESCRIPTOR.fields_by_name
+        with entry.lock:
+            # a jump needs the total to know where the walk ends
+            total = self._total(source, entry, flt) \
+                if 'TotalCount' in fields or index not in entry.cursors else None
+            if total is not None and index > 1 and (index - 1) * size >= total:
+                raise PageOutOfRange(f'PageIndex {index} is past the last page ({-(-total // size)})')
+            rows = self._rows(rpc, source, entry, flt, index, size)
+        page = page_type()
+        page.Data.extend(row for _, row in rows)
+        if total is not None:
+            page.TotalCount = total
+        if 'CorpId' in fields:
+            page.CorpId = CORP_ID
+        return page
+
+    def _rows(self, rpc, source, entry, flt, index, size):
+        # caller holds entry.lock
+        if index in entry.cursors:
+            PAGE_LOOKUPS.labels(rpc, 'cached').inc()
+            rows = source.fetch(flt, entry.cursors[index], size)
+        else:
+            # walk from the nearest page whose start is known, max_walk_pages per query;
+            # the last query also fetches the page itself
+            start = max(i for i in entry.cursors if i < index)
+            PAGE_LOOKUPS.labels(rpc, 'walk').inc()
+            while True:
+                step = min(index - start, self.max_walk_pages)
+                last = start + step == index
+                walked = source.fetch(flt, entry.cursors[start], (step + 1 if last else step) * size)
+                for n in range(1, step + 1):
+                    if len(walked) < n * size:
+                        break
+                    entry.cursors[start + n] = walked[n * size - 1][0]
+                if last:
+                    rows = walked[step * size:]
+                    break
+                if start + step not in entry.cursors:
+                    # rows were deleted since the total was counted
+                    rows = []
+                    break
+                start += step
+        if len(rows) == size:
+            entry.cursors[index + 1] = rows[-1][0]
+        return rows
+
+    def _total(self, source, entry, flt):
+        # caller holds entry.lock
+        if entry.total is None:
+            if source.count is not None:
+                entry.total = source.count(flt)
+            else:
+                total, after = 0, None
+                while True:
+                    batch = source.fetch(flt, after, COUNT_BATCH)
+                    total += len(batch)
+                    if len(batch) < COUNT_BATCH:
+                        break
+                    after = batch[-1][0]
+                entry.total = total
+        return entry.total
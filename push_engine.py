@@ -0,0 +1,389 @@
+"""Push engine for the G_PushRequest RPCs (PushProduct, PushPostBill, PushCustomer, ...).
+
+Handday calls a Push* RPC with G_PushRequest(Count, PushAddress, SynchroId)
+and expects the ERP to page its data and POST each page to PushAddress.
+PushEngine.start() answers with a G_PushResponse at once and runs the push
+in the background:
+
+  source rows ──> Count-sized pages ──> POSTed concurrently (at most WINDOW
+                                        unacknowledged pages per push)
+
+Rows are read lazily from the source and a page is only built when a window
+slot is free, so memory is bounded by WINDOW pages regardless of how many
+rows are pushed. Pages are sent over http_client's pooled keep-alive session.
+
+A source is registered per RPC with register_source(): a `rows(after)`
+generator yielding (cursor, row message) in a stable order, and the page
+message the rows are wrapped in (its `Data` field).
+
+Progress is checkpointed per SynchroId in sync_results.db (push_checkpoints):
+the last contiguously acknowledged page and the cursor of its last row. If a
+push dies partway (callback error, process restart), the same request sent
+again resumes after that cursor instead of re-sending everything; a finished
+push starts over. The checkpoint also marks the push as running, so a
+duplicate request landing on another worker process does not start a second
+copy. BasicInfo.ResetPush clears checkpoints (reset()).
+
+Incremental RPCs (PushPostBill, ...) only send rows past
+their entity's high-water mark; a source's `acknowledged(cursor)` hook moves
+the mark as pages are acknowledged and its `reset()` hook drops it on
+ResetPush. change_log.register_incremental() sets both up.
+
+Settings (env):
+  ERP_PUSH_WINDOW     unacknowledged pages in flight per push (default 4)
+  ERP_PUSH_WORKERS    threads POSTing pages, shared by all pushes (default 8)
+  ERP_PUSH_MAX_COUNT  upper bound on G_PushRequest.Count (default 5000)
+  ERP_CORP_ID         CorpId set on pages that have one (default 0)
+  ERP_PUSH_STALE      seconds without checkpoint progress after which a running
+                      push is presumed dead and may be resumed elsewhere (default 120)
+"""
+import itertools
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterator, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from google.protobuf import json_format
+
+import common_pb2
+import http_client
+import metrics
+import order_pb2
+import sync_store
+
+logger = logging.getLogger(__name__)
+
+WINDOW = int(os.environ.get('ERP_PUSH_WINDOW', '4'))
+WORKERS = int(os.environ.get('ERP_PUSH_WORKERS', '8'))
+MAX_COUNT = int(os.environ.get('ERP_PUSH_MAX_COUNT', '5000'))
+CORP_ID = int(os.environ.get('ERP_CORP_ID', '0'))
+STALE_AFTER = float(os.environ.get('ERP_PUSH_STALE', '120'))
+# checkpoint owner: identifies this process among the workers sharing the database
+OWNER = f'{socket.gethostname()}:{os.getpid()}'
+# finished pushes kept for status()
+HISTORY = 200
+
+STATE_OK, STATE_FAIL = 1, 2
+
+PUSH_PAGES = metrics.REGISTRY.counter(
+    'erp_push_pages_total', 'Pages POSTed by Push* RPCs, by outcome', ('rpc', 'outcome'))
+PUSH_ROWS = metrics.REGISTRY.counter(
+    'erp_push_rows_total', 'Rows acknowledged by push callbacks', ('rpc',))
+PUSH_ACTIVE = metrics.REGISTRY.gauge(
+    'erp_push_active', 'Pushes currently running', ('rpc',))
+
+
+def _owner_gone(owner):
+    # a process on this host that no longer exists (e.g. the worker before a restart)
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+class PushSource(NamedTuple):
+    """Where a Push* RPC gets its rows: rows(after) yields (cursor, row) after `after` (None = start).
+
+    acknowledged(cursor) is called as the contiguously acknowledged prefix
+    grows, reset() when the push is reset; incremental sources keep their
+    high-water mark with them.
+    """
+    page_type: type
+    rows: Callable[[Optional[object]], Iterator[tuple]]
+    acknowledged: Optional[Callable[[object], None]] = None
+    reset: Optional[Callable[[], None]] = None
+
+
+SOURCES = {}
+
+
+def register_source(rpc, page_type, rows, acknowledged=None, reset=None):
+    """Serve `rpc` (e.g. 'PushProductStock') with rows wrapped in `page_type` messages."""
+    SOURCES[rpc] = PushSource(page_type, rows, acknowledged, reset)
+
+
+def _response(state, msg):
+    return common_pb2.G_PushResponse(State=state, Msg=msg)  # type: ignore[attr-defined]
+
+
+def _pages(rows, size):
+    """(cursor of last row, [rows]) chunks of `size` from a (cursor, row) iterator."""
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk[-1][0], [row for _, row in chunk]
+
+
+def encode_page(page_type, rows):
+    """JSON body for one page: the page message with `rows` as Data."""
+    page = page_type()
+    page.Data.extend(rows)
+    fields = page.DESCRIPTOR.fields_by_name
+    if 'TotalCount' in fields:
+        page.TotalCount = len(rows)
+    if 'CorpId' in fields:
+        page.CorpId = CORP_ID
+    return json_format.MessageToJson(page, preserving_proto_field_name=True, use_integers_for_enums=True,
+                                   indent=None).encode('utf-8')
+
+
+class PushJob:
+    """One push of one SynchroId; run() drives it to completion on its own thread."""
+
+    def __init__(self, rpc, source, request, pool, client, window=WINDOW, checkpoint=None):
+        self.rpc = rpc
+        self.source = source
+        self.synchro_id = request.SynchroId
+        self.address = request.PushAddress
+        self.page_size = min(request.Count, MAX_COUNT)
+        self.window = window
+        self._pool = pool
+        self._client = client
+        self._lock = threading.Lock()
+        self._acked = {}  # page index -> (cursor, rows), until the pages before it are acked too
+        checkpoint = checkpoint or {}
+        # resume where the last run of this SynchroId left off
+        self.start_cursor = checkpoint.get('cursor')
+        self.next_page = checkpoint.get('page', 0)     # next page index to acknowledge contiguously
+        self.cursor = self.start_cursor                # cursor of the last contiguous acknowledged page
+        self.pages_sent = 0
+        self.rows_acked = checkpoint.get('rows', 0)
+        self._saved_at = time.time()
+        self.state = 'running'
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def status(self):
+        with self._lock:
+            return {
+                'rpc': self.rpc, 'synchro_id': self.synchro_id, 'address': self.address,
+                'state': self.state, 'error': self.error, 'pages_sent': self.pages_sent,
+                'pages_acked': self.next_page, 'rows_acked': self.rows_acked, 'cursor': self.cursor,
+                'started_at': self.started_at, 'finished_at': self.finished_at,
+            }
+
+    def run(self):
+        active = PUSH_ACTIVE.labels(self.rpc)
+        active.inc()
+        slots = threading.Semaphore(self.window)
+        try:
+            pages = _pages(iter(self.source.rows(self.start_cursor)), self.page_size)
+            for index, (cursor, rows) in enumerate(pages, start=self.next_page):
+                slots.acquire()
+                if self.error is not None:
+                    slots.release()
+                    break
+                if time.time() - self._saved_at > STALE_AFTER / 4:
+                    # no page acknowledged for a while (slow callback): keep the claim alive
+                    with self._lock:
+                        self._save()
+                body = encode_page(self.source.page_type, rows)
+                try:
+                    future = self._pool.submit(self._send, index, cursor, len(rows), body)
+                except RuntimeError as e:
+                    # the pool was shut down
+                    slots.release()
+                    self._fail(f'page {index}: {e}')
+                    break
+                with self._lock:
+                    self.pages_sent += 1
+                # also runs for a send cancelled by shutdown(), so its slot is never lost
+                future.add_done_callback(partial(self._sent, index, slots))
+        except Exception as e:
+            logger.exception('Push %s/%s: reading rows failed', self.rpc, self.synchro_id)
+            self._fail(f'source error: {e}')
+        # wait for the pages still in flight
+        for _ in range(self.window):
+            slots.acquire()
+        with self._lock:
+            self.state = 'failed' if self.error else 'finished'
+            self.finished_at = time.time()
+            if not self._save():
+                self.state = 'failed'
+        active.dec()
+        logger.info('Push %s/%s %s: %d pages, %d rows%s', self.rpc, self.synchro_id, self.state,
+                    self.next_page, self.rows_acked, f' ({self.error})' if self.error else '')
+
+    def _send(self, index, cursor, count, body):
+        try:
+            r = self._client.post(self.address, data=body, headers={'Content-Type': 'application/json'})
+            if r.status_code >= 300:
+                raise RuntimeError(f'HTTP {r.status_code}: {r.text[:200]}')
+            PUSH_PAGES.labels(self.rpc, 'ok').inc()
+            self._ack(index, cursor, count)
+        except Exception as e:
+            PUSH_PAGES.labels(self.rpc, 'error').inc()
+            self._fail(f'page {index}: {e}')
+
+    def _sent(self, index, slots, future):
+        if future.cancelled():
+            self._fail(f'page {index}: cancelled by shutdown')
+        slots.release()
+
+    def _ack(self, index, cursor, count):
+        with self._lock:
+            self._acked[index] = (cursor, count)
+            progressed = self.next_page in self._acked
+            # pages complete out of order; progress only moves over a gap-free prefix
+            while self.next_page in self._acked:
+                self.cursor, n = self._acked.pop(self.next_page)
+                self.rows_acked += n
+                self.next_page += 1
+                PUSH_ROWS.labels(self.rpc).inc(n)
+            if not self._save():
+                # unpersisted progress is not acknowledged; the job stops and resumes from the last saved page
+                return
+            if progressed and self.source.acknowledged is not None:
+                try:
+                    self.source.acknowledged(self.cursor)
+                except Exception as e:
+                    # the checkpoint already holds the progress; the mark catches up on the next ack
+                    logger.warning('Push %s/%s: advancing mark failed: %s', self.rpc, self.synchro_id, e)
+
+    def _save(self):
+        """Write the checkpoint; False, and the job stopped, when it was not written."""
+        # caller holds self._lock
+        self._saved_at = time.time()
+        try:
+            if sync_store.save_push_checkpoint(self.synchro_id, OWNER, self.next_page, self.cursor,
+                                               self.rows_acked, self.state, self.error):
+                return True
+            error = 'checkpoint was reset or taken over'
+        except Exception as e:
+            error = f'saving checkpoint failed: {e}'
+        if self.error is None:
+            self.error = error
+            logger.warning('Push %s/%s stopped: %s', self.rpc, self.synchro_id, error)
+        return False
+
+    def _fail(self, error):
+        with self._lock:
+            if self.error is None:
+                self.error = error
+                logger.warning('Push %s/%s failed: %s', self.rpc, self.synchro_id, error)
+
+    def stop(self, reason):
+        """Stop sending further pages; pages already in flight still complete."""
+        self._fail(reason)
+
+
+class PushEngine:
+    """Starts PushJobs for Push* RPCs; one running push per SynchroId."""
+
+    job_class = PushJob
+
+    def __init__(self, client=None, workers=WORKERS, window=WINDOW, sources=None):
+        self.client = client or http_client.CLIENT
+        self.window = window
+        self.sources = SOURCES if sources is None else sources
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='push')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # synchro_id -> PushJob, oldest first
+
+    def has_source(self, rpc):
+        return rpc in self.sources
+
+    def start(self, rpc, request):
+        """Validate `request`, start the push in the background and return its G_PushResponse."""
+        source = self.sources.get(rpc)
+        if source is None:
+            return _response(STATE_FAIL, f'{rpc}: no data source configured')
+        if request.Count <= 0:
+            return _response(STATE_FAIL, 'Count must be positive')
+        parts = urlsplit(request.PushAddress)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            return _response(STATE_FAIL, f'invalid PushAddress {request.PushAddress!r}')
+        with self._lock:
+            current = self._jobs.get(request.SynchroId)
+            if current is not None and current.state == 'running':
+                # a repeated request while the push runs is not a second push
+                return _response(STATE_OK, f'push {request.SynchroId} already running')
+            claimed, checkpoint = sync_store.claim_push_checkpoint(request.SynchroId, rpc, OWNER, STALE_AFTER,
+                                                                 owner_gone=_owner_gone)
+            if not claimed:
+                return _response(STATE_OK, f'push {request.SynchroId} already running in {checkpoint["owner"]}')
+            job = self.job_class(rpc, source, request, self._pool, self.client, self.window, checkpoint)
+            self._jobs.pop(request.SynchroId, None)
+            self._jobs[request.SynchroId] = job
+            while len(self._jobs) > HISTORY:
+                oldest = next(iter(self._jobs))
+                if self._jobs[oldest].state == 'running':
+                    break
+                del self._jobs[oldest]
+        # read before the job runs and moves them
+        resume_page, resume_rows = job.next_page, job.rows_acked
+        threading.Thread(target=job.run, name=f'push-{request.SynchroId}', daemon=True).start()
+        if resume_page:
+            logger.info('%s resumed push %s to %s at page %d (%d rows already acknowledged)',
+                        rpc, request.SynchroId, request.PushAddress, resume_page, resume_rows)
+            return _response(STATE_OK, f'push {request.SynchroId} resumed at page {resume_page}')
+        logger.info('%s started push %s to %s (Count=%d)', rpc, request.SynchroId, request.PushAddress, job.page_size)
+        return _response(STATE_OK, f'push {request.SynchroId} started')
+
+    def reset(self, synchro_ids=None):
+        """Stop running pushes of `synchro_ids` (all when None) and clear their checkpoints.
+
+        The next request for a reset SynchroId pushes everything from the start,
+        incremental sources included: the marks of their RPCs are reset too.
+        Returns the number of checkpoints cleared.
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.state == 'running' and (synchro_ids is None or job.synchro_id in synchro_ids):
+                job.stop('reset by ResetPush')
+        if synchro_ids is None:
+            rpcs = set(self.sources)
+        else:
+            checkpoints = (sync_store.load_push_checkpoint(i) for i in synchro_ids)
+            rpcs = {cp['rpc'] for cp in checkpoints if cp is not None}
+        for rpc in rpcs:
+            source = self.sources.get(rpc)
+            if source is not None and source.reset is not None:
+                source.reset()
+        return sync_store.clear_push_checkpoints(synchro_ids)
+
+    def status(self, synchro_id=None):
+        """Progress of one push, or of all recent pushes when synchro_id is None."""
+        with self._lock:
+            jobs = list(self._jobs.values()) if synchro_id is None else [self._jobs.get(synchro_id)]
+        found = [job.status() for job in jobs if job is not None]
+        return found if synchro_id is None else (found[0] if found else None)
+
+    def shutdown(self, wait=False):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+# built-in source: bills synced successfully into the ERP are its posted bills.
+# sync_results ids only grow, so the id itself is the change seq: a push sends
+# the bills posted since the last acknowledged one (mark 'posted_bill').
+POSTED_BILL_MARK = 'posted_bill'
+
+
+def _posted_bills(after):
+    if after is None:
+        after = sync_store.get_push_mark(POSTED_BILL_MARK)
+    columns = ('id', 'bill_key', 'erp_key', 'bill_type')
+    for row_id, bill_key, erp_key, bill_type in sync_store.iter_results(
+            sync_state=common_pb2.SyncSuccess, after_id=after, columns=columns):  # type: ignore[attr-defined]
+        yield row_id, order_pb2.G_PushBillResponse(  # type: ignore[attr-defined]
+            BillErpKey=erp_key or '', BillErpCode=erp_key or '', BillType=bill_type or 0, BillKey=bill_key or '')
+
+
+register_source('PushPostBill', order_pb2.G_PagePushBillResponse, _posted_bills,  # type: ignore[attr-defined]
+                acknowledged=lambda cursor: sync_store.advance_push_mark(POSTED_BILL_MARK, cursor),
+                reset=lambda: sync_store.reset_push_marks([POSTED_BILL_MARK]))
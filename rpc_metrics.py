@@ -0,0 +1,309 @@
+"""gRPC server metrics for erp_service.
+
+MetricsInterceptor / AsyncMetricsInterceptor wrap every registered method
+(the generated servicers expose 100+), recording per method:
+
+  erp_grpc_server_handling_seconds   latency histogram, until the last response
+  erp_grpc_server_in_flight          RPCs currently being handled
+  erp_grpc_server_handled_total      completed RPCs by status code
+
+and, for Order bill-sync RPCs, bills per request and details per bill.
+service_collector() exports the pipeline stage timings, idempotency index,
+validation cache and write-behind queue stats of a running OrderServicer.
+"""
+import asyncio
+import functools
+import inspect
+import time
+
+import grpc
+
+import bill_validation
+import log_setup
+import metrics
+import order_pb2
+import sync_store
+
+RPC_LATENCY = metrics.REGISTRY.histogram(
+    'erp_grpc_server_handling_seconds', 'Time spent handling an RPC until its last response message',
+    ('grpc_service', 'grpc_method'))
+RPC_IN_FLIGHT = metrics.REGISTRY.gauge(
+    'erp_grpc_server_in_flight', 'RPCs currently being handled', ('grpc_service', 'grpc_method'))
+RPC_HANDLED = metrics.REGISTRY.counter(
+    'erp_grpc_server_handled_total', 'RPCs completed, by status code', ('grpc_service', 'grpc_method', 'grpc_code'))
+BILLS_PER_REQUEST = metrics.REGISTRY.histogram(
+    'erp_order_bills_per_request', 'Bills received per bill-sync RPC', ('grpc_method',),
+    buckets=(1, 5, 10, 50, 100, 500, 1000, 5000, 20000, 100000))
+DETAILS_PER_BILL = metrics.REGISTRY.histogram(
+    'erp_order_details_per_bill', 'Detail lines per bill received by bill-sync RPCs', ('grpc_method',),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 500, 1000, 5000))
+
+_BILL_LIST = order_pb2.G_SyncBillListRequest  # type: ignore[attr-defined]
+_BILL = order_pb2.G_SyncBillRequest  # type: ignore[attr-defined]
+
+
+class _Rpc:
+    """Metric children for one method, resolved once per method (see _rpc())."""
+
+    def __init__(self, full_method):
+        # '/Order/SynchroSaleOrderList' -> ('Order', 'SynchroSaleOrderList')
+        service, _, method = full_method.lstrip('/').rpartition('/')
+        self.service = service
+        self.method = method
+        self.latency = RPC_LATENCY.labels(service, method)
+        self.in_flight = RPC_IN_FLIGHT.labels(service, method)
+        # size distributions only for the Order.Synchro* bill-sync methods
+        self.bill_sync = service == 'Order' and method.startswith('Synchro')
+        if self.bill_sync:
+            self.bills = BILLS_PER_REQUEST.labels(method)
+            self.details = DETAILS_PER_BILL.labels(method)
+
+    def start(self):
+        self.in_flight.inc()
+        return time.perf_counter()
+
+    def finish(self, started, code):
+        self.latency.observe(time.perf_counter() - started)
+        self.in_flight.dec()
+        RPC_HANDLED.labels(self.service, self.method, code).inc()
+
+    def observe_request(self, request):
+        if self.bill_sync and isinstance(request, _BILL_LIST):
+            self.bills.observe(len(request.Data))
+            for bill in request.Data:
+                self.details.observe(len(bill.Details))
+
+    def observe_bill(self, bill):
+        if self.bill_sync and isinstance(bill, _BILL):
+            self.details.observe(len(bill.Details))
+
+    def observe_bill_count(self, count):
+        if self.bill_sync:
+            self.bills.observe(count)
+
+
+@functools.lru_cache(maxsize=1024)
+def _rpc(full_method):
+    # interceptors run on every call; only methods with a handler get here, so this stays small
+    return _Rpc(full_method)
+
+
+_CODE_NAMES = {code.value[0]: code.name for code in grpc.StatusCode}
+
+
+def _status(context, failed):
+    # handlers signal errors with context.abort()/set_code(); an uncaught exception is UNKNOWN
+    try:
+        code = context.code()
+    except Exception:
+        code = None
+    if isinstance(code, grpc.StatusCode):
+        return code.name
+    if isinstance(code, int) and code in _CODE_NAMES:
+        return _CODE_NAMES[code]
+    return 'UNKNOWN' if failed else 'OK'
+
+
+def _counting(rpc, request_iterator, counter):
+    for request in request_iterator:
+        counter[0] += 1
+        rpc.observe_bill(request)
+        yield request
+
+
+async def _acounting(rpc, request_iterator, counter):
+    async for request in request_iterator:
+        counter[0] += 1
+        rpc.observe_bill(request)
+        yield request
+
+
+def _handler_factory(handler):
+    if handler.request_streaming and handler.response_streaming:
+        return handler.stream_stream, grpc.stream_stream_rpc_method_handler
+    if handler.request_streaming:
+        return handler.stream_unary, grpc.stream_unary_rpc_method_handler
+    if handler.response_streaming:
+        return handler.unary_stream, grpc.unary_stream_rpc_method_handler
+    return handler.unary_unary, grpc.unary_unary_rpc_method_handler
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records latency, in-flight and status metrics for every method of a grpc.server."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        rpc = _rpc(handler_call_details.method)
+        behavior, factory = _handler_factory(handler)
+
+        if handler.response_streaming:
+            def wrapped(request_or_iterator, context):
+                counter = [0]
+                if handler.request_streaming:
+                    request_or_iterator = _counting(rpc, request_or_iterator, counter)
+                else:
+                    rpc.observe_request(request_or_iterator)
+                started = rpc.start()
+                failed = True
+                code = None
+                try:
+                    yield from behavior(request_or_iterator, context)
+                    failed = False
+                except GeneratorExit:
+                    # the client went away before the stream finished
+                    code = 'CANCELLED'
+                    raise
+                finally:
+                    if handler.request_streaming:
+                        rpc.observe_bill_count(counter[0])
+                    rpc.finish(started, code or _status(context, failed))
+        else:
+            def wrapped(request_or_iterator, context):
+                counter = [0]
+                if handler.request_streaming:
+                    request_or_iterator = _counting(rpc, request_or_iterator, counter)
+                else:
+                    rpc.observe_request(request_or_iterator)
+                started = rpc.start()
+                failed = True
+                try:
+                    response = behavior(request_or_iterator, context)
+                    failed = False
+                    return response
+                finally:
+                    if handler.request_streaming:
+                        rpc.observe_bill_count(counter[0])
+                    rpc.finish(started, _status(context, failed))
+
+        return factory(wrapped, request_deserializer=handler.request_deserializer,
+                       response_serializer=handler.response_serializer)
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """grpc.aio variant of MetricsInterceptor.
+
+    Handlers may be coroutines, async generators or, for methods the aio
+    servicers inherit unimplemented from *_pb2_grpc, plain functions.
+    """
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        rpc = _rpc(handler_call_details.method)
+        behavior, factory = _handler_factory(handler)
+
+        if handler.response_streaming:
+            async def wrapped(request_or_iterator, context):
+                counter = [0]
+                if handler.request_streaming:
+                    request_or_iterator = _acounting(rpc, request_or_iterator, counter)
+                else:
+                    rpc.observe_request(request_or_iterator)
+                started = rpc.start()
+                failed = True
+                code = None
+                try:
+                    result = behavior(request_or_iterator, context)
+                    if hasattr(result, '__aiter__'):
+                        async for response in result:
+                            yield response
+                    elif inspect.isawaitable(result):
+                        # handler writes with context.write() and returns nothing
+                        await result
+                    elif result is not None:
+                        for response in result:
+                            yield response
+                    failed = False
+                except (asyncio.CancelledError, GeneratorExit):
+                    code = 'CANCELLED'
+                    raise
+                finally:
+                    if handler.request_streaming:
+                        rpc.observe_bill_count(counter[0])
+                    rpc.finish(started, code or _status(context, failed))
+        else:
+            async def wrapped(request_or_iterator, context):
+                counter = [0]
+                if handler.request_streaming:
+                    request_or_iterator = _acounting(rpc, request_or_iterator, counter)
+                else:
+                    rpc.observe_request(request_or_iterator)
+                started = rpc.start()
+                failed = True
+                code = None
+                try:
+                    response = behavior(request_or_iterator, context)
+                    if inspect.isawaitable(response):
+                        response = await response
+                    failed = False
+                    return response
+                except asyncio.CancelledError:
+                    code = 'CANCELLED'
+                    raise
+                finally:
+                    if handler.request_streaming:
+                        rpc.observe_bill_count(counter[0])
+                    rpc.finish(started, code or _status(context, failed))
+
+        return factory(wrapped, request_deserializer=handler.request_deserializer,
+                       response_serializer=handler.response_serializer)
+
+
+def _counter_family(name, help, samples):
+    return metrics.MetricFamily(name, 'counter', help, samples)
+
+
+def _gauge_family(name, help, samples):
+    return metrics.MetricFamily(name, 'gauge', help, samples)
+
+
+def service_collector(order_servicer):
+    """Collector exporting the stats OrderServicer and sync_store keep internally."""
+
+    def collect():
+        calls, seconds, slowest = [], [], []
+        for name, pipeline in order_servicer.pipelines.items():
+            for stage, s in pipeline.stats().items():
+                labels = {'pipeline': name, 'stage': stage}
+                calls.append(('', labels, s['count']))
+                seconds.append(('', labels, s['total_seconds']))
+                slowest.append(('', labels, s['max_seconds']))
+        families = [
+            _counter_family('erp_pipeline_stage_calls_total', 'Bill pipeline stage executions', calls),
+            _counter_family('erp_pipeline_stage_seconds_total', 'Time spent in each bill pipeline stage', seconds),
+            _gauge_family('erp_pipeline_stage_max_seconds', 'Slowest single execution of each stage', slowest),
+        ]
+
+        idem = order_servicer.idempotency.stats()
+        families.append(_counter_family(
+            'erp_idempotency_lookups_total', 'Idempotency lookups by outcome',
+            [('', {'result': r}, idem[r]) for r in ('memory_hits', 'store_hits', 'misses')]))
+        families.append(_gauge_family('erp_idempotency_cache_entries', 'Results held in the idempotency LRU',
+                                      [('', {}, idem['size'])]))
+
+        cache = bill_validation.DETAIL_CACHE.stats()
+        families.append(_counter_family(
+            'erp_validation_cache_events_total', 'Detail validation memo cache events',
+            [('', {'event': e}, cache[e]) for e in ('hits', 'misses', 'evictions', 'expirations')]))
+        families.append(_gauge_family('erp_validation_cache_entries', 'Entries in the detail validation memo cache',
+                                      [('', {}, cache['size'])]))
+
+        families.append(_counter_family('erp_log_records_dropped_total',
+                                        'Log records dropped because the log queue was full',
+                                        [('', {}, log_setup.dropped_records())]))
+
+        wb = sync_store.write_behind_stats()
+        if wb is not None:
+            families.append(_counter_family(
+                'erp_write_behind_rows_total', 'Sync result rows handled by the write-behind writer',
+                [('', {'outcome': k}, wb[k]) for k in ('submitted', 'flushed', 'dropped', 'failed')]))
+            families.append(_counter_family('erp_write_behind_batches_total', 'Write-behind transactions',
+                                            [('', {}, wb['batches'])]))
+            families.append(_gauge_family('erp_write_behind_queue_depth', 'Rows waiting in the write-behind queue',
+                                          [('', {}, wb['queue_depth'])]))
+        return families
+
+    return collect
@@ -6,11 +6,11 @@ Usage:
   python sync_runner.py --get-token [--dry-run]  # optionally perform token request
 """
 import argparse
-import requests
+import http_client
 from sync_config import load_config, save_sample_config
 import os
 import json
-import grpc
+import grpc_channels
 import order_pb2
 import order_pb2_grpc
 
@@ -39,7 +39,7 @@ def get_token(cfg, dry_run=True):
         print('\nDry run: not sending HTTP request. Use --no-dry-run to actually send it.')
         return None
     try:
-        r = requests.post(cfg.token_url, json=payload, timeout=10)
+        r = http_client.post(cfg.token_url, json=payload, timeout=10)
         print('HTTP', r.status_code)
         print(r.text[:2000])
         return r.json()
@@ -96,11 +96,10 @@ def main(argv=None):
 
         # perform gRPC call
         try:
-            with grpc.insecure_channel(args.target) as ch:
-                stub = order_pb2_grpc.OrderStub(ch)
-                resp = stub.SynchroSaleOrderList(sample, timeout=10)
-                print('gRPC response:')
-                print(resp)
+            stub = grpc_channels.get_stub(order_pb2_grpc.OrderStub, args.target)
+            resp = stub.SynchroSaleOrderList(sample, timeout=10)
+            print('gRPC response:')
+            print(resp)
         except Exception as e:
             print('gRPC call failed:', e)
         return
@@ -1,35 +1,226 @@
+import itertools
+import json
 import sqlite3
 import os
+import logging
+import queue
+import threading
+import time
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 DB_PATH = os.path.join(os.path.dirname(__file__), 'sync_results.db')
 
+# SQLite tuning, overridable via env vars (or configure() at runtime).
+# WAL lets readers (admin UI, list_results) run while the gRPC server writes;
+# synchronous=NORMAL is durable across application crashes in WAL mode and
+# only skips the fsync on every commit.
+SYNCHRONOUS = os.environ.get('SYNC_DB_SYNCHRONOUS', 'NORMAL').upper()
+BUSY_TIMEOUT_MS = int(os.environ.get('SYNC_DB_BUSY_TIMEOUT_MS', '5000'))
+
+_SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# one long-lived connection per thread; _CONNS maps thread -> connection so
+# close_all() can close them and connections of finished threads get reaped
+_local = threading.local()
+_CONNS = {}
+_CONNS_LOCK = threading.Lock()
+# bumped by close_all() so threads notice their cached connection was closed
+_generation = 0
+
+
+def configure(synchronous=None, busy_timeout_ms=None):
+    """Change connection settings; open connections are closed and reopened lazily."""
+    global SYNCHRONOUS, BUSY_TIMEOUT_MS
+    if synchronous is not None:
+        SYNCHRONOUS = str(synchronous).upper()
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = int(busy_timeout_ms)
+    close_all()
+
+
+def _connect():
+    if SYNCHRONOUS not in _SYNCHRONOUS_MODES:
+        raise ValueError(f'invalid SYNC_DB_SYNCHRONOUS {SYNCHRONOUS!r}, expected one of {_SYNCHRONOUS_MODES}')
+    # check_same_thread=False only so close_all() can close it from the shutdown thread;
+    # each connection is otherwise used exclusively by the thread that opened it
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000.0, check_same_thread=False)
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={SYNCHRONOUS}')
+    return conn
+
 
 def _get_conn():
-    conn = sqlite3.connect(DB_PATH)
+    """Return the calling thread's connection, opening it on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.path == DB_PATH and _local.generation == _generation:
+        return conn
+    conn = _connect()
+    _local.conn = conn
+    _local.path = DB_PATH
+    _local.generation = _generation
+    with _CONNS_LOCK:
+        # short-lived threads (e.g. Flask's per-request threads) leave connections behind
+        dead = [t for t in _CONNS if not t.is_alive()]
+        stale = [_CONNS.pop(t) for t in dead]
+        old = _CONNS.get(threading.current_thread())
+        if old is not None:
+            stale.append(old)
+        _CONNS[threading.current_thread()] = conn
+    _close_quietly(stale)
     return conn
 
 
+def close_all():
+    """Close every pooled connection (call on shutdown); threads reconnect on next use."""
+    global _generation
+    with _CONNS_LOCK:
+        conns = list(_CONNS.values())
+        _CONNS.clear()
+        _generation += 1
+    _close_quietly(conns)
+
+
+def _release_conn():
+    """Close the calling thread's pooled connection, if any."""
+    with _CONNS_LOCK:
+        conn = _CONNS.pop(threading.current_thread(), None)
+    _local.conn = None
+    _close_quietly([conn] if conn is not None else [])
+
+
+def _close_quietly(conns):
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# Ordered schema migrations. Step N (1-based) brings the database to
+# `PRAGMA user_version` N; append new steps, never edit or reorder shipped ones.
+_MIGRATIONS = [
+    # 1: initial table (IF NOT EXISTS adopts databases created before versioning)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS sync_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bill_key TEXT,
+            erp_key TEXT,
+            sync_state INTEGER,
+            sync_msg TEXT,
+            error_code INTEGER,
+            created_at TEXT
+        )
+        ''',
+    ],
+    # 2: indexes for query_results(); trailing id keeps equality filters ordered for keyset paging
+    [
+        'CREATE INDEX IF NOT EXISTS idx_sync_results_bill_key ON sync_results (bill_key, id)',
+        'CREATE INDEX IF NOT EXISTS idx_sync_results_erp_key ON sync_results (erp_key, id)',
+        'CREATE INDEX IF NOT EXISTS idx_sync_results_state ON sync_results (sync_state, id)',
+        'CREATE INDEX IF NOT EXISTS idx_sync_results_error_code ON sync_results (error_code, id)',
+        'CREATE INDEX IF NOT EXISTS idx_sync_results_created_at ON sync_results (created_at, id)',
+    ],
+    # 3: idempotency key. sync_state is part of it so a bill that failed can
+    #    still be stored once it passes; pre-existing rows keep a NULL
+    #    content_hash, and NULLs never conflict in a UNIQUE index
+    [
+        'ALTER TABLE sync_results ADD COLUMN bill_type INTEGER',
+        'ALTER TABLE sync_results ADD COLUMN content_hash TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_results_idempotency '
+        'ON sync_results (bill_key, bill_type, content_hash, sync_state)',
+    ],
+    # 4: push progress per G_PushRequest.SynchroId (push_engine); cursor is JSON
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS push_checkpoints (
+            synchro_id INTEGER PRIMARY KEY,
+            rpc TEXT NOT NULL,
+            page INTEGER NOT NULL DEFAULT 0,
+            cursor TEXT,
+            rows INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL,
+            error TEXT,
+            owner TEXT,
+            updated_at REAL NOT NULL
+        )
+        ''',
+    ],
+    # 5: change tracking for incremental pushes (change_log). One row per
+    #    (entity, key): re-recording a key moves it to a new, higher seq
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            key TEXT NOT NULL,
+            op TEXT NOT NULL,
+            payload TEXT,
+            changed_at REAL NOT NULL
+        )
+        ''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_key ON change_log (entity, key)',
+        'CREATE INDEX IF NOT EXISTS idx_change_log_seq ON change_log (entity, seq)',
+        '''
+        CREATE TABLE IF NOT EXISTS push_marks (
+            entity TEXT PRIMARY KEY,
+            mark INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        ''',
+    ],
+]
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+_MIGRATE_LOCK = threading.Lock()
+# DB_PATH the schema was last verified for; reset when DB_PATH changes
+_migrated_path = None
+
+
+def migrate():
+    """Apply pending migrations once per process and return the schema version.
+
+    BEGIN IMMEDIATE serializes concurrent migrators (gRPC server and admin
+    server starting together); whoever comes second sees the bumped user_version.
+    """
+    global _migrated_path
+    with _MIGRATE_LOCK:
+        if _migrated_path == DB_PATH:
+            return SCHEMA_VERSION
+        conn = _get_conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(f'{DB_PATH} has schema version {version}, newer than supported {SCHEMA_VERSION}')
+            for target, steps in enumerate(_MIGRATIONS[version:], start=version + 1):
+                for sql in steps:
+                    conn.execute(sql)
+                conn.execute(f'PRAGMA user_version={target}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        _migrated_path = DB_PATH
+        return SCHEMA_VERSION
+
+
 def init_db():
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS sync_results (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        bill_key TEXT,
-        erp_key TEXT,
-        sync_state INTEGER,
-        sync_msg TEXT,
-        error_code INTEGER,
-        created_at TEXT
-    )
-    ''')
-    conn.commit()
-    conn.close()
+    """Backwards-compatible alias for migrate()."""
+    return migrate()
+
+
+def _ensure_schema():
+    # cheap check on the hot path; DDL only runs the first time per process
+    if _migrated_path != DB_PATH:
+        migrate()
 
 
 def save_result(bill_key, erp_key, sync_state, sync_msg, error_code):
-    init_db()
+    _ensure_schema()
     conn = _get_conn()
     cur = conn.cursor()
     cur.execute('''
@@ -37,14 +228,399 @@ def save_result(bill_key, erp_key, sync_state, sync_msg, error_code):
     VALUES (?, ?, ?, ?, ?, ?)
     ''', (bill_key, erp_key, int(sync_state), sync_msg, int(error_code), datetime.utcnow().isoformat()))
     conn.commit()
-    conn.close()
 
 
-def list_results(limit=100):
-    init_db()
+def _result_rows(results, content_hashes=None):
+    now = datetime.utcnow().isoformat()
+    if content_hashes is None:
+        content_hashes = itertools.repeat(None)
+    return [(r.BillKey, r.ErpKey, int(r.SyncState), r.SyncMsg, int(r.ErrorCode), now,
+             int(getattr(r, 'BillType', 0)), h) for r, h in zip(results, content_hashes)]
+
+
+def _insert_rows(rows):
+    _ensure_schema()
     conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute('SELECT id, bill_key, erp_key, sync_state, sync_msg, error_code, created_at FROM sync_results ORDER BY id DESC LIMIT ?', (limit,))
-    rows = cur.fetchall()
-    conn.close()
+    with conn:
+        # OR IGNORE: a retried bill whose idempotency key is already stored adds no row
+        conn.executemany('''
+        INSERT OR IGNORE INTO sync_results
+            (bill_key, erp_key, sync_state, sync_msg, error_code, created_at, bill_type, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+
+def save_results(results, content_hashes=None):
+    """Persist many G_SyncBillInfoResponse messages in a single transaction.
+
+    `results` is any iterable of objects exposing BillKey/ErpKey/SyncState/SyncMsg/ErrorCode
+    (normally `G_SyncBillListInfoResponse.Data`). `content_hashes`, parallel to
+    `results`, sets the idempotency key of each row (None leaves it unset).
+    Returns the number of rows submitted.
+    """
+    rows = _result_rows(results, content_hashes)
+    if rows:
+        _insert_rows(rows)
+    return len(rows)
+
+
+def lookup_results(keys, sync_state):
+    """Stored results with state `sync_state` for idempotency keys.
+
+    `keys` are (bill_key, bill_type, content_hash) tuples; returns a dict mapping
+    each key found to (erp_key, sync_state, sync_msg, error_code).
+    """
+    found = {}
+    _ensure_schema()
+    conn = _get_conn()
+    # one unique-index seek per key; a row-value IN (VALUES ...) list is planned as a scan
+    sql = ('SELECT erp_key, sync_state, sync_msg, error_code FROM sync_results '
+           'WHERE bill_key = ? AND bill_type = ? AND content_hash = ? AND sync_state = ?')
+    for key in keys:
+        row = conn.execute(sql, (*key, int(sync_state))).fetchone()
+        if row is not None:
+            found[key] = row
+    return found
+
+
+class WriteBehindWriter:
+    """Bounded in-memory queue drained into sync_results by a dedicated writer thread.
+
+    Rows are batched until `batch_size` rows are pending or `flush_interval`
+    seconds have passed since the first one, then written in one transaction.
+    When the queue is full, submit() blocks for up to `put_timeout` seconds
+    (None blocks indefinitely) and counts the rows it could not enqueue as dropped.
+    """
+
+    def __init__(self, max_queue=10000, batch_size=500, flush_interval=0.2, put_timeout=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'flushed': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+        self._thread = threading.Thread(target=self._run, name='sync-store-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, results, content_hashes=None):
+        """Enqueue results for persistence; returns the number of rows accepted."""
+        rows = _result_rows(results, content_hashes)
+        accepted = 0
+        for row in rows:
+            try:
+                self._queue.put(row, timeout=self.put_timeout)
+            except queue.Full:
+                break
+            accepted += 1
+        self._count(submitted=accepted, dropped=len(rows) - accepted)
+        if accepted < len(rows):
+            logger.warning('write-behind queue full, dropped %d sync results', len(rows) - accepted)
+        return accepted
+
+    def flush(self, timeout=None):
+        """Block until every row enqueued so far has been written (or failed)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout=None):
+        """Flush pending rows and stop the writer thread."""
+        self.flush(timeout)
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._counters[key] += value
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                _insert_rows(batch)
+                self._count(flushed=len(batch), batches=1)
+            except Exception as e:
+                self._count(failed=len(batch))
+                logger.warning('write-behind failed to save %d sync results: %s', len(batch), e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        _release_conn()
+
+
+_STOP = object()
+_writer = None
+
+
+def enable_write_behind(**kwargs):
+    """Route submit_results() through a WriteBehindWriter (kwargs go to its constructor)."""
+    global _writer
+    if _writer is None:
+        _writer = WriteBehindWriter(**kwargs)
+    return _writer
+
+
+def disable_write_behind(timeout=None):
+    """Flush and stop the write-behind writer; returns its final stats (None if not enabled)."""
+    global _writer
+    writer, _writer = _writer, None
+    if writer is None:
+        return None
+    writer.stop(timeout)
+    return writer.stats()
+
+
+def write_behind_stats():
+    return _writer.stats() if _writer is not None else None
+
+
+def submit_results(results, content_hashes=None):
+    """Persist results, via the write-behind queue when enabled, else synchronously."""
+    writer = _writer
+    if writer is not None:
+        return writer.submit(results, content_hashes)
+    return save_results(results, content_hashes)
+
+
+RESULT_COLUMNS = ('id', 'bill_key', 'erp_key', 'sync_state', 'sync_msg', 'error_code', 'created_at')
+# upper bound callers such as the admin API should clamp page sizes to
+MAX_PAGE_SIZE = 1000
+
+
+def query_results(bill_key=None, erp_key=None, sync_state=None, error_code=None,
+                  since=None, until=None, before_id=None, limit=100):
+    """Filtered, newest-first page of sync results using keyset pagination.
+
+    `since`/`until` are ISO-8601 UTC strings compared against created_at
+    (inclusive/exclusive). Pass the returned cursor back as `before_id` to get
+    the next page; it is None once the last page has been returned.
+    Returns (rows, next_cursor) where rows are tuples in RESULT_COLUMNS order.
+    """
+    limit = max(1, int(limit))
+    where = []
+    params = []
+    for column, value in (('bill_key', bill_key), ('erp_key', erp_key),
+                          ('sync_state', sync_state), ('error_code', error_code)):
+        if value is not None:
+            where.append(f'{column} = ?')
+            params.append(value)
+    if since is not None:
+        where.append('created_at >= ?')
+        params.append(since)
+    if until is not None:
+        where.append('created_at < ?')
+        params.append(until)
+    if before_id is not None:
+        where.append('id < ?')
+        params.append(int(before_id))
+    sql = f'SELECT {", ".join(RESULT_COLUMNS)} FROM sync_results'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY id DESC LIMIT ?'
+    # one extra row tells whether another page follows
+    params.append(limit + 1)
+
+    _ensure_schema()
+    conn = _get_conn()
+    rows = conn.execute(sql, params).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1][0]
+
+
+def iter_results(sync_state=None, after_id=None, batch_size=500, columns=RESULT_COLUMNS):
+    """Oldest-first iterator over sync results with id > after_id, as tuples in `columns` order.
+
+    Rows are read in keyset batches of `batch_size` (columns[0] must be 'id'),
+    so memory stays bounded however many rows match; used by push sources.
+    """
+    if columns[0] != 'id':
+        raise ValueError("columns must start with 'id'")
+    where = ['id > ?']
+    base = []
+    if sync_state is not None:
+        where.append('sync_state = ?')
+        base.append(int(sync_state))
+    sql = f'SELECT {", ".join(columns)} FROM sync_results WHERE {" AND ".join(where)} ORDER BY id LIMIT ?'
+    last = int(after_id or 0)
+    _ensure_schema()
+    while True:
+        rows = _get_conn().execute(sql, [last, *base, batch_size]).fetchall()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][0]
+
+
+def list_results(limit=100):
+    rows, _ = query_results(limit=limit)
     return rows
+
+
+PUSH_CHECKPOINT_COLUMNS = ('synchro_id', 'rpc', 'page', 'cursor', 'rows', 'state', 'error', 'owner', 'updated_at')
+
+
+def _checkpoint_dict(row):
+    cp = dict(zip(PUSH_CHECKPOINT_COLUMNS, row))
+    cp['cursor'] = json.loads(cp['cursor']) if cp['cursor'] is not None else None
+    return cp
+
+
+def load_push_checkpoint(synchro_id):
+    """The checkpoint of push `synchro_id` as a dict (PUSH_CHECKPOINT_COLUMNS), or None."""
+    _ensure_schema()
+    row = _get_conn().execute(f'SELECT {", ".join(PUSH_CHECKPOINT_COLUMNS)} FROM push_checkpoints '
+                              'WHERE synchro_id = ?', (int(synchro_id),)).fetchone()
+    return _checkpoint_dict(row) if row else None
+
+
+def claim_push_checkpoint(synchro_id, rpc, owner, stale_after, owner_gone=None):
+    """Mark push `synchro_id` as running for `owner` and return (claimed, checkpoint).
+
+    Not claimed when another owner updated a running checkpoint less than
+    `stale_after` seconds ago (the push is alive in another process), unless
+    `owner_gone(owner)` says that process has exited; the checkpoint returned
+    is then theirs. Otherwise the returned checkpoint is
+    where to resume: the previous progress of an unfinished push of the same
+    rpc, or page 0 when there is none (or it finished, or was for another rpc).
+    """
+    _ensure_schema()
+    conn = _get_conn()
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(f'SELECT {", ".join(PUSH_CHECKPOINT_COLUMNS)} FROM push_checkpoints '
+                           'WHERE synchro_id = ?', (int(synchro_id),)).fetchone()
+        cp = _checkpoint_dict(row) if row else None
+        if (cp and cp['state'] == 'running' and cp['owner'] != owner and now - cp['updated_at'] < stale_after
+                and not (owner_gone and owner_gone(cp['owner']))):
+            conn.rollback()
+            return False, cp
+        if not cp or cp['rpc'] != rpc or cp['state'] == 'finished':
+            cp = dict(synchro_id=int(synchro_id), rpc=rpc, page=0, cursor=None, rows=0)
+        cp.update(state='running', error=None, owner=owner, updated_at=now)
+        conn.execute('INSERT OR REPLACE INTO push_checkpoints '
+                     '(synchro_id, rpc, page, cursor, rows, state, error, owner, updated_at) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                     (cp['synchro_id'], rpc, cp['page'], json.dumps(cp['cursor']), cp['rows'],
+                      'running', None, owner, now))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True, cp
+
+
+def save_push_checkpoint(synchro_id, owner, page, cursor, rows, state='running', error=None):
+    """Record progress of a push claimed by `owner`; returns False if it was reset or taken over."""
+    _ensure_schema()
+    conn = _get_conn()
+    with conn:
+        cur = conn.execute('UPDATE push_checkpoints SET page = ?, cursor = ?, rows = ?, state = ?, error = ?, '
+                           'updated_at = ? WHERE synchro_id = ? AND owner = ?',
+                           (page, json.dumps(cursor), rows, state, error, time.time(), int(synchro_id), owner))
+    return cur.rowcount == 1
+
+
+def clear_push_checkpoints(synchro_ids=None):
+    """Delete the checkpoints of `synchro_ids` (all when None); returns the number deleted."""
+    _ensure_schema()
+    conn = _get_conn()
+    with conn:
+        if synchro_ids is None:
+            return conn.execute('DELETE FROM push_checkpoints').rowcount
+        return conn.executemany('DELETE FROM push_checkpoints WHERE synchro_id = ?',
+                                [(int(i),) for i in synchro_ids]).rowcount
+
+
+def record_changes(entity, changes):
+    """Record changed keys of `entity` for incremental pushes; returns the number recorded.
+
+    `changes` is an iterable of (key, op, payload) with op 'upsert' or
+    'delete' and payload a JSON-able dict or None. Only the latest change of
+    a key is kept, at a new seq, so the log grows with distinct keys, not edits.
+    """
+    now = time.time()
+    rows = [(entity, str(key), op, None if payload is None else json.dumps(payload, ensure_ascii=False), now)
+            for key, op, payload in changes]
+    if not rows:
+        return 0
+    _ensure_schema()
+    conn = _get_conn()
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO change_log (entity, key, op, payload, changed_at) '
+                         'VALUES (?, ?, ?, ?, ?)', rows)
+    return len(rows)
+
+
+def iter_changes(entity, after_seq=0, batch_size=500):
+    """Changes of `entity` with seq > after_seq, oldest first, as (seq, key, op, payload) in keyset batches."""
+    sql = 'SELECT seq, key, op, payload FROM change_log WHERE entity = ? AND seq > ? ORDER BY seq LIMIT ?'
+    last = int(after_seq or 0)
+    _ensure_schema()
+    while True:
+        rows = _get_conn().execute(sql, (entity, last, batch_size)).fetchall()
+        for seq, key, op, payload in rows:
+            yield seq, key, op, json.loads(payload) if payload is not None else None
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][0]
+
+
+def get_push_mark(entity):
+    """High-water mark of `entity`: the last seq (or id) acknowledged by an incremental push, 0 if none."""
+    _ensure_schema()
+    row = _get_conn().execute('SELECT mark FROM push_marks WHERE entity = ?', (entity,)).fetchone()
+    return row[0] if row else 0
+
+
+def advance_push_mark(entity, mark):
+    """Move the high-water mark of `entity` forward to `mark` (never backwards)."""
+    _ensure_schema()
+    conn = _get_conn()
+    with conn:
+        conn.execute('INSERT INTO push_marks (entity, mark, updated_at) VALUES (?, ?, ?) '
+                     'ON CONFLICT (entity) DO UPDATE SET mark = MAX(mark, excluded.mark), updated_at = excluded.updated_at',
+                     (entity, int(mark), time.time()))
+
+
+def reset_push_marks(entities=None):
+    """Drop the high-water marks of `entities` (all when None) so the next push sends everything."""
+    _ensure_schema()
+    conn = _get_conn()
+    with conn:
+        if entities is None:
+            return conn.execute('DELETE FROM push_marks').rowcount
+        return conn.executemany('DELETE FROM push_marks WHERE entity = ?', [(e,) for e in entities]).rowcount
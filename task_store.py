@@ -0,0 +1,403 @@
+"""Durable background tasks for admin_server, stored in SQLite (file: tasks.db).
+
+Tasks are rows rather than entries in an in-memory dict, so they survive
+restarts, can be polled from any process and are evicted once finished for
+longer than TASK_TTL. A TaskWorker claims queued tasks and runs them with a
+per-action concurrency limit that holds across every worker process; it can
+run inside admin_server or on its own (`python admin_server.py --worker`) so
+long integration jobs never occupy Flask request threads.
+
+Lifecycle: queued -> running -> finished | error | cancelled. cancel() stops
+a queued task at once and asks a running one to stop (handlers poll
+TaskContext.cancelled()); retry() puts an error/cancelled task back in the
+queue under the same id. A running task whose worker stops heartbeating is
+requeued, or failed once it has used up MAX_ATTEMPTS.
+
+Settings (env):
+  ERP_TASK_DB           database file (default tasks.db next to this module)
+  ERP_TASK_TTL          seconds finished tasks are kept (default 86400)
+  ERP_TASK_CONCURRENCY  running tasks per action, default for actions not in ACTION_LIMITS (2)
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get('ERP_TASK_DB', os.path.join(os.path.dirname(__file__), 'tasks.db'))
+TASK_TTL = float(os.environ.get('ERP_TASK_TTL', '86400'))
+DEFAULT_CONCURRENCY = int(os.environ.get('ERP_TASK_CONCURRENCY', '2'))
+# per-action overrides of DEFAULT_CONCURRENCY
+ACTION_LIMITS = {'get-token': 1}
+MAX_ATTEMPTS = 3
+# a running task is considered orphaned after this long without a heartbeat
+STALE_AFTER = 60.0
+HEARTBEAT_INTERVAL = 10.0
+EVICT_INTERVAL = 300.0
+
+QUEUED, RUNNING, FINISHED, ERROR, CANCELLED = 'queued', 'running', 'finished', 'error', 'cancelled'
+DONE_STATES = (FINISHED, ERROR, CANCELLED)
+
+# same scheme as sync_store: step N brings the file to PRAGMA user_version N
+_MIGRATIONS = [
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY,
+            action TEXT NOT NULL,
+            params TEXT,
+            status TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            heartbeat_at REAL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_tasks_finished_at ON tasks (finished_at)',
+    ],
+    # 2: claim() reads the oldest queued tasks per action
+    [
+        'CREATE INDEX IF NOT EXISTS idx_tasks_action ON tasks (status, action, created_at)',
+    ],
+]
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+_migrate_lock = threading.Lock()
+_migrated_path = None
+
+
+def _connect():
+    # tasks are low-rate, so a connection per operation keeps this safe across threads and processes
+    conn = sqlite3.connect(DB_PATH, timeout=5, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def migrate():
+    global _migrated_path
+    with _migrate_lock:
+        if _migrated_path == DB_PATH:
+            return SCHEMA_VERSION
+        conn = _connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(f'{DB_PATH} has schema version {version}, newer than supported {SCHEMA_VERSION}')
+            for target, steps in enumerate(_MIGRATIONS[version:], start=version + 1):
+                for sql in steps:
+                    conn.execute(sql)
+                conn.execute(f'PRAGMA user_version={target}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        _migrated_path = DB_PATH
+        return SCHEMA_VERSION
+
+
+class _Tx:
+    """`with _Tx() as conn:` runs the block in one write transaction."""
+
+    def __enter__(self):
+        if _migrated_path != DB_PATH:
+            migrate()
+        self.conn = _connect()
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.conn.close()
+
+
+def _read(sql, args=()):
+    if _migrated_path != DB_PATH:
+        migrate()
+    conn = _connect()
+    try:
+        return conn.execute(sql, args).fetchall()
+    finally:
+        conn.close()
+
+
+def _to_dict(row):
+    task = dict(row)
+    for key in ('params', 'result'):
+        if task[key] is not None:
+            task[key] = json.loads(task[key])
+    task['cancel_requested'] = bool(task['cancel_requested'])
+    return task
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def limit_for(action):
+    return ACTION_LIMITS.get(action, DEFAULT_CONCURRENCY)
+
+
+def submit(action, params=None):
+    """Queue a task and return its id."""
+    task_id = str(uuid.uuid4())
+    with _Tx() as conn:
+        conn.execute('INSERT INTO tasks (id, action, params, status, created_at) VALUES (?, ?, ?, ?, ?)',
+                     (task_id, action, _dumps(params or {}), QUEUED, time.time()))
+    return task_id
+
+
+def get(task_id):
+    rows = _read('SELECT * FROM tasks WHERE id = ?', (task_id,))
+    return _to_dict(rows[0]) if rows else None
+
+
+def list_tasks(status=None, limit=50):
+    """Newest tasks first, optionally only those in `status`."""
+    sql, args = 'SELECT * FROM tasks', []
+    if status:
+        sql += ' WHERE status = ?'
+        args.append(status)
+    sql += ' ORDER BY created_at DESC LIMIT ?'
+    args.append(int(limit))
+    return [_to_dict(r) for r in _read(sql, args)]
+
+
+def count_by_status():
+    return {r[0]: r[1] for r in _read('SELECT status, COUNT(*) FROM tasks GROUP BY status')}
+
+
+def cancel(task_id):
+    """Cancel a queued task, or flag a running one; returns the resulting status (None if unknown)."""
+    with _Tx() as conn:
+        row = conn.execute('SELECT status FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        if row is None:
+            return None
+        if row['status'] == QUEUED:
+            conn.execute('UPDATE tasks SET status = ?, finished_at = ? WHERE id = ?', (CANCELLED, time.time(), task_id))
+            return CANCELLED
+        if row['status'] == RUNNING:
+            conn.execute('UPDATE tasks SET cancel_requested = 1 WHERE id = ?', (task_id,))
+        return row['status']
+
+
+def retry(task_id):
+    """Requeue an error/cancelled task under the same id; returns the resulting status (None if unknown)."""
+    with _Tx() as conn:
+        row = conn.execute('SELECT status FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        if row is None:
+            return None
+        if row['status'] not in (ERROR, CANCELLED):
+            return row['status']
+        conn.execute('UPDATE tasks SET status = ?, result = NULL, error = NULL, cancel_requested = 0, attempts = 0, '
+                     'worker = NULL, started_at = NULL, finished_at = NULL, heartbeat_at = NULL WHERE id = ?', (QUEUED, task_id))
+        return QUEUED
+
+
+def claim(worker, actions, max_tasks):
+    """Move up to `max_tasks` queued tasks of `actions` to running for `worker`, oldest first.
+
+    Tasks already running anywhere count against each action's limit_for().
+    """
+    if max_tasks <= 0 or not actions:
+        return []
+    now = time.time()
+    claimed = []
+    with _Tx() as conn:
+        running = dict(conn.execute('SELECT action, COUNT(*) FROM tasks WHERE status = ? GROUP BY action',
+                                    (RUNNING,)).fetchall())
+        # the oldest queued tasks of each action, as many as its free slots, so
+        # a backlog of a saturated action cannot hide the tasks of other actions
+        candidates = []
+        for action in set(actions):
+            free = min(limit_for(action) - running.get(action, 0), max_tasks)
+            if free > 0:
+                candidates += conn.execute('SELECT id, created_at FROM tasks WHERE status = ? AND action = ? '
+                                           'ORDER BY created_at LIMIT ?', (QUEUED, action, free)).fetchall()
+        candidates.sort(key=lambda row: row['created_at'])
+        for row in candidates[:max_tasks]:
+            conn.execute('UPDATE tasks SET status = ?, worker = ?, attempts = attempts + 1, started_at = ?, '
+                         'heartbeat_at = ? WHERE id = ?', (RUNNING, worker, now, now, row['id']))
+            claimed.append(row['id'])
+        if not claimed:
+            return []
+        marks = ','.join('?' * len(claimed))
+        return [_to_dict(r) for r in conn.execute(f'SELECT * FROM tasks WHERE id IN ({marks}) ORDER BY created_at',
+                                                  claimed).fetchall()]
+
+
+def _finish(task_id, worker, status, result=None, error=None):
+    with _Tx() as conn:
+        # a task requeued as stale may already belong to another worker; don't overwrite it
+        conn.execute('UPDATE tasks SET status = ?, result = ?, error = ?, finished_at = ? '
+                     'WHERE id = ? AND worker = ? AND status = ?',
+                     (status, None if result is None else _dumps(result), error, time.time(), task_id, worker, RUNNING))
+
+
+def heartbeat(worker):
+    """Mark `worker`'s running tasks alive; returns ids of those with a pending cancel request."""
+    with _Tx() as conn:
+        conn.execute('UPDATE tasks SET heartbeat_at = ? WHERE worker = ? AND status = ?', (time.time(), worker, RUNNING))
+        return {r['id'] for r in conn.execute('SELECT id FROM tasks WHERE worker = ? AND status = ? AND cancel_requested = 1',
+                                             (worker, RUNNING)).fetchall()}
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """Requeue running tasks whose worker stopped heartbeating (or fail those out of attempts)."""
+    cutoff = time.time() - stale_after
+    with _Tx() as conn:
+        failed = conn.execute('UPDATE tasks SET status = ?, error = ?, finished_at = ? '
+                              'WHERE status = ? AND heartbeat_at < ? AND attempts >= ?',
+                              (ERROR, 'worker lost', time.time(), RUNNING, cutoff, MAX_ATTEMPTS)).rowcount
+        requeued = conn.execute('UPDATE tasks SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ?',
+                                (QUEUED, RUNNING, cutoff)).rowcount
+    if failed or requeued:
+        logger.warning('Stale tasks: %d requeued, %d failed', requeued, failed)
+    return requeued
+
+
+def evict(ttl=None):
+    """Delete tasks finished more than `ttl` seconds ago (default TASK_TTL); returns the count."""
+    cutoff = time.time() - (TASK_TTL if ttl is None else ttl)
+    marks = ','.join('?' * len(DONE_STATES))
+    with _Tx() as conn:
+        return conn.execute(f'DELETE FROM tasks WHERE status IN ({marks}) AND finished_at < ?',
+                            (*DONE_STATES, cutoff)).rowcount
+
+
+class TaskCancelled(Exception):
+    """Raised by TaskContext.check() once the task has been cancelled."""
+
+
+class TaskContext:
+    """Passed to handlers: the task row plus a cancellation check."""
+
+    def __init__(self, task, cancelled):
+        self.task = task
+        self.id = task['id']
+        self.params = task['params'] or {}
+        self._cancelled = cancelled
+
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise TaskCancelled()
+
+
+class TaskWorker:
+    """Runs queued tasks with `handlers[action](ctx) -> result` on a thread pool.
+
+    Concurrency per action is bounded by limit_for() across all workers; the
+    pool size bounds this worker's total.
+    """
+
+    def __init__(self, handlers, threads=4, poll_interval=1.0, name=None):
+        self.handlers = dict(handlers)
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running = {}  # task id -> cancel Event
+        self._pool = None
+        self._thread = None
+
+    def start(self):
+        migrate()
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='task')
+        self._thread = threading.Thread(target=self.run, name='task-dispatch', daemon=True)
+        self._thread.start()
+        return self
+
+    def wake(self):
+        """Check the queue now instead of at the next poll (call after submit())."""
+        self._wake.set()
+
+    def cancel(self, task_id):
+        """Signal a task running on this worker now rather than at the next heartbeat."""
+        with self._lock:
+            event = self._running.get(task_id)
+        if event is not None:
+            event.set()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+
+    def run(self):
+        """Dispatch loop; start() runs it on a daemon thread, the --worker mode in the foreground."""
+        if self._pool is None:
+            migrate()
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='task')
+        next_beat = next_evict = 0.0
+        while not self._stop.is_set():
+            try:
+                now = time.time()
+                if now >= next_beat:
+                    self._heartbeat()
+                    requeue_stale()
+                    next_beat = now + HEARTBEAT_INTERVAL
+                if now >= next_evict:
+                    removed = evict()
+                    if removed:
+                        logger.info('Evicted %d finished tasks', removed)
+                    next_evict = now + EVICT_INTERVAL
+                with self._lock:
+                    free = self.threads - len(self._running)
+                for task in claim(self.name, list(self.handlers), free):
+                    cancelled = threading.Event()
+                    with self._lock:
+                        self._running[task['id']] = cancelled
+                    self._pool.submit(self._execute, task, cancelled)
+            except Exception:
+                logger.exception('Task dispatch failed')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _heartbeat(self):
+        for task_id in heartbeat(self.name):
+            with self._lock:
+                event = self._running.get(task_id)
+            if event is not None:
+                event.set()
+
+    def _execute(self, task, cancelled):
+        ctx = TaskContext(task, cancelled)
+        try:
+            result = self.handlers[task['action']](ctx)
+            _finish(task['id'], self.name, CANCELLED if cancelled.is_set() else FINISHED, result=result)
+        except TaskCancelled:
+            _finish(task['id'], self.name, CANCELLED)
+        except Exception as e:
+            logger.warning('Task %s (%s) failed: %s', task['id'], task['action'], e)
+            _finish(task['id'], self.name, ERROR, error=str(e))
+        finally:
+            with self._lock:
+                self._running.pop(task['id'], None)
+            # a slot freed up; look for more work right away
+            self._wake.set()
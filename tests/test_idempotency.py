@@ -0,0 +1,92 @@
+import sqlite3
+
+import bill_pipeline
+import common_pb2
+import order_pb2
+
+SUCCESS = common_pb2.G_SyncStateType.SyncSuccess  # type: ignore[attr-defined]
+FAIL = common_pb2.G_SyncStateType.SyncFail  # type: ignore[attr-defined]
+
+
+def _bill(key, qty=2, bill_type='SalesOrder'):
+    bill = order_pb2.G_SyncBillRequest()  # type: ignore[attr-defined]
+    bill.BillKey = key
+    bill.BillType = common_pb2.G_BillType.Value(bill_type)  # type: ignore[attr-defined]
+    d = bill.Details.add()
+    d.ProductKey = 'P1'
+    d.Qty = qty
+    d.Price = 3.5
+    d.Total = qty * 3.5
+    return bill
+
+
+def _sync(pipeline, *bills):
+    request = order_pb2.G_SyncBillListRequest()  # type: ignore[attr-defined]
+    request.Data.extend(bills)
+    batch = pipeline.prepare(request)
+    pipeline.persist(batch)
+    return batch
+
+
+def _rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT bill_key, sync_state FROM sync_results ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def test_retried_bill_replays_stored_result(sync_db):
+    pipeline = bill_pipeline.BillSyncPipeline('test', idempotency=bill_pipeline.IdempotencyIndex())
+    first = _sync(pipeline, _bill('B1'))
+    assert first.results[0].SyncState == SUCCESS
+    assert first.replayed == 0
+
+    again = _sync(pipeline, _bill('B1'))
+    assert again.replayed == 1
+    assert again.results[0] == first.results[0]
+    assert again.to_persist == []
+    assert _rows(sync_db) == [('B1', SUCCESS)]
+
+
+def test_replay_survives_a_cold_cache(sync_db):
+    _sync(bill_pipeline.BillSyncPipeline('test', idempotency=bill_pipeline.IdempotencyIndex()), _bill('B1'))
+
+    # a new process: nothing in memory, the unique index answers
+    index = bill_pipeline.IdempotencyIndex()
+    again = _sync(bill_pipeline.BillSyncPipeline('test', idempotency=index), _bill('B1'))
+    assert again.replayed == 1
+    assert index.stats()['store_hits'] == 1
+
+
+def test_key_includes_bill_type_and_content(sync_db):
+    pipeline = bill_pipeline.BillSyncPipeline('test', idempotency=bill_pipeline.IdempotencyIndex())
+    _sync(pipeline, _bill('B1'))
+
+    changed = _sync(pipeline, _bill('B1', qty=5))
+    other_type = _sync(pipeline, _bill('B1', bill_type='SalesReturn'))
+    assert changed.replayed == 0
+    assert other_type.replayed == 0
+    assert len(_rows(sync_db)) == 3
+
+
+def test_failed_bill_is_revalidated_not_replayed(sync_db):
+    index = bill_pipeline.IdempotencyIndex()
+    pipeline = bill_pipeline.BillSyncPipeline('test', idempotency=index)
+    first = _sync(pipeline, _bill('B1', qty=0))
+    assert first.results[0].SyncState == FAIL
+
+    again = _sync(pipeline, _bill('B1', qty=0))
+    assert again.replayed == 0
+    assert again.results[0].SyncState == FAIL
+    assert index.stats()['size'] == 0
+    # the identical failure is stored once
+    assert _rows(sync_db) == [('B1', FAIL)]
+
+
+def test_duplicates_in_one_request_share_a_result(sync_db):
+    pipeline = bill_pipeline.BillSyncPipeline('test', idempotency=bill_pipeline.IdempotencyIndex())
+    batch = _sync(pipeline, _bill('B1'), _bill('B1'))
+    assert batch.duplicates == 1
+    assert batch.results[0] == batch.results[1]
+    assert _rows(sync_db) == [('B1', SUCCESS)]
@@ -0,0 +1,47 @@
+import io
+import logging
+import queue
+
+import log_setup
+
+
+def _handler(size=1):
+    out = io.StringIO()
+    fallback = logging.StreamHandler(out)
+    fallback.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    handler = log_setup.NonBlockingQueueHandler(queue.Queue(maxsize=size), fallback=fallback)
+    return handler, out
+
+
+def _emit(handler, level, msg):
+    handler.handle(logging.makeLogRecord({'levelno': level, 'levelname': logging.getLevelName(level), 'msg': msg}))
+
+
+def test_full_queue_drops_and_counts_only_low_severity(monkeypatch):
+    monkeypatch.setattr(log_setup, 'FULL_QUEUE_WAIT', 0.01)
+    handler, out = _handler()
+    _emit(handler, logging.INFO, 'fills the queue')
+
+    _emit(handler, logging.DEBUG, 'debug')
+    _emit(handler, logging.INFO, 'info')
+    _emit(handler, logging.WARNING, 'warning')
+    _emit(handler, logging.ERROR, 'error')
+
+    assert handler.dropped == 2
+    assert out.getvalue().splitlines() == ['WARNING warning', 'ERROR error']
+    assert handler.queue.get_nowait().msg == 'fills the queue'
+
+
+def test_records_are_queued_while_there_is_room():
+    handler, out = _handler(size=10)
+    _emit(handler, logging.INFO, 'a')
+    _emit(handler, logging.ERROR, 'b')
+    assert [handler.queue.get_nowait().msg for _ in range(2)] == ['a', 'b']
+    assert handler.dropped == 0 and out.getvalue() == ''
+
+
+def test_sampling_never_drops_warnings():
+    sampler = log_setup.SamplingFilter({'bills': 10})
+    kept = [sampler.filter(logging.makeLogRecord({'name': 'bills.x', 'levelno': logging.INFO})) for _ in range(20)]
+    assert sum(kept) == 2
+    assert all(sampler.filter(logging.makeLogRecord({'name': 'bills', 'levelno': logging.ERROR})) for _ in range(5))
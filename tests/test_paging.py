@@ -0,0 +1,129 @@
+import pytest
+
+import basicInfo_pb2
+import common_pb2
+import paging
+
+BRANCHES = basicInfo_pb2.G_PageBranchInfoResponse  # type: ignore[attr-defined]
+# a page type without TotalCount
+STORES = basicInfo_pb2.G_PageMenInfoResponse  # type: ignore[attr-defined]
+
+
+class _Source:
+    """In-memory keyset source over branches B000..B(n-1), sorted by key; logs every fetch."""
+
+    def __init__(self, n, with_count=True):
+        self.rows = [f'B{i:03d}' for i in range(n)]
+        self.fetches = []
+        self.counts = 0
+        self.stamp = 1
+        self.with_count = with_count
+
+    def fetch(self, flt, after, limit):
+        self.fetches.append((after, limit))
+        keys = [k for k in self.rows if flt.keyword in k and (after is None or k > after)]
+        return [(k, self.row(k)) for k in keys[:limit]]
+
+    def row(self, key):
+        return basicInfo_pb2.G_BranchInfoResponse(BranchKey=key)  # type: ignore[attr-defined]
+
+    def count(self, flt):
+        self.counts += 1
+        return sum(1 for k in self.rows if flt.keyword in k)
+
+    def source(self):
+        return paging.PageSource(self.fetch, self.count if self.with_count else None, lambda: self.stamp)
+
+
+def _pager(src, rpc='PageBranchDataList', **kwargs):
+    return paging.Pager({rpc: src.source()}, **kwargs)
+
+
+def _request(index, size=10, keyword=''):
+    return common_pb2.G_BaseInfoRequest(PageIndex=index, PageSize=size, Data=keyword)  # type: ignore[attr-defined]
+
+
+def _keys(page):
+    return [row.BranchKey for row in page.Data]
+
+
+def test_sequential_pages_are_one_keyset_query_each():
+    src = _Source(25)
+    pager = _pager(src)
+
+    pages = [pager.page('PageBranchDataList', _request(i), BRANCHES) for i in (1, 2, 3)]
+    assert [_keys(p)[0] for p in pages] == ['B000', 'B010', 'B020']
+    assert len(pages[2].Data) == 5
+    assert {p.TotalCount for p in pages} == {25}
+    assert src.fetches == [(None, 10), ('B009', 10), ('B019', 10)]
+    assert src.counts == 1
+
+
+def test_jump_walks_from_nearest_cursor_in_bounded_queries():
+    src = _Source(100)
+    pager = _pager(src, max_walk_pages=3)
+
+    assert _keys(pager.page('PageBranchDataList', _request(8), BRANCHES))[0] == 'B070'
+    # pages 1-3, 4-6, then 7 plus the page itself
+    assert src.fetches == [(None, 30), ('B029', 30), ('B059', 20)]
+
+    src.fetches.clear()
+    # every cursor on the way was remembered
+    assert _keys(pager.page('PageBranchDataList', _request(5), BRANCHES))[0] == 'B040'
+    assert src.fetches == [('B039', 10)]
+
+
+def test_jump_without_count_counts_by_walking_once():
+    src = _Source(45, with_count=False)
+    pager = _pager(src)
+
+    page = pager.page('PageBranchDataList', _request(5), BRANCHES)
+    assert _keys(page) == ['B040', 'B041', 'B042', 'B043', 'B044']
+    assert page.TotalCount == 45
+    assert src.fetches[0] == (None, paging.COUNT_BATCH)
+
+
+@pytest.mark.parametrize('page_type', [BRANCHES, STORES])
+def test_index_past_last_page_is_rejected_without_walking(page_type):
+    src = _Source(25)
+    pager = _pager(src)
+
+    with pytest.raises(paging.PageOutOfRange):
+        pager.page('PageBranchDataList', _request(4), page_type)
+    with pytest.raises(paging.PageOutOfRange):
+        pager.page('PageBranchDataList', _request(2 ** 31 - 1), page_type)
+    assert src.fetches == []
+
+
+def test_first_page_of_empty_result_is_valid():
+    src = _Source(25)
+    page = _pager(src).page('PageBranchDataList', _request(1, keyword='nothing'), BRANCHES)
+    assert page.TotalCount == 0 and _keys(page) == []
+
+
+def test_filters_and_page_sizes_are_cached_apart():
+    src = _Source(30)
+    pager = _pager(src)
+
+    assert pager.page('PageBranchDataList', _request(1, keyword='B01'), BRANCHES).TotalCount == 10
+    assert pager.page('PageBranchDataList', _request(1), BRANCHES).TotalCount == 30
+    assert _keys(pager.page('PageBranchDataList', _request(2, size=7), BRANCHES))[0] == 'B007'
+    assert src.counts == 3
+
+
+def test_version_change_drops_cached_cursors_and_count():
+    src = _Source(30)
+    pager = _pager(src)
+    pager.page('PageBranchDataList', _request(3), BRANCHES)
+
+    src.rows = src.rows[:15]
+    src.stamp = 2
+    with pytest.raises(paging.PageOutOfRange):
+        pager.page('PageBranchDataList', _request(3), BRANCHES)
+    assert pager.page('PageBranchDataList', _request(2), BRANCHES).TotalCount == 15
+
+
+def test_page_size_is_capped():
+    src = _Source(30)
+    page = _pager(src, max_page_size=8).page('PageBranchDataList', _request(1, size=500), BRANCHES)
+    assert len(page.Data) == 8
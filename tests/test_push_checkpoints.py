@@ -0,0 +1,168 @@
+import json
+import socket
+import threading
+import time
+
+import common_pb2
+import order_pb2
+import push_engine
+import sync_store
+
+ROWS = 10
+
+
+class _Callback:
+    """Stands in for the Handday PushAddress: records the BillKeys of each page."""
+
+    def __init__(self, fail_page=None):
+        self.fail_page = fail_page
+        self.pages = []
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, headers=None):
+        with self._lock:
+            index = len(self.pages)
+            self.pages.append([row['BillKey'] for row in json.loads(data)['Data']])
+        status = 500 if index == self.fail_page else 200
+        return type('Response', (), {'status_code': status, 'text': 'callback error'})()
+
+
+def _source(acknowledged=None):
+    def rows(after):
+        for i in range(ROWS):
+            if after is None or i > after:
+                yield i, order_pb2.G_PushBillResponse(BillKey=f'B{i}')  # type: ignore[attr-defined]
+    return push_engine.PushSource(order_pb2.G_PagePushBillResponse, rows, acknowledged)  # type: ignore[attr-defined]
+
+
+def _request(synchro_id=7, count=2):
+    return common_pb2.G_PushRequest(SynchroId=synchro_id, Count=count,  # type: ignore[attr-defined]
+                                    PushAddress='http://callback.test/push')
+
+
+def _push(callback, source=None, synchro_id=7):
+    """Run one PushPostBill push to completion on a fresh engine (i.e. a fresh process)."""
+    engine = push_engine.PushEngine(client=callback, workers=1, window=1,
+                                    sources={'PushPostBill': source or _source()})
+    try:
+        response = engine.start('PushPostBill', _request(synchro_id))
+        deadline = time.time() + 10
+        while engine.status(synchro_id)['state'] == 'running':
+            assert time.time() < deadline, 'push did not finish'
+            time.sleep(0.01)
+        return response, engine.status(synchro_id)
+    finally:
+        engine.shutdown(wait=True)
+
+
+def test_claim_is_exclusive_until_stale(sync_db):
+    claimed, cp = sync_store.claim_push_checkpoint(7, 'PushPostBill', 'a', stale_after=60)
+    assert claimed and cp['page'] == 0 and cp['cursor'] is None
+    assert sync_store.save_push_checkpoint(7, 'a', 2, 3, 4)
+
+    claimed, cp = sync_store.claim_push_checkpoint(7, 'PushPostBill', 'b', stale_after=60)
+    assert not claimed and cp['owner'] == 'a'
+    # b cannot write a's checkpoint
+    assert not sync_store.save_push_checkpoint(7, 'b', 5, 9, 10)
+
+    claimed, cp = sync_store.claim_push_checkpoint(7, 'PushPostBill', 'b', stale_after=0)
+    assert claimed and (cp['page'], cp['cursor'], cp['rows']) == (2, 3, 4)
+    # a was taken over and stops at its next save
+    assert not sync_store.save_push_checkpoint(7, 'a', 3, 5, 6)
+
+
+def test_claim_starts_over_after_finish_or_for_another_rpc(sync_db):
+    sync_store.claim_push_checkpoint(7, 'PushPostBill', 'a', stale_after=60)
+    sync_store.save_push_checkpoint(7, 'a', 5, 9, 10, state='finished')
+    assert sync_store.claim_push_checkpoint(7, 'PushPostBill', 'a', 60)[1]['page'] == 0
+
+    sync_store.save_push_checkpoint(7, 'a', 2, 3, 4, state='failed')
+    assert sync_store.claim_push_checkpoint(7, 'PushDeliveryBill', 'a', 60)[1]['page'] == 0
+
+
+def test_failed_push_resumes_after_last_acknowledged_page(sync_db):
+    failing = _Callback(fail_page=2)
+    _, status = _push(failing)
+    assert status['state'] == 'failed'
+    cp = sync_store.load_push_checkpoint(7)
+    assert (cp['page'], cp['cursor'], cp['rows'], cp['state']) == (2, 3, 4, 'failed')
+
+    callback = _Callback()
+    response, status = _push(callback)
+    assert response.Msg == 'push 7 resumed at page 2'
+    assert status['state'] == 'finished' and status['rows_acked'] == ROWS
+    assert callback.pages == [['B4', 'B5'], ['B6', 'B7'], ['B8', 'B9']]
+
+
+def test_push_of_a_crashed_process_is_taken_over(sync_db):
+    # a worker that died mid-push: its checkpoint still says running, and is fresh
+    dead = f'{socket.gethostname()}:999999999'
+    sync_store.claim_push_checkpoint(7, 'PushPostBill', dead, stale_after=60)
+    sync_store.save_push_checkpoint(7, dead, 3, 5, 6)
+
+    callback = _Callback()
+    response, status = _push(callback)
+    assert response.Msg == 'push 7 resumed at page 3'
+    assert callback.pages == [['B6', 'B7'], ['B8', 'B9']]
+    assert sync_store.load_push_checkpoint(7)['state'] == 'finished'
+
+
+def test_push_of_a_live_process_is_not_duplicated(sync_db):
+    sync_store.claim_push_checkpoint(7, 'PushPostBill', 'otherhost:1', stale_after=60)
+
+    engine = push_engine.PushEngine(client=_Callback(), sources={'PushPostBill': _source()})
+    try:
+        response = engine.start('PushPostBill', _request())
+    finally:
+        engine.shutdown()
+    assert response.Msg == 'push 7 already running in otherhost:1'
+
+
+def test_unsaved_progress_is_not_acknowledged(sync_db, monkeypatch):
+    acknowledged = []
+
+    def broken(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(sync_store, 'save_push_checkpoint', broken)
+    callback = _Callback()
+    _, status = _push(callback, _source(acknowledged.append))
+    assert status['state'] == 'failed'
+    assert status['error'] == 'saving checkpoint failed: disk full'
+    assert acknowledged == []
+    assert len(callback.pages) == 1
+
+
+def _finished(engine, synchro_id=7, timeout=5):
+    deadline = time.time() + timeout
+    while engine.status(synchro_id)['state'] == 'running':
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_shutdown_with_pages_queued_ends_the_push(sync_db):
+    release = threading.Event()
+
+    class _Slow(_Callback):
+        def post(self, url, data=None, headers=None):
+            release.wait(5)
+            return super().post(url, data, headers)
+
+    engine = push_engine.PushEngine(client=_Slow(), workers=1, window=4, sources={'PushPostBill': _source()})
+    engine.start('PushPostBill', _request())
+    time.sleep(0.1)
+    # one page is being sent, the others wait in the pool and are cancelled
+    engine.shutdown(wait=False)
+    release.set()
+    assert _finished(engine)
+    assert 'cancelled by shutdown' in engine.status(7)['error']
+
+
+def test_push_started_after_shutdown_fails_instead_of_hanging(sync_db):
+    engine = push_engine.PushEngine(client=_Callback(), sources={'PushPostBill': _source()})
+    engine.shutdown()
+    engine.start('PushPostBill', _request())
+    assert _finished(engine)
+    assert engine.status(7)['state'] == 'failed'
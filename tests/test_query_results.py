@@ -0,0 +1,38 @@
+import common_pb2
+import order_pb2
+import sync_store
+
+
+def _store(n):
+    results = []
+    for i in range(n):
+        info = order_pb2.G_SyncBillInfoResponse(BillKey=f'B{i}', ErpKey=f'B{i}')  # type: ignore[attr-defined]
+        info.SyncState = common_pb2.G_SyncStateType.SyncSuccess  # type: ignore[attr-defined]
+        results.append(info)
+    sync_store.save_results(results)
+
+
+def _walk(limit, **filters):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = sync_store.query_results(before_id=cursor, limit=limit, **filters)
+        pages.append([row[1] for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_exactly_full_last_page_has_no_cursor(sync_db):
+    _store(6)
+    assert _walk(3) == [['B5', 'B4', 'B3'], ['B2', 'B1', 'B0']]
+
+
+def test_partial_last_page_and_single_page(sync_db):
+    _store(5)
+    assert _walk(3) == [['B4', 'B3', 'B2'], ['B1', 'B0']]
+    assert _walk(10) == [['B4', 'B3', 'B2', 'B1', 'B0']]
+
+
+def test_filters_apply_to_every_page(sync_db):
+    _store(6)
+    assert _walk(1, bill_key='B2') == [['B2']]
+    assert sync_store.query_results(bill_key='missing') == ([], None)
@@ -0,0 +1,43 @@
+import grpc
+
+import rpc_metrics
+
+
+class _Details:
+    def __init__(self, method):
+        self.method = method
+
+
+def test_method_labels_are_resolved_once_per_method(monkeypatch):
+    built = []
+
+    class _Counting(rpc_metrics._Rpc):
+        def __init__(self, full_method):
+            built.append(full_method)
+            super().__init__(full_method)
+
+    monkeypatch.setattr(rpc_metrics, '_Rpc', _Counting)
+    rpc_metrics._rpc.cache_clear()
+    handler = grpc.unary_unary_rpc_method_handler(lambda request, context: request)
+    interceptor = rpc_metrics.MetricsInterceptor()
+    try:
+        for _ in range(3):
+            interceptor.intercept_service(lambda details: handler, _Details('/Test/Echo'))
+        interceptor.intercept_service(lambda details: handler, _Details('/Test/Other'))
+    finally:
+        rpc_metrics._rpc.cache_clear()
+    assert built == ['/Test/Echo', '/Test/Other']
+
+
+def test_wrapped_handler_records_the_call():
+    handler = grpc.unary_unary_rpc_method_handler(lambda request, context: request * 2)
+    wrapped = rpc_metrics.MetricsInterceptor().intercept_service(lambda details: handler, _Details('/Test/Double'))
+
+    class _Context:
+        def code(self):
+            return None
+
+    handled = rpc_metrics.RPC_HANDLED.labels('Test', 'Double', 'OK')
+    before = handled.value
+    assert wrapped.unary_unary(21, _Context()) == 42
+    assert handled.value == before + 1
@@ -0,0 +1,47 @@
+import multiprocessing
+import os
+import signal
+import sys
+
+import pytest
+
+import erp_service
+
+
+class _Process:
+    """Worker stand-in; the first start() delivers SIGTERM to the supervisor, as if sent during startup."""
+    started = []
+
+    def __init__(self, target=None, args=(), name=None):
+        self.name = name
+        self.pid = 0
+        self.exitcode = 0
+
+    def start(self):
+        _Process.started.append(self.name)
+        if len(_Process.started) == 1:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def is_alive(self):
+        return False
+
+    def join(self, timeout=None):
+        pass
+
+
+class _Context:
+    Process = _Process
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='multi-process mode is Linux only')
+def test_signal_during_startup_stops_cleanly(sync_db, monkeypatch):
+    _Process.started = []
+    monkeypatch.setattr(multiprocessing, 'get_context', lambda method: _Context())
+    previous = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+    try:
+        erp_service.serve_multiprocess(4, stop_grace=0)
+    finally:
+        signal.signal(signal.SIGTERM, previous[0])
+        signal.signal(signal.SIGINT, previous[1])
+    # no further workers are started once stopping
+    assert _Process.started == ['erp-worker-0']
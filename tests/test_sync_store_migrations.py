@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+import sync_store
+
+
+def _v0_database(path):
+    # sync_results.db as created before schema versioning: one table, user_version 0
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE sync_results (id INTEGER PRIMARY KEY AUTOINCREMENT, bill_key TEXT, erp_key TEXT, '
+                 'sync_state INTEGER, sync_msg TEXT, error_code INTEGER, created_at TEXT)')
+    conn.execute("INSERT INTO sync_results (bill_key, erp_key, sync_state, sync_msg, error_code, created_at) "
+                 "VALUES ('OLD-1', 'OLD-1', 1, 'ok', 0, '2024-01-01T00:00:00')")
+    conn.commit()
+    conn.close()
+
+
+def _schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+        columns = [r[1] for r in conn.execute('PRAGMA table_info(sync_results)')]
+        rows = conn.execute('SELECT bill_key, bill_type, content_hash FROM sync_results').fetchall()
+    finally:
+        conn.close()
+    return version, names, columns, rows
+
+
+def test_v0_database_migrates_to_current(sync_db):
+    _v0_database(sync_db)
+
+    assert sync_store.migrate() == sync_store.SCHEMA_VERSION == 5
+    version, names, columns, rows = _schema(sync_db)
+    assert version == 5
+    assert {'bill_type', 'content_hash'} <= set(columns)
+    assert {'idx_sync_results_bill_key', 'idx_sync_results_idempotency', 'push_checkpoints',
+            'change_log', 'push_marks'} <= names
+    # existing rows are kept, with no idempotency key
+    assert rows == [('OLD-1', None, None)]
+
+
+def test_migrated_database_is_usable(sync_db):
+    _v0_database(sync_db)
+    sync_store.migrate()
+
+    sync_store.record_changes('product_stock', [('SKU-1', 'upsert', {'Qty': 3})])
+    assert [c[1] for c in sync_store.iter_changes('product_stock')] == ['SKU-1']
+    assert sync_store.claim_push_checkpoint(1, 'PushPostBill', 'me', 60)[0]
+
+
+def test_migrate_runs_once_per_path(sync_db, monkeypatch):
+    sync_store.migrate()
+    # a second call does not touch the database
+    monkeypatch.setattr(sync_store, '_get_conn', lambda: pytest.fail('migrate() reopened the database'))
+    assert sync_store.migrate() == sync_store.SCHEMA_VERSION
+
+
+def test_newer_schema_is_refused(sync_db):
+    conn = sqlite3.connect(sync_db)
+    conn.execute(f'PRAGMA user_version={sync_store.SCHEMA_VERSION + 1}')
+    conn.close()
+
+    with pytest.raises(RuntimeError, match='newer than supported'):
+        sync_store.migrate()
@@ -0,0 +1,139 @@
+import time
+
+import task_store
+
+
+def _status(task_id):
+    return task_store.get(task_id)['status']
+
+
+def test_claim_respects_per_action_limits(task_db):
+    tokens = [task_store.submit('get-token') for _ in range(3)]
+    syncs = [task_store.submit('sync') for _ in range(4)]
+
+    claimed = task_store.claim('w1', ['get-token', 'sync'], max_tasks=10)
+    # get-token runs one at a time, anything else DEFAULT_CONCURRENCY at a time
+    assert [t['id'] for t in claimed] == [tokens[0]] + syncs[:task_store.DEFAULT_CONCURRENCY]
+    assert all(t['status'] == task_store.RUNNING and t['attempts'] == 1 for t in claimed)
+
+    # the limits hold across workers, counting what is running anywhere
+    assert task_store.claim('w2', ['get-token', 'sync'], max_tasks=10) == []
+
+
+def test_claim_takes_oldest_first_up_to_max_tasks(task_db):
+    ids = [task_store.submit('sync') for _ in range(3)]
+    assert [t['id'] for t in task_store.claim('w1', ['sync'], max_tasks=1)] == ids[:1]
+    assert task_store.claim('w1', ['other'], max_tasks=5) == []
+    assert task_store.claim('w1', ['sync'], max_tasks=0) == []
+
+
+def test_backlog_of_a_saturated_action_does_not_starve_others(task_db):
+    tokens = [task_store.submit('get-token') for _ in range(100)]
+    sync = task_store.submit('sync')
+
+    assert [t['id'] for t in task_store.claim('w1', ['get-token', 'sync'], max_tasks=1)] == [tokens[0]]
+    # get-token is at its limit; the sync task behind 99 queued ones is still found
+    assert [t['id'] for t in task_store.claim('w1', ['get-token', 'sync'], max_tasks=1)] == [sync]
+
+
+def test_stale_running_task_is_requeued_then_failed(task_db):
+    task_id = task_store.submit('sync')
+    task_store.claim('w1', ['sync'], 1)
+
+    # a live worker's heartbeat keeps it
+    assert task_store.requeue_stale(stale_after=60) == 0
+    assert _status(task_id) == task_store.RUNNING
+
+    time.sleep(0.01)
+    assert task_store.requeue_stale(stale_after=0) == 1
+    task = task_store.get(task_id)
+    assert task['status'] == task_store.QUEUED and task['worker'] is None
+
+    for _ in range(task_store.MAX_ATTEMPTS - 1):
+        task_store.claim('w2', ['sync'], 1)
+        time.sleep(0.01)
+        task_store.requeue_stale(stale_after=0)
+    task = task_store.get(task_id)
+    assert task['attempts'] == task_store.MAX_ATTEMPTS
+    assert (task['status'], task['error']) == (task_store.ERROR, 'worker lost')
+
+
+def test_requeued_task_is_not_finished_by_its_old_worker(task_db):
+    task_id = task_store.submit('sync')
+    task_store.claim('w1', ['sync'], 1)
+    time.sleep(0.01)
+    task_store.requeue_stale(stale_after=0)
+    task_store.claim('w2', ['sync'], 1)
+
+    task_store._finish(task_id, 'w1', task_store.FINISHED, result={'late': True})
+    assert _status(task_id) == task_store.RUNNING
+
+
+def test_cancel_queued_and_running(task_db):
+    queued = task_store.submit('sync')
+    assert task_store.cancel(queued) == task_store.CANCELLED
+    assert _status(queued) == task_store.CANCELLED
+
+    running = task_store.submit('sync')
+    task_store.claim('w1', ['sync'], 1)
+    assert task_store.cancel(running) == task_store.RUNNING
+    assert task_store.get(running)['cancel_requested']
+    # the worker learns about it from its heartbeat
+    assert task_store.heartbeat('w1') == {running}
+
+    assert task_store.cancel('no-such-task') is None
+
+
+def test_retry_requeues_error_and_cancelled_only(task_db):
+    task_id = task_store.submit('sync')
+    task_store.claim('w1', ['sync'], 1)
+    task_store._finish(task_id, 'w1', task_store.ERROR, error='boom')
+
+    assert task_store.retry(task_id) == task_store.QUEUED
+    task = task_store.get(task_id)
+    assert (task['status'], task['error'], task['attempts'], task['worker']) == (task_store.QUEUED, None, 0, None)
+
+    task_store.claim('w1', ['sync'], 1)
+    task_store._finish(task_id, 'w1', task_store.FINISHED, result={'ok': 1})
+    assert task_store.retry(task_id) == task_store.FINISHED
+    assert task_store.get(task_id)['result'] == {'ok': 1}
+
+
+def test_worker_runs_and_cancels_tasks(task_db):
+    def slow(ctx):
+        while True:
+            ctx.check()
+            time.sleep(0.01)
+
+    worker = task_store.TaskWorker({'echo': lambda ctx: ctx.params, 'slow': slow},
+                                   threads=2, poll_interval=0.01).start()
+    try:
+        done = task_store.submit('echo', {'n': 1})
+        stuck = task_store.submit('slow')
+        _wait(lambda: _status(done) == task_store.FINISHED and _status(stuck) == task_store.RUNNING)
+        assert task_store.get(done)['result'] == {'n': 1}
+
+        task_store.cancel(stuck)
+        worker.cancel(stuck)
+        _wait(lambda: _status(stuck) == task_store.CANCELLED)
+    finally:
+        worker.stop()
+
+
+def test_evict_drops_old_finished_tasks(task_db):
+    task_id = task_store.submit('sync')
+    task_store.cancel(task_id)
+    queued = task_store.submit('sync')
+
+    assert task_store.evict(ttl=3600) == 0
+    time.sleep(0.01)
+    assert task_store.evict(ttl=0) == 1
+    assert task_store.get(task_id) is None
+    assert _status(queued) == task_store.QUEUED
+
+
+def _wait(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'condition not reached'
+        time.sleep(0.01)
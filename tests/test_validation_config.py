@@ -0,0 +1,43 @@
+import pytest
+
+import bill_validation
+import order_pb2
+
+
+def _registry(*detail_rules):
+    return bill_validation.RuleRegistry.from_config(
+        {'rule_sets': {'sale': {'detail_rules': list(detail_rules)}}, 'default': 'sale'})
+
+
+def _detail(**fields):
+    return order_pb2.G_SyncBillDetailInfo(ProductKey='P1', **fields)  # type: ignore[attr-defined]
+
+
+def test_inline_rule_checks_details():
+    rule_set = _registry('product_key', {'name': 'max qty', 'field': 'Qty', 'op': '<=', 'value': 100}).default
+    ok, errors = rule_set.engine.validate([_detail(Qty=5), _detail(Qty=500)], 5)
+    assert ok == 1 and errors == ['bad Qty for P1']
+
+
+@pytest.mark.parametrize('name', ['x\nprint("INJECTED")', 'a#b', 'a\\b', "a'b", 42])
+def test_rule_name_outside_the_pattern_is_rejected(name, capsys):
+    with pytest.raises(ValueError, match='name may only contain'):
+        _registry({'name': name, 'field': 'Qty', 'op': '>', 'value': 0})
+    assert 'INJECTED' not in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('field, value', [('Qty', '10'), ('Qty', True), ('ProductKey', 3), ('Remark', None)])
+def test_value_must_match_field_type(field, value):
+    with pytest.raises(ValueError, match='must be a'):
+        _registry({'name': 'r', 'field': field, 'op': '==', 'value': value})
+
+
+def test_message_field_is_rejected():
+    with pytest.raises(ValueError, match='not a scalar'):
+        _registry({'name': 'r', 'field': 'Attributes', 'op': '==', 'value': 1})
+
+
+def test_generated_source_does_not_contain_rule_names():
+    rule = bill_validation.DetailRule('evil\nraise SystemExit', ('Qty',), 'Qty <= 0', 'bad Qty')
+    validate = bill_validation.compile_rules([rule])
+    assert validate([_detail(Qty=0)], 5) == (0, ['bad Qty'])